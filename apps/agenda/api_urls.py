@@ -0,0 +1,8 @@
+from django.urls import path
+
+from apps.agenda.api_views import FilaEstatisticasView
+
+urlpatterns = [
+    # GET /api/v1/fila/estatisticas/?inicio=AAAA-MM-DD&fim=AAAA-MM-DD
+    path("fila/estatisticas/", FilaEstatisticasView.as_view(), name="fila_estatisticas"),
+]
@@ -0,0 +1,44 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.agenda.serializers import PeriodoFilaSerializer
+from apps.agenda.services import fila
+from apps.platform.permissions import HasModulePermission
+
+
+class FilaEstatisticasView(APIView):
+    """
+    Estatísticas da fila de chegada — contagens por situação e chegadas por hora.
+
+    GET /api/v1/fila/estatisticas/?inicio=2025-01-01&fim=2025-01-31
+
+    Sem parâmetros, retorna o dia de hoje. `dias` traz a contagem de cada dia do
+    período; `chegadas_por_hora` soma as senhas emitidas em cada hora (0 a 23) no
+    período, para o planejamento da recepção nos horários de pico.
+    """
+
+    permission_classes = [IsAuthenticated, HasModulePermission("agenda")]
+
+    def get(self, request):
+        parametros = PeriodoFilaSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        inicio, fim = parametros.validated_data["inicio"], parametros.validated_data["fim"]
+
+        por_dia = fila.contagens(inicio, fim)
+        return Response(
+            {
+                "inicio": inicio,
+                "fim": fim,
+                "total": _contagem(fila.somar(por_dia)),
+                "dias": [{"data": dia, **_contagem(contagem)} for dia, contagem in por_dia.items()],
+                "chegadas_por_hora": [
+                    {"hora": hora, "chegadas": chegadas}
+                    for hora, chegadas in enumerate(fila.chegadas_por_hora(inicio, fim))
+                ],
+            }
+        )
+
+
+def _contagem(contagem: fila.Contagem) -> dict:
+    return {**contagem._asdict(), "total": contagem.total}
@@ -0,0 +1,71 @@
+"""
+Quadro da fila em tempo real por Server-Sent Events.
+
+A tela abre um `EventSource` e recebe, a cada senha criada, alterada ou removida, só
+a linha afetada (ver services/fila.py). Cada conexão fica aberta no máximo
+`FILA_SSE_DURACAO` segundos: o navegador reconecta sozinho depois de `retry` enviando
+o último id recebido (Last-Event-ID), e os eventos do intervalo vêm do histórico do
+barramento. Quando isso não é possível (histórico estourado, processo reiniciado) o
+cliente recebe `recarregar`.
+
+Rodando em WSGI, a conexão ocupa uma thread do worker enquanto está aberta. Por isso
+ela dura poucos segundos: cada tela da recepção prende uma thread por no máximo
+`FILA_SSE_DURACAO` segundos de cada vez, e as reconexões entram na fila do worker
+como um request qualquer. Para conexões longas é preciso um servidor assíncrono.
+"""
+
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
+
+from apps.agenda.services import fila
+from apps.platform.middleware import get_current_tenant
+
+FILA_SSE_DURACAO = getattr(settings, "FILA_SSE_DURACAO", 10)
+FILA_SSE_KEEPALIVE = 5
+# Espera do navegador antes de reconectar, em milissegundos
+FILA_SSE_RETRY = 1000
+
+
+def _mensagem(evento: fila.Evento) -> str:
+    dados = json.dumps(evento.dados, ensure_ascii=False)
+    return f"id: {fila.barramento.instancia}-{evento.id}\nevent: {evento.tipo}\ndata: {dados}\n\n"
+
+
+def _ultimo_id(valor: str | None) -> tuple[str | None, int | None]:
+    instancia, _, numero = (valor or "").partition("-")
+    return (instancia, int(numero)) if numero.isdigit() else (None, None)
+
+
+def _transmitir(assinatura: fila.Assinatura):
+    limite = time.monotonic() + FILA_SSE_DURACAO
+    try:
+        # Sem dados não é evento, mas o id fica como Last-Event-ID: mesmo sem receber
+        # nada nesta conexão, a próxima recebe o que for publicado no intervalo
+        yield f"retry: {FILA_SSE_RETRY}\nid: {fila.barramento.instancia}-{assinatura.desde}\n\n"
+        while (restante := limite - time.monotonic()) > 0:
+            if assinatura.perdeu_eventos:
+                yield "event: recarregar\ndata: {}\n\n"
+                return
+            evento = assinatura.proximo(timeout=min(FILA_SSE_KEEPALIVE, restante))
+            # Comentário SSE mantém a conexão viva e detecta cliente desconectado
+            yield _mensagem(evento) if evento else ": ping\n\n"
+    finally:
+        assinatura.cancelar()
+
+
+@login_required
+def eventos_fila(request):
+    instancia, desde = _ultimo_id(request.headers.get("Last-Event-ID"))
+    assinatura = fila.barramento.assinar(fila.canal(getattr(get_current_tenant(), "pk", None)), desde)
+    if instancia is not None and instancia != fila.barramento.instancia:
+        assinatura.perdeu_eventos = True
+
+    resposta = StreamingHttpResponse(_transmitir(assinatura), content_type="text/event-stream")
+    resposta["Cache-Control"] = "no-cache"
+    # Evita que o nginx segure os eventos no buffer
+    resposta["X-Accel-Buffering"] = "no"
+    return resposta
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.agenda.services import fila
+from apps.platform.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Passa as senhas da fila gravadas sem tenant para o tenant informado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Slug do tenant. Padrão: o único tenant cadastrado.")
+
+    def handle(self, *args, tenant=None, **options):
+        if tenant:
+            try:
+                tenant = Tenant.objects.get(slug=tenant)
+            except Tenant.DoesNotExist:
+                raise CommandError(f"Tenant '{tenant}' não encontrado.")
+        else:
+            tenants = list(Tenant.objects.all()[:2])
+            if len(tenants) != 1:
+                raise CommandError("Informe --tenant: há mais de um tenant (ou nenhum) cadastrado.")
+            tenant = tenants[0]
+
+        vinculadas = fila.vincular_tenant(tenant)
+        self.stdout.write(self.style.SUCCESS(f"{vinculadas} senha(s) vinculada(s) a {tenant.slug}."))
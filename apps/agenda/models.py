@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Length
 from django.utils import timezone
 
 from ..core.models import Usuario
+from ..core.services import sequencia as contadores
+from ..platform.middleware import get_current_tenant
 
 
 class Plano(models.Model):
@@ -23,45 +26,54 @@ class OrdemChegada(models.Model):
         ('ATENDIDO', 'ATENDIDO'),
         ('CANCELADO', 'CANCELADO'),
     ]
+    tenant = models.ForeignKey('platform.Tenant', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='ordens_chegada', verbose_name='Tenant')
     nome_paciente = models.ForeignKey(Usuario, on_delete=models.DO_NOTHING)
-    sequencia = models.CharField(max_length=12, unique=True)
+    sequencia = models.CharField(max_length=16, unique=True)
     data = models.DateField()
+    # Hora em que a senha foi emitida; vazia nas senhas anteriores ao campo
+    chegada = models.DateTimeField(verbose_name='Chegada', null=True, blank=True, editable=False)
     status_atendido = models.CharField(max_length=15, verbose_name='Atendimento', choices=STATUS_ATENDIMENTO, default='AGUARDANDO')
 
     class Meta:
-        ordering = ['sequencia']
+        # Length antes do valor mantém a ordem numérica quando o dia passa de 9999 senhas
+        ordering = [Length('sequencia'), 'sequencia']
+        indexes = [
+            models.Index(fields=['data', 'sequencia'], name='ordemchegada_data_seq_idx'),
+            # Contagens da fila por dia e situação (ver services/fila.py)
+            models.Index(fields=['tenant', 'data', 'status_atendido'], name='ordemchegada_fila_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.sequencia:  # Se a sequência não estiver definida
-            data_hora_atual = timezone.now()
-            ano = str(data_hora_atual.year)
-            mes = str(data_hora_atual.month).zfill(2)
-            dia = str(data_hora_atual.day).zfill(2)
-            numero_sequencial = f"{dia}{mes}{ano}"
-            # Encontra o último número sequencial para o dia atual
-            ultimo_numero_sequencial = OrdemChegada.objects.filter(
-                sequencia__startswith=numero_sequencial).order_by('-sequencia').first()
-            if ultimo_numero_sequencial:
-                ultimo_numero = int(ultimo_numero_sequencial.sequencia[-4:])
-                novo_numero = str(ultimo_numero + 1).zfill(4)
-                self.sequencia = f"{numero_sequencial}{novo_numero}"
-            else:
-                self.sequencia = f"{numero_sequencial}0001"
+        if self.sequencia:
+            return super().save(*args, **kwargs)
 
-        super().save(*args, **kwargs)
-
-    def __str__(self):
-        return self.nome_paciente.nome
-
-    @classmethod
-    def fila_dia_aguardando(cls, data):
-        return cls.objects.filter(data=data, status_atendido='AGUARDANDO').count()
+        data_hora_atual = timezone.now()
+        self.chegada = self.chegada or data_hora_atual
+        if self.tenant_id is None:
+            self.tenant = get_current_tenant()
+        numero_sequencial = data_hora_atual.strftime('%d%m%Y')
+        # O número é reservado na mesma transação do INSERT: se a gravação falhar o
+        # contador volta junto e a numeração do dia continua sem buracos
+        with transaction.atomic():
+            numero = contadores.proximo(
+                'agenda.ordem_chegada', numero_sequencial,
+                inicial=lambda: OrdemChegada._ultimo_numero_do_dia(numero_sequencial))
+            self.sequencia = f"{numero_sequencial}{str(numero).zfill(4)}"
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.sequencia = ''
+                raise
 
     @classmethod
-    def fila_dia_atendido(cls, data):
-        return cls.objects.filter(data=data, status_atendido='ATENDIDO').count()
-
-    @classmethod
-    def fila_dia_total(cls, data):
-        return cls.objects.filter(data=data).count()
+    def _ultimo_numero_do_dia(cls, numero_sequencial):
+        # Usado só para iniciar o contador do dia a partir das senhas já gravadas
+        ultimo = cls.objects.filter(sequencia__startswith=numero_sequencial).order_by(
+            Length('sequencia').desc(), '-sequencia').first()
+        if ultimo:
+            return int(ultimo.sequencia[len(numero_sequencial):])
+        return 0
 
+    def __str__(self):
+        return self.nome_paciente.nome
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+# Limite do período consultado de uma vez (um ano)
+MAX_DIAS_ESTATISTICAS = 366
+
+
+class PeriodoFilaSerializer(serializers.Serializer):
+    """Parâmetros de período das estatísticas da fila. Sem datas, usa o dia de hoje."""
+
+    inicio = serializers.DateField(required=False)
+    fim = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        inicio = attrs.get("inicio") or attrs.get("fim") or timezone.localdate()
+        fim = attrs.get("fim") or inicio
+        if fim < inicio:
+            raise serializers.ValidationError("'fim' deve ser igual ou posterior a 'inicio'.")
+        if fim - inicio >= timedelta(days=MAX_DIAS_ESTATISTICAS):
+            raise serializers.ValidationError(f"O período pode ter no máximo {MAX_DIAS_ESTATISTICAS} dias.")
+        return {"inicio": inicio, "fim": fim}
@@ -0,0 +1,226 @@
+"""
+Fila de chegada (`OrdemChegada`): estatísticas e eventos em tempo real.
+
+As contagens por situação de um dia ou de um período saem de uma única consulta
+agrupada por dia e situação, coberta pelo índice (tenant, data, status_atendido).
+As chegadas por hora usam o horário de emissão da senha (`chegada`) no fuso local;
+senhas anteriores a esse campo não entram no histograma.
+
+Cada senha gravada ou removida vira um evento no canal do tenant (ver signals.py);
+as telas da fila recebem esses eventos por SSE (ver consumers.py) e atualizam só a
+linha afetada, sem recarregar a lista.
+"""
+
+import queue
+import threading
+import uuid
+from collections import deque
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from django.db.models import Count, QuerySet
+from django.db.models.functions import ExtractHour
+from django.template.loader import render_to_string
+
+from apps.agenda.models import OrdemChegada
+from apps.platform.middleware import get_current_tenant
+
+
+class Contagem(NamedTuple):
+    aguardando: int = 0
+    atendido: int = 0
+    cancelado: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.aguardando + self.atendido + self.cancelado
+
+
+def _do_tenant(tenant) -> dict:
+    return {"tenant": tenant} if tenant is not None else {"tenant__isnull": True}
+
+
+def senhas(tenant=None) -> QuerySet:
+    """
+    Senhas do tenant informado ou do request atual; as sem tenant são dos hosts sem
+    tenant. Listas, contagens e eventos da fila usam o mesmo recorte.
+    """
+    tenant = tenant if tenant is not None else get_current_tenant()
+    return OrdemChegada.objects.filter(**_do_tenant(tenant))
+
+
+def ordens(inicio: date, fim: date | None = None, tenant=None) -> QuerySet:
+    """Senhas de `inicio` a `fim` (inclusive), sem ordenação, para as contagens."""
+    return senhas(tenant).filter(data__range=(inicio, fim or inicio)).order_by()
+
+
+def lista(dia: date, tenant=None) -> QuerySet:
+    """Senhas do dia na ordem de chegada, com o paciente."""
+    return senhas(tenant).filter(data=dia).select_related("nome_paciente")
+
+
+def vincular_tenant(tenant) -> int:
+    """Passa as senhas gravadas antes de `OrdemChegada.tenant` para `tenant`. Retorna quantas."""
+    return OrdemChegada.objects.filter(tenant__isnull=True).update(tenant=tenant)
+
+
+# ----------------------------------------------------------------------
+# Contagens por situação
+# ----------------------------------------------------------------------
+
+
+def contagens(inicio: date, fim: date | None = None, tenant=None) -> dict[date, Contagem]:
+    """Contagem por situação de cada dia do período, dias sem senha inclusive."""
+    fim = fim or inicio
+    por_dia = {inicio + timedelta(days=n): {} for n in range((fim - inicio).days + 1)}
+    linhas = ordens(inicio, fim, tenant).values_list("data", "status_atendido").annotate(quantidade=Count("pk"))
+    for dia, status, quantidade in linhas:
+        por_dia[dia][status.lower()] = quantidade
+    return {dia: Contagem(**valores) for dia, valores in por_dia.items()}
+
+
+def contagem(dia: date, tenant=None) -> Contagem:
+    return contagens(dia, tenant=tenant)[dia]
+
+
+def somar(contagens: dict[date, Contagem]) -> Contagem:
+    return Contagem(*(sum(coluna) for coluna in zip(Contagem(), *contagens.values())))
+
+
+# ----------------------------------------------------------------------
+# Chegadas por hora
+# ----------------------------------------------------------------------
+
+
+def chegadas_por_hora(inicio: date, fim: date | None = None, tenant=None) -> list[int]:
+    """Quantidade de senhas emitidas em cada hora do dia (0 a 23), somando o período."""
+    horas = [0] * 24
+    linhas = (
+        ordens(inicio, fim, tenant)
+        .filter(chegada__isnull=False)
+        .values_list(ExtractHour("chegada"))
+        .annotate(quantidade=Count("pk"))
+    )
+    for hora, quantidade in linhas:
+        horas[hora] = quantidade
+    return horas
+
+
+# ----------------------------------------------------------------------
+# Eventos em tempo real
+# ----------------------------------------------------------------------
+
+
+class Evento(NamedTuple):
+    id: int
+    tipo: str
+    dados: dict
+
+
+class Assinatura:
+    """
+    Fila de eventos de um cliente conectado. `desde` é o id a partir do qual ele recebe
+    todos os eventos do canal; `perdeu_eventos` indica que ele precisa recarregar a lista.
+    """
+
+    def __init__(self, barramento: "Barramento", canal: str, limite: int):
+        self._barramento = barramento
+        self.canal = canal
+        self.eventos: queue.Queue[Evento] = queue.Queue(maxsize=limite)
+        self.desde = 0
+        self.perdeu_eventos = False
+
+    def entregar(self, evento: Evento) -> None:
+        try:
+            self.eventos.put_nowait(evento)
+        except queue.Full:
+            # Cliente lento: em vez de crescer sem limite, ele recarrega a lista
+            self.perdeu_eventos = True
+
+    def proximo(self, timeout: float) -> Evento | None:
+        try:
+            return self.eventos.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cancelar(self) -> None:
+        self._barramento.cancelar(self)
+
+
+class Barramento:
+    """
+    Pub/sub em memória, um canal por tenant, no lugar do Redis enquanto a aplicação
+    roda num único processo. Os últimos `historico` eventos de cada canal ficam
+    guardados para reenviar a quem reconecta informando o último id recebido; os ids
+    só valem dentro da mesma `instancia` do barramento.
+    """
+
+    def __init__(self, historico: int = 200, limite_assinante: int = 500):
+        self.instancia = uuid.uuid4().hex[:8]
+        self._trava = threading.Lock()
+        self._ultimo_id = 0
+        self._historico: dict[str, deque[Evento]] = {}
+        self._assinantes: dict[str, set[Assinatura]] = {}
+        self.tamanho_historico = historico
+        self.limite_assinante = limite_assinante
+
+    def publicar(self, canal: str, tipo: str, dados: dict) -> Evento:
+        with self._trava:
+            self._ultimo_id += 1
+            evento = Evento(self._ultimo_id, tipo, dados)
+            self._historico.setdefault(canal, deque(maxlen=self.tamanho_historico)).append(evento)
+            assinantes = list(self._assinantes.get(canal, ()))
+        for assinatura in assinantes:
+            assinatura.entregar(evento)
+        return evento
+
+    def assinar(self, canal: str, desde: int | None = None) -> Assinatura:
+        """
+        Inscreve um cliente no canal. Com `desde`, os eventos seguintes a esse id ainda
+        no histórico são entregues primeiro; se algum já saiu do histórico a assinatura
+        já nasce com `perdeu_eventos`.
+        """
+        assinatura = Assinatura(self, canal, self.limite_assinante)
+        with self._trava:
+            self._assinantes.setdefault(canal, set()).add(assinatura)
+            assinatura.desde = self._ultimo_id if desde is None else desde
+            if desde is not None:
+                historico = self._historico.get(canal, ())
+                # Os ids são de todos os canais: só falta evento se o histórico do canal já descartou algum
+                cheio = len(historico) == self.tamanho_historico
+                if desde > self._ultimo_id or (cheio and desde < historico[0].id - 1):
+                    assinatura.perdeu_eventos = True
+                else:
+                    for evento in historico:
+                        if evento.id > desde:
+                            assinatura.entregar(evento)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura) -> None:
+        with self._trava:
+            assinantes = self._assinantes.get(assinatura.canal, set())
+            assinantes.discard(assinatura)
+            if not assinantes:
+                self._assinantes.pop(assinatura.canal, None)
+
+
+barramento = Barramento()
+
+
+def canal(tenant_id=None) -> str:
+    return f"fila:{tenant_id or 'global'}"
+
+
+def publicar_ordem(ordem: OrdemChegada) -> Evento:
+    """Publica a linha atualizada da senha, já renderizada uma vez para todas as telas."""
+    html = render_to_string("agenda/ordem_chegada_linha.html", {"atendimento": ordem})
+    return barramento.publicar(canal(ordem.tenant_id), "ordem", {
+        "id": ordem.pk,
+        "data": ordem.data.isoformat(),
+        "status": ordem.status_atendido,
+        "html": html,
+    })
+
+
+def publicar_remocao(pk: int, dia: date, tenant_id=None) -> Evento:
+    return barramento.publicar(canal(tenant_id), "removida", {"id": pk, "data": dia.isoformat()})
@@ -0,0 +1,24 @@
+"""
+Publica cada senha gravada ou removida no canal da fila do tenant, depois do commit,
+para as telas conectadas por SSE (ver consumers.py).
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.agenda.models import OrdemChegada
+from apps.agenda.services import fila
+
+
+@receiver(post_save, sender=OrdemChegada)
+def ordem_salva(sender, instance, **kwargs):
+    transaction.on_commit(partial(fila.publicar_ordem, instance))
+
+
+@receiver(post_delete, sender=OrdemChegada)
+def ordem_removida(sender, instance, **kwargs):
+    # Depois do commit a instância já está sem pk
+    transaction.on_commit(partial(fila.publicar_remocao, instance.pk, instance.data, instance.tenant_id))
@@ -1,3 +1,131 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from apps.agenda import consumers
+from apps.agenda.models import OrdemChegada
+from apps.agenda.services import fila
+from apps.core.models import Usuario
+from apps.core.models.sequencia import Sequencia
+from apps.core.tests import _em_paralelo
+from apps.platform.middleware import set_current_tenant
+from apps.platform.models import Tenant
+
+
+class SequenciaOrdemChegadaTest(TestCase):
+
+    def setUp(self):
+        self.paciente = Usuario.objects.create(nome='Paciente', sexo='M')
+        self.hoje = timezone.localdate()
+        self.prefixo = timezone.now().strftime('%d%m%Y')
+
+    def emitir(self, quantidade):
+        return [OrdemChegada.objects.create(nome_paciente=self.paciente, data=self.hoje) for _ in range(quantidade)]
+
+    def numeros(self):
+        return [int(ordem.sequencia[len(self.prefixo):]) for ordem in OrdemChegada.objects.all()]
+
+    def test_numeracao_do_dia_passa_de_9_e_99_em_ordem(self):
+        emitidas = self.emitir(105)
+
+        self.assertEqual([ordem.sequencia for ordem in emitidas[:2]], [f'{self.prefixo}0001', f'{self.prefixo}0002'])
+        self.assertEqual(emitidas[-1].sequencia, f'{self.prefixo}0105')
+        self.assertEqual(self.numeros(), list(range(1, 106)))
+
+    def test_ordem_numerica_depois_de_9999(self):
+        Sequencia.objects.create(escopo='agenda.ordem_chegada', chave=self.prefixo, valor=9997)
+        emitidas = self.emitir(3)
+
+        self.assertEqual([ordem.sequencia for ordem in emitidas],
+                         [f'{self.prefixo}9998', f'{self.prefixo}9999', f'{self.prefixo}10000'])
+        self.assertEqual(self.numeros(), [9998, 9999, 10000])
+
+    def test_contador_novo_continua_das_senhas_sem_zeros(self):
+        # Senhas gravadas antes do contador, sem preencher com zeros
+        OrdemChegada.objects.bulk_create([
+            OrdemChegada(nome_paciente=self.paciente, data=self.hoje, sequencia=f'{self.prefixo}{numero}')
+            for numero in (1, 2, 9, 10, 99)
+        ])
+        nova = self.emitir(1)[0]
+
+        self.assertEqual(nova.sequencia, f'{self.prefixo}0100')
+        self.assertEqual(self.numeros(), [1, 2, 9, 10, 99, 100])
+
+
+class SequenciaConcorrenteTest(TransactionTestCase):
+
+    def test_recepcoes_em_paralelo_nao_repetem_nem_pulam_senhas(self):
+        paciente = Usuario.objects.create(nome='Paciente', sexo='M')
+        hoje = timezone.localdate()
+        prefixo = timezone.now().strftime('%d%m%Y')
+
+        def emitir():
+            return [OrdemChegada.objects.create(nome_paciente=paciente, data=hoje).sequencia for _ in range(2)]
+
+        senhas = [senha for lista in _em_paralelo(emitir, threads=50) for senha in lista]
+        self.assertEqual(sorted(int(senha[len(prefixo):]) for senha in senhas), list(range(1, 101)))
+        self.assertEqual(OrdemChegada.objects.count(), 100)
+
+
+class RecorteTenantFilaTest(TestCase):
+
+    def setUp(self):
+        self.paciente = Usuario.objects.create(nome='Paciente', sexo='M')
+        self.hoje = timezone.localdate()
+        self.tenant = Tenant.objects.create(name='Lab', slug='lab', cnpj='01', responsible_name='Resp',
+                                            email='lab@exemplo.com')
+        self.addCleanup(set_current_tenant, None)
+
+    def emitir(self, tenant, status='AGUARDANDO'):
+        return OrdemChegada.objects.create(tenant=tenant, nome_paciente=self.paciente, data=self.hoje,
+                                           status_atendido=status)
+
+    def test_lista_e_contagem_usam_o_mesmo_recorte(self):
+        legadas = [self.emitir(None), self.emitir(None, 'ATENDIDO')]
+        do_tenant = [self.emitir(self.tenant)]
+
+        for tenant, esperadas in ((None, legadas), (self.tenant, do_tenant)):
+            set_current_tenant(tenant)
+            self.assertEqual(list(fila.lista(self.hoje)), esperadas)
+            self.assertEqual(fila.contagem(self.hoje).total, len(esperadas))
+
+    def test_vincular_senhas_sem_tenant(self):
+        self.emitir(None)
+        self.emitir(self.tenant)
+        call_command('vincular_fila', stdout=io.StringIO())
+
+        self.assertFalse(OrdemChegada.objects.filter(tenant__isnull=True).exists())
+        self.assertEqual(fila.contagem(self.hoje, self.tenant).total, 2)
+
+
+class ReconexaoFilaTest(SimpleTestCase):
+
+    def setUp(self):
+        self.barramento = fila.Barramento(historico=3)
+
+    def test_reconexao_recebe_o_intervalo_sem_ter_recebido_eventos(self):
+        self.barramento.publicar('outro', 'ordem', {})
+        primeira = self.barramento.assinar('fila')
+        primeira.cancelar()
+        evento = self.barramento.publicar('fila', 'ordem', {'id': 1})
+
+        segunda = self.barramento.assinar('fila', primeira.desde)
+        self.assertFalse(segunda.perdeu_eventos)
+        self.assertEqual(segunda.proximo(timeout=0), evento)
+
+    def test_historico_estourado_pede_recarga(self):
+        primeira = self.barramento.assinar('fila')
+        primeira.cancelar()
+        for numero in range(4):
+            self.barramento.publicar('fila', 'ordem', {'id': numero})
+
+        self.assertTrue(self.barramento.assinar('fila', primeira.desde).perdeu_eventos)
+
+    def test_conexao_informa_o_id_inicial(self):
+        assinatura = fila.barramento.assinar('fila:teste')
+        transmissao = consumers._transmitir(assinatura)
+        self.assertEqual(next(transmissao),
+                         f'retry: {consumers.FILA_SSE_RETRY}\nid: {fila.barramento.instancia}-{assinatura.desde}\n\n')
+        transmissao.close()
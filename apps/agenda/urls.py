@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import consumers, views
 
 app_name = 'agenda'
 
@@ -12,6 +12,7 @@ urlpatterns = [
     path('atualizar/<int:pk>/fila/', views.OrdemChegadaUP.as_view(), name='ordem_chegada_up'),
     path('lista/ordem_fila/', views.OrdemChegadaLista.as_view(), name='ordem_chegada_lista'),
     path('ordem/fila/lista/', views.OrdemChegadaListaData.as_view(), name='ordem_chegada_lista_data'),
+    path('fila/eventos/', consumers.eventos_fila, name='fila_eventos'),
     path('pesquisar/atendimento/', views.BuscarOrdem.as_view(), name='pesquisar_agendamento'),
     path('pesquisar/paciente/', views.Buscarpaciente.as_view(), name='pesquisar_paciente'),
     path('buscar/agendamento/', views.buscar_agendamento, name='busca_agendamento'),
@@ -3,14 +3,16 @@ from datetime import datetime
 from datetime import date
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
 from .models import Plano, OrdemChegada
 from .form import PlanoForm, OrdemChegadaForm, OrdemChegadaUpdateForm
+from .services import fila
 from django.views.generic import CreateView, ListView, UpdateView, TemplateView, DeleteView
 
 from ..core.models import Usuario
+# As buscas AJAX da agenda são as mesmas do cadastro de pacientes
+from ..core.views_legacy import buscar_atendimento_paciente as buscar_agendamento, buscar_paciente  # noqa: F401
 from ..exame.models import Exame
 
 
@@ -86,7 +88,7 @@ class OrdemChegadaLista(LoginRequiredMixin, ListView):
     context_object_name = 'ordem_chegada'
 
     def get_queryset(self):
-        return OrdemChegada.objects.filter(data=date.today())
+        return fila.lista(date.today())
 
     def get_context_data(self, *, object_list=None, **kwargs):
         contexto = super().get_context_data(**kwargs)
@@ -102,7 +104,7 @@ class OrdemChegadaListaData(LoginRequiredMixin, TemplateView):
         dia = self.request.GET.get("data")
         data1 = datetime.strptime(dia, '%Y-%m-%d')
         data = data1.date()
-        atendimentos = OrdemChegada.objects.filter(data=data)
+        atendimentos = fila.lista(data)
         contexto['ordem_chegada'] = atendimentos
         contexto['data'] = data
         return contexto
@@ -122,64 +124,13 @@ class BuscarOrdem(LoginRequiredMixin, TemplateView):
     template_name = 'agenda/buscar_agendamento.html'
 
 
-def buscar_agendamento(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Usuario.objects.filter(nome__icontains=nomes)
-
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for paciente in query_se:
-                item = {
-                    'pk': paciente.pk,
-                    'nome': paciente.nome,
-                    'cpf': paciente.cpf,
-                }
-
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum paciente encontrado'
-
-        return JsonResponse({'data': res})
-    return JsonResponse({})
-
-
-def buscar_paciente(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Usuario.objects.filter(nome__icontains=nomes)
-
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for paciente in query_se:
-                retorno = 'CPF não cadastrado'
-                if paciente.cpf:
-                    retorno = paciente.cpf
-                item = {
-                    'pk': paciente.pk,
-                    'nome': paciente.nome,
-                    'cpf': retorno,
-                }
-
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum paciente encontrado'
-
-        return JsonResponse({'data': res})
-    return JsonResponse({})
-
-
 class AgendamentosEncontrados(LoginRequiredMixin, TemplateView):
     template_name = 'agenda/agendamentos_encontrados.html'
 
     def get_context_data(self, **kwargs):
         contexto = super().get_context_data(**kwargs)
         paciente = get_object_or_404(Usuario, pk=self.kwargs['pk'])
-        agendamentos = OrdemChegada.objects.filter(nome_paciente=paciente)
+        agendamentos = fila.senhas().filter(nome_paciente=paciente)
         contexto['paciente'] = paciente
         contexto['agendamentos'] = agendamentos
         return contexto
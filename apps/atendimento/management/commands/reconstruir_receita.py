@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.atendimento.models import OrcamentoExames
+from apps.atendimento.services import receita
+
+
+class Command(BaseCommand):
+    help = "Refaz a ReceitaDiaria de um intervalo a partir dos orçamentos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inicio", type=date.fromisoformat,
+                            help="Primeiro dia (AAAA-MM-DD). Padrão: o orçamento mais antigo.")
+        parser.add_argument("--fim", type=date.fromisoformat, help="Último dia (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument("--dias-por-lote", type=int, default=31)
+
+    def handle(self, *args, inicio=None, fim=None, dias_por_lote=31, **options):
+        fim = fim or date.today()
+        inicio = inicio or OrcamentoExames.objects.order_by("data_cadastro").values_list(
+            "data_cadastro", flat=True).first() or fim
+        if inicio > fim:
+            raise CommandError("--inicio não pode ser posterior a --fim.")
+
+        linhas = receita.reconstruir(inicio, fim, dias_por_lote=dias_por_lote)
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linha(s) gravada(s) de {inicio} a {fim}."))
@@ -1,9 +1,50 @@
 from _decimal import Decimal
 from django.db import models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from ..core.models import Usuario
 from ..exame.models import Exame
+from ..exame.services import precos
 from datetime import date
 
+ZERO = Decimal('0.00')
+
+
+class Reais(Coalesce):
+    """Valor em reais com duas casas, 0 quando nulo (o SQLite devolve somas como `Decimal('10')`)."""
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+
+    def __init__(self, expressao):
+        super().__init__(expressao, Value(ZERO))
+
+    def get_db_converters(self, connection):
+        return super().get_db_converters(connection) + [self._quantizar]
+
+    @staticmethod
+    def _quantizar(valor, expression, connection):
+        return None if valor is None else Decimal(valor).quantize(ZERO)
+
+
+class OrcamentoQuerySet(models.QuerySet):
+
+    def with_total(self):
+        """
+        Anota `total` em cada orçamento: a soma do preço cobrado dos exames (ver
+        `precos.preco_cobrado`), calculada no banco.
+        """
+        itens = OrcamentoExames.exame.through.objects.filter(orcamentoexames_id=OuterRef('pk'))
+        soma = (
+            itens.values('orcamentoexames_id')
+            .annotate(soma=Sum(precos.preco_cobrado('exame__')))
+            .values('soma')
+        )
+        return self.annotate(total=Reais(Subquery(soma)))
+
+    def total(self):
+        """Soma de `total` de todos os orçamentos do queryset, numa única consulta."""
+        orcamentos = self if 'total' in self.query.annotations else self.with_total()
+        return orcamentos.aggregate(soma=Reais(Sum('total')))['soma']
+
 
 class OrcamentoExames(models.Model):
     FORMA_DE_PAGAMENTO = [
@@ -29,33 +70,23 @@ class OrcamentoExames(models.Model):
     data_cadastro = models.DateField(verbose_name='Data Exames', default=date.today)
     data_alterado = models.DateTimeField(verbose_name='Data Modoficação', auto_now=True)
 
+    objects = OrcamentoQuerySet.as_manager()
 
     def calcular_total(self):
-        total = Decimal('0.00')
-        for exame in self.exame.all():
-            plano = exame.planos.first()
-            total += plano.preco
-        return total
+        # Em querysets com `with_total()` o valor já veio na mesma consulta
+        if 'total' in self.__dict__:
+            return self.total
+        return OrcamentoExames.objects.filter(pk=self.pk).with_total().values_list('total', flat=True).first() or ZERO
 
     @classmethod
     def calcular_total_por_data_e_pagamento(cls, data_cadastro, pagamento):
-        total = Decimal('0.00')
-        orcamentos = cls.objects.filter(data_cadastro=data_cadastro, pagamento=pagamento).order_by('id')
-        for orcamento in orcamentos:
-            total += orcamento.calcular_total()
-        return total, orcamentos
+        orcamentos = cls.objects.filter(data_cadastro=data_cadastro, pagamento=pagamento).with_total().order_by('id')
+        return orcamentos.total(), orcamentos
 
     @classmethod
     def calcular_total_por_periodo(cls, data_inicio, data_fim):
-        total = Decimal('0.00')
-        if data_inicio == data_fim:
-            orcamentos = cls.objects.filter(data_cadastro=data_inicio)
-        else:
-            orcamentos = cls.objects.filter(data_cadastro__range=(data_inicio, data_fim))
-
-        for orcamento in orcamentos:
-            total += orcamento.calcular_total()
-        return total, orcamentos
+        orcamentos = cls.objects.filter(data_cadastro__range=(data_inicio, data_fim)).with_total()
+        return orcamentos.total(), orcamentos
 
     @classmethod
     def total_atendimentos_diarios(cls):
@@ -68,3 +99,29 @@ class OrcamentoExames(models.Model):
     @classmethod
     def algum_exame_realizado(cls, orcamento):
         return orcamento.exame.filter(status_exame='REALIZADO').exists()
+
+
+class ReceitaDiaria(models.Model):
+    """
+    Receita consolidada por dia, forma de pagamento e situação do pagamento.
+
+    Mantida incrementalmente pelos signals de apps/atendimento/signals.py; para refazer
+    um intervalo a partir dos orçamentos use `manage.py reconstruir_receita`.
+    É global, como os orçamentos: ganha um tenant quando `OrcamentoExames` ganhar.
+    """
+    data = models.DateField(verbose_name='Data')
+    forma_pagamento = models.CharField(verbose_name='Forma de Pagamento', max_length=40)
+    pagamento = models.CharField(verbose_name='Pagamento', max_length=20)
+    quantidade = models.PositiveIntegerField(verbose_name='Atendimentos', default=0)
+    total = models.DecimalField(verbose_name='Total', max_digits=12, decimal_places=2, default=ZERO)
+    atualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Receita Diária'
+        verbose_name_plural = 'Receitas Diárias'
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'forma_pagamento', 'pagamento'], name='receita_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.data} {self.forma_pagamento}/{self.pagamento}: {self.total}'
@@ -0,0 +1,162 @@
+"""
+Exportação dos orçamentos de um período em CSV ou XLSX, para o financeiro.
+
+Os orçamentos são lidos em lotes com `.iterator(chunk_size=...)`, já com o total de
+cada linha e a quantidade de exames calculados no banco, e escritos à medida que
+chegam: a memória usada é a mesma para um dia ou para um ano.
+
+- CSV: separador ";" e vírgula decimal, como o Excel em português abre; cada linha
+  é enviada assim que é escrita.
+- XLSX: `Workbook(write_only=True)`, que guarda as linhas em arquivos temporários em
+  vez de montar as células em memória. O arquivo só fica completo no `save`, então é
+  gravado num arquivo temporário e enviado em pedaços.
+
+Depois dos orçamentos vem o resumo por forma e situação de pagamento, somado dos
+mesmos orçamentos exportados: o resumo sempre fecha com as linhas do arquivo.
+
+Textos digitados (nome do paciente, por exemplo) que começam com "=", "+", "-" ou "@"
+seriam lidos como fórmula pela planilha: no CSV ganham um apóstrofo na frente e no
+XLSX são gravados como texto.
+"""
+
+import csv
+import tempfile
+from collections.abc import Iterator
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from apps.atendimento.models import OrcamentoExames, Reais
+from apps.atendimento.services.relatorio import Periodo
+
+LOTE_PADRAO = 2000
+TAMANHO_PEDACO = 64 * 1024
+
+CABECALHO_ORCAMENTOS = ("Data", "Orçamento", "Paciente", "CPF", "Exames", "Forma de pagamento", "Pagamento", "Total")
+CABECALHO_RESUMO = ("Forma de pagamento", "Pagamento", "Atendimentos", "Total")
+
+# Início de texto que a planilha interpreta como fórmula
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+# Tipo de conteúdo de cada formato aceito
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+# ----------------------------------------------------------------------
+# Linhas
+# ----------------------------------------------------------------------
+
+
+def _do_periodo(periodo: Periodo):
+    return OrcamentoExames.objects.filter(data_cadastro__range=periodo).with_total()
+
+
+def orcamentos(periodo: Periodo, lote: int = LOTE_PADRAO) -> Iterator[tuple]:
+    """Uma tupla por orçamento do período (na ordem de `CABECALHO_ORCAMENTOS`), em lotes de `lote`."""
+    return (
+        _do_periodo(periodo)
+        .annotate(quantidade_exames=Count("exame"))
+        .order_by("data_cadastro", "pk")
+        .values_list("data_cadastro", "pk", "paciente__nome", "paciente__cpf", "quantidade_exames",
+                     "forma_pagamento", "pagamento", "total")
+        .iterator(chunk_size=lote)
+    )
+
+
+def resumo(periodo: Periodo) -> list[tuple]:
+    """
+    Quantidade e total por forma e situação de pagamento dos orçamentos exportados,
+    seguidos do total geral, numa única consulta.
+    """
+    linhas = list(
+        _do_periodo(periodo).order_by("forma_pagamento", "pagamento")
+        .values("forma_pagamento", "pagamento")
+        .annotate(atendimentos=Count("pk"), soma=Reais(Sum("total")))
+        .values_list("forma_pagamento", "pagamento", "atendimentos", "soma")
+    )
+    total = ("Total", "", sum(linha[2] for linha in linhas), sum((linha[3] for linha in linhas), Decimal("0.00")))
+    return [*linhas, total]
+
+
+# ----------------------------------------------------------------------
+# Formatos
+# ----------------------------------------------------------------------
+
+
+class _Eco:
+    """Arquivo falso para o `csv.writer`: devolve a linha escrita em vez de guardá-la."""
+
+    def write(self, texto: str) -> str:
+        return texto
+
+
+def _celula_csv(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, Decimal):
+        return f"{valor:.2f}".replace(".", ",")
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return str(valor)
+
+
+def csv_periodo(periodo: Periodo, lote: int = LOTE_PADRAO) -> Iterator[str]:
+    escritor = csv.writer(_Eco(), delimiter=";")
+    # BOM para o Excel reconhecer o UTF-8
+    yield "\ufeff" + escritor.writerow(CABECALHO_ORCAMENTOS)
+    for linha in orcamentos(periodo, lote):
+        yield escritor.writerow([_celula_csv(valor) for valor in linha])
+    yield escritor.writerow([])
+    yield escritor.writerow(CABECALHO_RESUMO)
+    for linha in resumo(periodo):
+        yield escritor.writerow([_celula_csv(valor) for valor in linha])
+
+
+def xlsx_periodo(periodo: Periodo, lote: int = LOTE_PADRAO) -> Iterator[bytes]:
+    livro = Workbook(write_only=True)
+
+    def celulas(planilha, linha):
+        for valor in linha:
+            celula = WriteOnlyCell(planilha, value=valor)
+            if isinstance(valor, date):
+                celula.number_format = "DD/MM/YYYY"
+            elif isinstance(valor, Decimal):
+                celula.number_format = "#,##0.00"
+            elif isinstance(valor, str):
+                celula.data_type = "s"
+            yield celula
+
+    planilha = livro.create_sheet("Orçamentos")
+    planilha.append(CABECALHO_ORCAMENTOS)
+    for linha in orcamentos(periodo, lote):
+        planilha.append(list(celulas(planilha, linha)))
+
+    planilha = livro.create_sheet("Formas de pagamento")
+    planilha.append(CABECALHO_RESUMO)
+    for linha in resumo(periodo):
+        planilha.append(list(celulas(planilha, linha)))
+
+    with tempfile.TemporaryFile() as arquivo:
+        livro.save(arquivo)
+        arquivo.seek(0)
+        while pedaco := arquivo.read(TAMANHO_PEDACO):
+            yield pedaco
+
+
+def exportar(periodo: Periodo, formato: str, lote: int = LOTE_PADRAO) -> Iterator:
+    """Conteúdo do arquivo em `formato` ("csv" ou "xlsx"), gerado sob demanda."""
+    if formato == "xlsx":
+        return xlsx_periodo(periodo, lote)
+    return csv_periodo(periodo, lote)
+
+
+def nome_arquivo(periodo: Periodo, formato: str) -> str:
+    return f"orcamentos_{periodo.inicio:%Y-%m-%d}_{periodo.fim:%Y-%m-%d}.{formato}"
@@ -0,0 +1,118 @@
+"""
+Receita diária consolidada (`ReceitaDiaria`).
+
+Cada linha guarda quantidade e total dos orçamentos de um dia para uma forma e uma
+situação de pagamento. Quando um orçamento, os exames dele ou o preço cobrado desses
+exames mudam, os signals marcam os dias afetados com `marcar_dias`; depois do commit só
+esses dias são recalculados a partir dos orçamentos. Como o recálculo de um dia é
+idempotente, marcar um dia a mais nunca deixa o consolidado errado.
+
+O consolidado é global, como os orçamentos: enquanto `OrcamentoExames` não tiver
+tenant, uma linha por tenant somaria os mesmos orçamentos em cada uma e só a do host
+que fez a alteração seria recalculada.
+
+Relatórios de período leem o consolidado: um ano inteiro são no máximo algumas
+centenas de linhas, independente de quantos orçamentos e exames existem.
+"""
+
+import threading
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from apps.atendimento.models import OrcamentoExames, ReceitaDiaria, Reais
+from apps.platform.middleware import get_current_tenant
+
+_local = threading.local()
+
+
+# ----------------------------------------------------------------------
+# Recálculo
+# ----------------------------------------------------------------------
+
+
+def recalcular(dias: Iterable[date]) -> int:
+    """Refaz as linhas de `dias` a partir dos orçamentos. Retorna quantas linhas foram gravadas."""
+    dias = sorted(set(dias))
+    if not dias:
+        return 0
+
+    linhas = (
+        OrcamentoExames.objects.filter(data_cadastro__in=dias)
+        .with_total()
+        .order_by()
+        .values("data_cadastro", "forma_pagamento", "pagamento")
+        .annotate(quantidade=Count("pk"), soma=Reais(Sum("total")))
+    )
+    with transaction.atomic():
+        ReceitaDiaria.objects.filter(data__in=dias).delete()
+        criadas = ReceitaDiaria.objects.bulk_create([
+            ReceitaDiaria(
+                data=linha["data_cadastro"],
+                forma_pagamento=linha["forma_pagamento"],
+                pagamento=linha["pagamento"],
+                quantidade=linha["quantidade"],
+                total=linha["soma"],
+            )
+            for linha in linhas
+        ])
+    return len(criadas)
+
+
+def reconstruir(inicio: date, fim: date, dias_por_lote: int = 31) -> int:
+    """Refaz o consolidado de `inicio` a `fim` (inclusive), em lotes de `dias_por_lote` dias."""
+    gravadas = 0
+    dia = inicio
+    while dia <= fim:
+        lote_fim = min(fim, dia + timedelta(days=dias_por_lote - 1))
+        gravadas += recalcular(dia + timedelta(days=n) for n in range((lote_fim - dia).days + 1))
+        dia = lote_fim + timedelta(days=1)
+    return gravadas
+
+
+# ----------------------------------------------------------------------
+# Manutenção incremental
+# ----------------------------------------------------------------------
+
+
+def marcar_dias(dias: Iterable[date | None]) -> None:
+    """
+    Agenda o recálculo de `dias` para depois do commit da transação atual (ou na hora,
+    fora de transação). Dias marcados várias vezes na mesma transação são recalculados
+    uma vez só. O painel do tenant do request atual é descartado junto.
+    """
+    tenant = get_current_tenant()
+    pendentes = _local.__dict__.setdefault("pendentes", set())
+    tenants = _local.__dict__.setdefault("tenants", {})
+    pendentes.update(dia for dia in dias if dia is not None)
+    tenants[getattr(tenant, "pk", None)] = tenant
+    transaction.on_commit(_aplicar_pendentes)
+
+
+def _aplicar_pendentes() -> None:
+    from apps.core.services import painel
+
+    dias = _local.__dict__.pop("pendentes", set())
+    tenants = _local.__dict__.pop("tenants", {})
+    recalcular(dias)
+    for tenant in tenants.values():
+        painel.invalidar(tenant)
+
+
+def dias_dos_orcamentos(**filtro) -> list[date]:
+    return list(OrcamentoExames.objects.filter(**filtro).values_list("data_cadastro", flat=True).distinct())
+
+
+# ----------------------------------------------------------------------
+# Leitura
+# ----------------------------------------------------------------------
+
+
+def receita(inicio: date, fim: date, pagamento: str | None = None):
+    """Linhas do consolidado no período."""
+    filtro = {"data__range": (inicio, fim)}
+    if pagamento:
+        filtro["pagamento"] = pagamento
+    return ReceitaDiaria.objects.filter(**filtro)
@@ -0,0 +1,72 @@
+"""
+Totais financeiros dos relatórios de atendimento.
+
+Os totais de um período vêm da receita consolidada por dia (`resumo_consolidado`,
+ver services/receita.py); a listagem dos orçamentos usa
+`OrcamentoExames.objects.with_total()`, que soma os exames de cada linha no banco.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db.models import Count, Prefetch, QuerySet, Sum
+
+from apps.atendimento.models import OrcamentoExames, Reais
+from apps.atendimento.services import receita
+from apps.exame.models import Exame
+from apps.exame.services import precos
+
+
+class Periodo(NamedTuple):
+    inicio: date
+    fim: date
+
+
+class Resumo(NamedTuple):
+    quantidade: int
+    total: Decimal
+
+
+def semana(dia: date) -> Periodo:
+    inicio = dia - timedelta(days=dia.weekday())
+    return Periodo(inicio, inicio + timedelta(days=6))
+
+
+def mes(dia: date) -> Periodo:
+    proximo_mes = dia.replace(day=28) + timedelta(days=4)
+    return Periodo(dia.replace(day=1), proximo_mes - timedelta(days=proximo_mes.day))
+
+
+def orcamentos(periodo: Periodo, pagamento: str | None = None) -> QuerySet:
+    """
+    Orçamentos do período (datas inclusivas) com `total` anotado. Paciente e exames,
+    cada um com o `preco` cobrado, vêm junto para a listagem dos relatórios.
+    """
+    filtro = {"data_cadastro__range": periodo}
+    if pagamento:
+        filtro["pagamento"] = pagamento
+    exames = Exame.objects.annotate(preco=Reais(precos.preco_cobrado()))
+    return (
+        OrcamentoExames.objects.filter(**filtro)
+        .with_total()
+        .select_related("paciente")
+        .prefetch_related(Prefetch("exame", queryset=exames))
+    )
+
+
+def resumo(orcamentos: QuerySet) -> Resumo:
+    """Quantidade e soma dos orçamentos numa única consulta."""
+    if "total" not in orcamentos.query.annotations:
+        orcamentos = orcamentos.with_total()
+    # O alias não pode repetir o nome da anotação `total`
+    valores = orcamentos.order_by().aggregate(quantidade=Count("pk"), soma=Reais(Sum("total")))
+    return Resumo(valores["quantidade"], valores["soma"])
+
+
+def resumo_consolidado(periodo: Periodo, pagamento: str | None = None) -> Resumo:
+    """Quantidade e total do período lidos da `ReceitaDiaria`, numa única consulta."""
+    valores = receita.receita(*periodo, pagamento=pagamento).aggregate(
+        quantidade=Sum("quantidade"), soma=Reais(Sum("total")),
+    )
+    return Resumo(valores["quantidade"] or 0, valores["soma"])
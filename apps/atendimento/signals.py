@@ -0,0 +1,67 @@
+"""
+Mantém a `ReceitaDiaria` em dia: qualquer mudança que altere o total de um orçamento
+marca o dia do orçamento para recálculo depois do commit (ver services/receita.py).
+
+Os dias afetados por uma alteração ou exclusão são lidos no pre_* (depois as ligações
+já não existem) e só marcados no post_*, porque fora de transação o recálculo roda
+na hora e precisa ver o banco já alterado.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.atendimento.models import OrcamentoExames
+from apps.atendimento.services.receita import dias_dos_orcamentos, marcar_dias
+from apps.exame.models import Exame
+
+
+def _guardar_dias(instance, dias):
+    instance._dias_receita = dias
+
+
+def _marcar_dias_guardados(instance, *dias):
+    marcar_dias([*instance.__dict__.pop("_dias_receita", []), *dias])
+
+
+@receiver(pre_save, sender=OrcamentoExames)
+def orcamento_antes_de_salvar(sender, instance, **kwargs):
+    # Se a data mudou, o dia antigo também precisa ser refeito
+    if instance.pk:
+        _guardar_dias(instance, dias_dos_orcamentos(pk=instance.pk))
+
+
+@receiver(post_save, sender=OrcamentoExames)
+def orcamento_salvo(sender, instance, **kwargs):
+    _marcar_dias_guardados(instance, instance.data_cadastro)
+
+
+@receiver(post_delete, sender=OrcamentoExames)
+def orcamento_removido(sender, instance, **kwargs):
+    marcar_dias([instance.data_cadastro])
+
+
+@receiver(m2m_changed, sender=OrcamentoExames.exame.through)
+def exames_do_orcamento_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        _guardar_dias(instance, dias_dos_orcamentos(exame=instance))
+    elif action == "post_clear":
+        _marcar_dias_guardados(instance, None if reverse else instance.data_cadastro)
+    elif action in ("post_add", "post_remove"):
+        marcar_dias(dias_dos_orcamentos(pk__in=pk_set) if reverse else [instance.data_cadastro])
+
+
+@receiver(post_save, sender=Exame)
+def exame_salvo(sender, instance, **kwargs):
+    # Só a troca do plano cobrado (`Exame.cobrar`) muda o total dos orçamentos
+    if instance.__dict__.pop("_cobranca_alterada", False):
+        marcar_dias(dias_dos_orcamentos(exame=instance))
+
+
+@receiver(pre_delete, sender=Exame)
+def exame_antes_de_remover(sender, instance, **kwargs):
+    _guardar_dias(instance, dias_dos_orcamentos(exame=instance))
+
+
+@receiver(post_delete, sender=Exame)
+def exame_removido(sender, instance, **kwargs):
+    _marcar_dias_guardados(instance)
@@ -1,3 +1,110 @@
-from django.test import TestCase
+import io
+from decimal import Decimal
 
-# Create your tests here.
+from openpyxl import load_workbook
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from apps.atendimento.models import OrcamentoExames, ReceitaDiaria
+from apps.atendimento.services import exportacao, receita
+from apps.atendimento.services.relatorio import Periodo
+from apps.agenda.models import Plano
+from apps.core.models import Usuario
+from apps.exame.models import Exame
+from apps.exame.services import precos
+from apps.platform.middleware import set_current_tenant
+from apps.platform.models import Tenant
+
+
+class ReceitaDiariaTest(TestCase):
+
+    def setUp(self):
+        self.paciente = Usuario.objects.create(nome='Paciente', sexo='M')
+        self.tenants = [
+            Tenant.objects.create(name=f'Lab {letra}', slug=f'lab-{letra}', cnpj=f'0{numero}', responsible_name='Resp',
+                                  email=f'{letra}@exemplo.com')
+            for numero, letra in enumerate('ab')
+        ]
+        self.addCleanup(set_current_tenant, None)
+
+    def orcamento(self, preco):
+        exame = Exame.objects.create(nome='GLICOSE', material='Sangue', metodo='Enzimático', preco_cobrado=preco)
+        with self.captureOnCommitCallbacks(execute=True):
+            orcamento = OrcamentoExames.objects.create(paciente=self.paciente, valor_total=0, forma_pagamento='PIX',
+                                                       pagamento='PAGO')
+            orcamento.exame.add(exame)
+        return orcamento
+
+    def test_consolidado_igual_em_todos_os_hosts(self):
+        set_current_tenant(self.tenants[0])
+        orcamento = self.orcamento(Decimal('10.00'))
+        set_current_tenant(self.tenants[1])
+        self.orcamento(Decimal('5.50'))
+
+        esperado = OrcamentoExames.objects.total()
+        for tenant in (None, *self.tenants):
+            set_current_tenant(tenant)
+            linhas = receita.receita(orcamento.data_cadastro, orcamento.data_cadastro)
+            self.assertEqual([(linha.quantidade, linha.total) for linha in linhas], [(2, esperado)])
+        self.assertEqual(ReceitaDiaria.objects.count(), 1)
+
+    def test_clone_antigo_soma_o_primeiro_plano_antes_de_consolidar(self):
+        orcamento = self.orcamento(None)
+        legado = orcamento.exame.get()
+        legado.planos.add(Plano.objects.create(plano='Particular', preco=Decimal('30.00')),
+                          Plano.objects.create(plano='Convênio', preco=Decimal('12.00')))
+        receita.recalcular([orcamento.data_cadastro])
+
+        self.assertEqual(OrcamentoExames.objects.with_total().get().total, Decimal('30.00'))
+        self.assertEqual(ReceitaDiaria.objects.get().total, Decimal('30.00'))
+
+        self.assertEqual(precos.consolidar(), (1, 2))
+        legado.refresh_from_db()
+        self.assertEqual((legado.plano_cobrado, legado.preco_cobrado), ('Particular', Decimal('30.00')))
+        self.assertEqual(OrcamentoExames.objects.with_total().get().total, Decimal('30.00'))
+
+    def test_tela_do_orcamento_mostra_o_plano_do_clone_antigo(self):
+        orcamento = self.orcamento(None)
+        orcamento.exame.get().planos.add(Plano.objects.create(plano='Particular', preco=Decimal('30.00')),
+                                         Plano.objects.create(plano='Convênio', preco=Decimal('12.00')))
+        cliente = Client(HTTP_HOST='localhost')
+        cliente.force_login(get_user_model().objects.create_user('recepcao', 'recepcao@exemplo.com', 'x'))
+
+        resposta = cliente.get(reverse('atendimento:orcamento_update', kwargs={'pk': orcamento.pk}))
+        self.assertContains(resposta, 'Particular')
+        self.assertContains(resposta, 'R$ 30,00')
+        self.assertNotContains(resposta, 'Convênio')
+
+
+class ExportacaoTest(TestCase):
+
+    def setUp(self):
+        paciente = Usuario.objects.create(nome='=HYPERLINK("http://exemplo.com")', sexo='F')
+        for preco, pagamento in ((Decimal('10.00'), 'PAGO'), (Decimal('7.50'), 'PAGO'), (Decimal('4.00'), 'PENDENTE')):
+            orcamento = OrcamentoExames.objects.create(paciente=paciente, valor_total=0, forma_pagamento='PIX',
+                                                       pagamento=pagamento)
+            orcamento.exame.add(Exame.objects.create(nome='UREIA', material='Sangue', metodo='Enzimático',
+                                                     preco_cobrado=preco))
+        self.periodo = Periodo(orcamento.data_cadastro, orcamento.data_cadastro)
+        # Consolidado desatualizado: o resumo não pode depender dele
+        ReceitaDiaria.objects.all().delete()
+
+    def test_resumo_fecha_com_as_linhas(self):
+        self.assertEqual(exportacao.resumo(self.periodo), [
+            ('PIX', 'PAGO', 2, Decimal('17.50')),
+            ('PIX', 'PENDENTE', 1, Decimal('4.00')),
+            ('Total', '', 3, Decimal('21.50')),
+        ])
+
+    def test_csv_nao_exporta_formulas(self):
+        linhas = ''.join(exportacao.exportar(self.periodo, 'csv')).splitlines()
+        self.assertIn(';"\'=HYPERLINK(""http://exemplo.com"")";', linhas[1])
+        self.assertEqual(linhas[-1], 'Total;;3;21,50')
+
+    def test_xlsx_grava_texto_como_texto(self):
+        livro = load_workbook(io.BytesIO(b''.join(exportacao.exportar(self.periodo, 'xlsx'))))
+        celula = livro['Orçamentos']['C2']
+        self.assertEqual((celula.value, celula.data_type), ('=HYPERLINK("http://exemplo.com")', 's'))
+        self.assertEqual(livro['Formas de pagamento']['D4'].value, 21.5)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('relatorio/diario/', views.RelatorioDiario.as_view(), name='relatorio_diario'),
     path('relatorio/semanal/', views.RelatorioDSemanal.as_view(), name='relatorio_semanal'),
     path('relatorio/periodo/', views.RelatorioPeriodo.as_view(), name='relatorio_periodo'),
+    path('relatorio/periodo/exportar/', views.RelatorioPeriodoExportar.as_view(), name='relatorio_periodo_exportar'),
     path('ajax/buscar_exames/', views.buscar_exames, name='buscar_exames'),
     path('<int:pk>/<str:data>/<int:atendimento>/comprovante/pdf/', views.criar_comprovante, name='pdf_comprovate'),
 ]
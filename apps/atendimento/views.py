@@ -1,22 +1,29 @@
-import json
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core import serializers
 from django.db import transaction
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.views import View
 from django.views.generic import CreateView, ListView, UpdateView, TemplateView, FormView
 
 from ..agenda.models import OrdemChegada
 from ..atendimento.models import OrcamentoExames
+from ..atendimento.services import exportacao, relatorio
 from ..exame.models import *
 from .forms import OrcamentoForm, OrcamentoFinanceiroForm, OrcamentoForm1, AtualizarPagamentoForm
-from ..exame.exame_create import objeto_exame
+from ..exame.exame_create import clonar_exames
+from ..exame.services import catalogo, precos
+from ..core.services import paciente as busca_paciente
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 
+# Quantos exames do catálogo as buscas do orçamento devolvem
+LIMITE_BUSCA_EXAMES = 20
+# Atendimentos mais recentes devolvidos pela busca por paciente
+LIMITE_BUSCA_ATENDIMENTOS = 50
+
 
 class Orcamento(LoginRequiredMixin, SuccessMessageMixin,  CreateView):
     model = OrcamentoExames
@@ -51,10 +58,8 @@ class Orcamento(LoginRequiredMixin, SuccessMessageMixin,  CreateView):
             for numero in numeros:
                 sequencia_selecionada.append(numero)
 
-            for numero in exames_selecionados_ids:
-                id = int(numero)
-                obj_exame = objeto_exame(pk=id, sequencia=numeros)
-                orcamento.exame.add(obj_exame)
+            exames_clonados = clonar_exames(pks=exames_selecionados_ids, sequencia=numeros)
+            orcamento.exame.add(*exames_clonados)
 
         orcamento.save()
         return super().form_valid(form)
@@ -145,13 +150,11 @@ class OrcamentoOrdem1(LoginRequiredMixin, SuccessMessageMixin, CreateView):
 
 
 def buscar_exames_planos(request):
-    termo = request.GET.get('q', '')
-    exames = Exame.objects.none()  # Exibe nada por padrão
-    if termo:
-        exames = Exame.objects.filter(nome__icontains=termo).prefetch_related('planos')
+    encontrados = [exame.id for exame in catalogo.buscar(request.GET.get('q', ''), LIMITE_BUSCA_EXAMES)]
+    exames = Exame.objects.filter(pk__in=encontrados).prefetch_related('planos').in_bulk()
 
     resultados = []
-    for exame in exames:
+    for exame in (exames[pk] for pk in encontrados if pk in exames):
         planos = [{'id': plano.id, 'nome': plano.plano, 'preco': plano.preco} for plano in exame.planos.all()]
         resultados.append({'id': exame.id, 'nome': exame.nome, 'planos': planos})
 
@@ -159,10 +162,8 @@ def buscar_exames_planos(request):
 
 
 def add_orcamento_exames(request):
-    term = request.GET.get('q', '')
-    exames = Exame.objects.filter(nome__icontains=term, padrao=True)[:10]
+    exames = catalogo.buscar(request.GET.get('q', ''))
     resultados = [{'id': exame.id, 'nome': exame.nome} for exame in exames]
-    print(f'RESULTADOS: {resultados}')
     return JsonResponse(resultados, safe=False)
 
 
@@ -198,10 +199,8 @@ class OrcamentoOrdem(LoginRequiredMixin, SuccessMessageMixin, CreateView):
             for numero in numeros:
                 sequencia_selecionada.append(numero)
 
-            for numero in exames_selecionados_ids:
-                id = int(numero)
-                obj_exame = objeto_exame(pk=id, sequencia=numeros)
-                orcamento.exame.add(obj_exame)
+            exames_clonados = clonar_exames(pks=exames_selecionados_ids, sequencia=numeros)
+            orcamento.exame.add(*exames_clonados)
 
             ordem.status_atendido = 'ATENDIDO'
             ordem.save()
@@ -211,8 +210,7 @@ class OrcamentoOrdem(LoginRequiredMixin, SuccessMessageMixin, CreateView):
 
 
 def buscar_exames(request):
-    query = request.GET.get('q', '')
-    exames = Exame.objects.filter(nome__icontains=query, padrao=True) if query else []
+    exames = catalogo.buscar(request.GET.get('q', ''), LIMITE_BUSCA_EXAMES)
     exames_list = [{'id': exame.id, 'nome': exame.nome} for exame in exames]
     return JsonResponse({'exames': exames_list})
 
@@ -233,6 +231,7 @@ class OrcamentoUpdate(LoginRequiredMixin, TemplateView):
         contexto = super().get_context_data(**kwargs)
         orcamento = get_object_or_404(OrcamentoExames, pk=self.kwargs['pk'])
         contexto['orcamento'] = orcamento
+        contexto['exames'] = precos.com_cobranca(orcamento.exame.all())
         return contexto
 
 
@@ -276,18 +275,18 @@ class Buscaratendimento(LoginRequiredMixin, TemplateView):
 def buscar_atendimento(request):
     if request.POST.get('ajax_request') == 'true':
         res = None
-        nomes = request.POST.get('nomes')
+        nomes = request.POST.get('nomes', '')
 
-        query_se = OrcamentoExames.objects.filter(paciente__nome__icontains=nomes)
+        query_se = OrcamentoExames.objects.filter(
+            paciente__in=busca_paciente.consulta(nomes)).select_related('paciente').order_by(
+            '-data_cadastro', '-pk')[:LIMITE_BUSCA_ATENDIMENTOS]
 
-        if query_se.exists() and nomes:
+        if query_se:
             data = []
             for orcamento in query_se:
-                paciente_serialized = serializers.serialize('json', [orcamento.paciente, ])
-                paciente_dict = json.loads(paciente_serialized)[0]['fields']
                 item = {
                     'pk': orcamento.pk,
-                    'paciente': paciente_dict['nome'],  # Supondo que 'nome' é um campo no modelo Usuario
+                    'paciente': orcamento.paciente.nome,
                     'data': orcamento.data_cadastro.strftime("%d/%m/%Y"),
                 }
                 data.append(item)
@@ -306,6 +305,7 @@ class AtendimentoView(LoginRequiredMixin, TemplateView):
         contexto = super().get_context_data(**kwargs)
         orcamento = get_object_or_404(OrcamentoExames, pk=self.kwargs['pk'])
         contexto['orcamento'] = orcamento
+        contexto['exames'] = precos.com_cobranca(orcamento.exame.all())
         return contexto
 
 
@@ -318,6 +318,7 @@ class AtendimentoView1(LoginRequiredMixin, TemplateView):
         orcamento = get_object_or_404(OrcamentoExames, paciente=paciente, data_cadastro=self.kwargs['data'])
         exame_realizado = OrcamentoExames.algum_exame_realizado(orcamento)
         contexto['orcamento'] = orcamento
+        contexto['exames'] = precos.com_cobranca(orcamento.exame.all())
         contexto['exame_realizado'] = exame_realizado
         return contexto
 
@@ -342,14 +343,15 @@ class RelatorioDiario(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        total, atendimentos = OrcamentoExames.calcular_total_por_data_e_pagamento(data_cadastro=date.today(), pagamento='PAGO')
-        return atendimentos
+        hoje = date.today()
+        return relatorio.orcamentos(relatorio.Periodo(hoje, hoje), pagamento='PAGO').order_by('id')
 
     def get_context_data(self, **kwargs):
         contexto = super().get_context_data(**kwargs)
-        total, atendimentos1 = OrcamentoExames.calcular_total_por_data_e_pagamento(data_cadastro=date.today(), pagamento='PAGO')
-        contexto['total_atendimentos'] = self.get_queryset().count()
-        contexto['total'] = total
+        hoje = date.today()
+        resumo = relatorio.resumo_consolidado(relatorio.Periodo(hoje, hoje), pagamento='PAGO')
+        contexto['total_atendimentos'] = resumo.quantidade
+        contexto['total'] = resumo.total
         return contexto
 
 
@@ -360,74 +362,79 @@ class RelatorioDSemanal(LoginRequiredMixin, ListView):
     paginate_by = 5
 
     def get_queryset(self):
-        today = date.today()
-        inicio_semana = today - timedelta(days=today.weekday())
-        final_semana = inicio_semana + timedelta(days=6)
-        total, atendimentos = OrcamentoExames.calcular_total_por_periodo(data_inicio=inicio_semana,
-                                                                         data_fim=final_semana)
-        return atendimentos.order_by('-data_cadastro')
+        return relatorio.orcamentos(relatorio.semana(date.today())).order_by('-data_cadastro')
 
     def get_context_data(self, **kwargs):
         contexto = super().get_context_data(**kwargs)
-        today = date.today()
-        inicio_semana = today - timedelta(days=today.weekday())
-        final_semana = inicio_semana + timedelta(days=6)
-        total, atendimentos = OrcamentoExames.calcular_total_por_periodo(data_inicio=inicio_semana,
-                                                                         data_fim=final_semana)
-        contexto['total'] = total
-        contexto['total_atendimentos'] = self.get_queryset().count()
-        contexto['inicio'] = inicio_semana
-        contexto['final'] = final_semana
+        semana = relatorio.semana(date.today())
+        resumo = relatorio.resumo_consolidado(semana)
+        contexto['total'] = resumo.total
+        contexto['total_atendimentos'] = resumo.quantidade
+        contexto['inicio'] = semana.inicio
+        contexto['final'] = semana.fim
         return contexto
 
 
+def _periodo_do_request(request):
+    query = request.GET.get("inicio")
+    query1 = request.GET.get("final")
+    if query and query1:
+        return relatorio.Periodo(datetime.strptime(query, "%Y-%m-%d").date(),
+                                 datetime.strptime(query1, "%Y-%m-%d").date())
+    return None
+
+
 class RelatorioPeriodo(LoginRequiredMixin, ListView):
     model = OrcamentoExames
     template_name = 'atendimento/periodo.html'
     context_object_name = 'atendimentos'
     paginate_by = 10
 
-    def get_queryset(self):
-        query = self.request.GET.get("inicio")
-        query1 = self.request.GET.get("final")
-
-        if query and query1:
-            data_inicio = datetime.strptime(query, "%Y-%m-%d").date()
-            data_fim = datetime.strptime(query1, "%Y-%m-%d").date()
-
-            if data_inicio > data_fim:
-                return OrcamentoExames.objects.none()
+    def get_periodo(self):
+        return _periodo_do_request(self.request)
 
-            return OrcamentoExames.objects.filter(data_cadastro__range=(data_inicio, data_fim)).order_by('-data_cadastro')
-        else:
+    def get_queryset(self):
+        periodo = self.get_periodo()
+        if periodo is None or periodo.inicio > periodo.fim:
             return OrcamentoExames.objects.none()
+        return relatorio.orcamentos(periodo).order_by('-data_cadastro')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         contexto = super().get_context_data(*kwargs)
-        query = self.request.GET.get("inicio")
-        query1 = self.request.GET.get("final")
-        total = None
-        data_inicio = None
-        data_fim = None
-        if query and query1:
-            data_inicio = datetime.strptime(query, "%Y-%m-%d").date()
-            data_fim = datetime.strptime(query1, "%Y-%m-%d").date()
-            total, atendimentos = OrcamentoExames.calcular_total_por_periodo(data_inicio=data_inicio,
-                                                                         data_fim=data_fim)
-        contexto['inicio'] = data_inicio
-        contexto['final'] = data_fim
-        contexto['atendimentos_total'] = self.get_queryset().count()
-        contexto['total'] = total
+        periodo = self.get_periodo()
+        resumo = relatorio.resumo_consolidado(periodo) if periodo and periodo.inicio <= periodo.fim else None
+        contexto['inicio'] = periodo.inicio if periodo else None
+        contexto['final'] = periodo.fim if periodo else None
+        contexto['atendimentos_total'] = resumo.quantidade if resumo else 0
+        contexto['total'] = resumo.total if resumo else None
         return contexto
 
 
+class RelatorioPeriodoExportar(LoginRequiredMixin, View):
+    """Orçamentos do período em CSV ou XLSX (`?formato=`), gerados e enviados aos poucos."""
+
+    def get(self, request, *args, **kwargs):
+        formato = request.GET.get('formato', 'csv')
+        try:
+            periodo = _periodo_do_request(request)
+        except ValueError:
+            periodo = None
+        if formato not in exportacao.FORMATOS or periodo is None or periodo.inicio > periodo.fim:
+            return HttpResponseBadRequest('Informe a data inicial, a data final e o formato (csv ou xlsx).')
+
+        resposta = StreamingHttpResponse(exportacao.exportar(periodo, formato),
+                                         content_type=exportacao.FORMATOS[formato])
+        resposta['Content-Disposition'] = f'attachment; filename="{exportacao.nome_arquivo(periodo, formato)}"'
+        return resposta
+
+
 def criar_comprovante1(request, pk, data, atendimento):
     att = get_object_or_404(OrdemChegada, id=atendimento)
     paciente = get_object_or_404(Usuario, pk=pk)
     data_obj = datetime.strptime(data, "%Y-%m-%d")
     data_formatada = data_obj.strftime("%d/%m/%Y")
     atendimento = get_object_or_404(OrcamentoExames, paciente=paciente, data_cadastro=data)
-    exames = atendimento.exame.all()
+    exames = precos.com_cobranca(atendimento.exame.all())
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{atendimento.paciente}.pdf"'
 
@@ -524,9 +531,8 @@ def criar_comprovante1(request, pk, data, atendimento):
         posicao_horizontal_exame = ponto1[0] + 8
         posicao_vertical_exames -= 14
         c.drawString(posicao_horizontal_exame, posicao_vertical_exames, texto_exame)
-        planos = exame.planos.all()
-        for plano in planos:
-            c.drawString(ponto1[0] + 485, posicao_vertical_exames, f'R$ {plano.preco}')
+        if exame.preco is not None:
+            c.drawString(ponto1[0] + 485, posicao_vertical_exames, f'R$ {exame.preco:.2f}')
             contador += 1
 
 
@@ -556,7 +562,7 @@ def criar_comprovante(request, pk, data, atendimento):
     data_obj = datetime.strptime(data, "%Y-%m-%d")
     data_formatada = data_obj.strftime("%d/%m/%Y")
     atendimento = get_object_or_404(OrcamentoExames, paciente=paciente, data_cadastro=data)
-    exames = atendimento.exame.all()
+    exames = precos.com_cobranca(atendimento.exame.all())
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{atendimento.paciente}.pdf"'
 
@@ -622,9 +628,8 @@ def criar_comprovante(request, pk, data, atendimento):
         posicao_horizontal_exame = ponto1[0] + 8
         posicao_vertical_exames -= 14
         c.drawString(posicao_horizontal_exame, posicao_vertical_exames, texto_exame)
-        planos = exame.planos.all()
-        for plano in planos:
-            c.drawString(ponto1[0] + 485, posicao_vertical_exames, f'R$ {plano.preco}')
+        if exame.preco is not None:
+            c.drawString(ponto1[0] + 485, posicao_vertical_exames, f'R$ {exame.preco:.2f}')
             contador += 1
 
     altura_linha_7cm = posicao_vertical_exames - 14
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.services import paciente
+
+
+class Command(BaseCommand):
+    help = "Preenche as colunas de busca e refaz o índice de palavras de todos os pacientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=2000, help="Pacientes por transação.")
+
+    def handle(self, *args, lote=2000, **options):
+        pacientes, palavras = paciente.reindexar(lote=lote)
+        self.stdout.write(self.style.SUCCESS(f"{pacientes} paciente(s) indexado(s), {palavras} palavra(s)."))
@@ -6,7 +6,9 @@ from .base import (
     TenantAwareManager,
     TenantAwareSoftDeleteManager,
 )
+from .busca import PalavraPaciente
 from .paciente import Paciente
+from .sequencia import Sequencia
 
 # Models legados re-exportados para não quebrar migrations existentes.
 # Remover após migração completa para a nova estrutura.
@@ -22,6 +24,8 @@ __all__ = [
     "TenantAwareSoftDeleteManager",
     # Models novos
     "Paciente",
+    "PalavraPaciente",
+    "Sequencia",
     # Legados (temporário)
     "Usuario",
     "Endereco",
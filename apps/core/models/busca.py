@@ -0,0 +1,29 @@
+from django.db import models
+
+
+class PalavraPaciente(models.Model):
+    """
+    Índice de palavras dos nomes de pacientes, uma linha por palavra (sem acento, em
+    minúsculas). A busca por prefixo de cada palavra digitada vira uma faixa
+    `palavra >= 'mar' AND palavra < 'mar\\uffff'` sobre o índice, em qualquer banco.
+
+    Mantido pelos signals de apps/core/signals.py; para refazer use
+    `manage.py indexar_pacientes`.
+    """
+
+    usuario = models.ForeignKey(
+        "core.Usuario",
+        on_delete=models.CASCADE,
+        related_name="palavras_busca",
+    )
+    palavra = models.CharField(max_length=60)
+
+    class Meta:
+        verbose_name = "Palavra de Busca"
+        verbose_name_plural = "Palavras de Busca"
+        indexes = [
+            models.Index(fields=["palavra", "usuario"], name="palavra_paciente_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return self.palavra
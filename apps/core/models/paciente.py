@@ -6,7 +6,7 @@ from django.db import models
 from apps.core.models.base import SoftDeleteMixin, TenantAwareModel, TenantAwareSoftDeleteManager
 
 
-def _hash_cpf(cpf: str) -> str:
+def hash_cpf(cpf: str) -> str:
     """SHA-256 do CPF normalizado (apenas dígitos). Usado para busca sem expor o CPF."""
     digitos = "".join(c for c in cpf if c.isdigit())
     return hashlib.sha256(f"labsaas:{digitos}".encode()).hexdigest()
@@ -14,12 +14,12 @@ def _hash_cpf(cpf: str) -> str:
 
 class PacienteManager(TenantAwareSoftDeleteManager):
     def por_cpf(self, cpf: str):
-        return self.get_queryset().filter(cpf_hash=_hash_cpf(cpf))
+        return self.get_queryset().filter(cpf_hash=hash_cpf(cpf))
 
     def por_cpf_e_nascimento(self, cpf: str, data_nascimento):
         """Usado no login do portal do paciente (sem senha)."""
         return self.get_queryset().filter(
-            cpf_hash=_hash_cpf(cpf),
+            cpf_hash=hash_cpf(cpf),
             data_nascimento=data_nascimento,
         )
 
@@ -91,7 +91,7 @@ class Paciente(TenantAwareModel, SoftDeleteMixin):
         return f"{self.nome_completo} ({self.cpf})"
 
     def save(self, *args, **kwargs):
-        self.cpf_hash = _hash_cpf(self.cpf)
+        self.cpf_hash = hash_cpf(self.cpf)
         super().save(*args, **kwargs)
 
     @property
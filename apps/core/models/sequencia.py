@@ -0,0 +1,49 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Sequencia(models.Model):
+    """
+    Contador nomeado usado para numerar registros (código de exame, senha da fila, ...).
+
+    Uma linha por (tenant, escopo, chave). Ex.: escopo="exame.codigo", chave="102026"
+    guarda o último número de exame emitido em outubro/2026. `tenant` é opcional
+    enquanto os models legados não são tenant-aware.
+
+    Nunca altere `valor` diretamente — use apps.core.services.sequencia.
+    """
+
+    tenant = models.ForeignKey(
+        "platform.Tenant",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="sequencias",
+        verbose_name="Tenant",
+    )
+    escopo = models.CharField(max_length=50, verbose_name="Escopo")
+    chave = models.CharField(max_length=50, verbose_name="Chave")
+    valor = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Último valor emitido",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Sequência"
+        verbose_name_plural = "Sequências"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "escopo", "chave"],
+                condition=Q(tenant__isnull=False),
+                name="sequencia_unica_por_tenant",
+            ),
+            models.UniqueConstraint(
+                fields=["escopo", "chave"],
+                condition=Q(tenant__isnull=True),
+                name="sequencia_unica_global",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.escopo}:{self.chave} = {self.valor}"
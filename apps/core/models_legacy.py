@@ -27,6 +27,9 @@ class Usuario(models.Model):
     doutor = models.BooleanField(verbose_name='Bio_Médico(a)?', default=False)
     paciente = models.BooleanField(verbose_name='Paciente?', default=False)
     status = models.BooleanField(verbose_name='Status', default=True)
+    # Preenchidos a cada gravação para a busca de pacientes (ver services/paciente.py)
+    nome_busca = models.CharField(max_length=155, blank=True, editable=False, db_index=True)
+    cpf_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
 
 
     def __str__(self):
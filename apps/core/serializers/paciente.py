@@ -74,8 +74,8 @@ class PacienteDetailSerializer(serializers.ModelSerializer):
         cpf = attrs.get("cpf", getattr(self.instance, "cpf", None))
 
         if cpf:
-            from apps.core.models.paciente import _hash_cpf
-            cpf_hash = _hash_cpf(cpf)
+            from apps.core.models.paciente import hash_cpf
+            cpf_hash = hash_cpf(cpf)
             qs = Paciente.global_objects.filter(
                 tenant=tenant,
                 cpf_hash=cpf_hash,
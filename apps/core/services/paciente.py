@@ -0,0 +1,128 @@
+"""
+Busca de pacientes (`Usuario`) para as telas da recepção.
+
+O nome de cada paciente é guardado normalizado (sem acento, em minúsculas) em
+`Usuario.nome_busca`, e cada palavra dele vira uma linha de `PalavraPaciente`.
+Cada palavra digitada casa com o começo de alguma palavra do nome ("mar sil"
+encontra "Maria da Silva"), buscando uma faixa no índice de palavras em vez de
+varrer a tabela com `icontains`; a consulta é a mesma em SQLite e PostgreSQL.
+
+O resultado é limitado e ordenado: nomes que começam pelo texto digitado, depois os
+mais curtos, depois em ordem alfabética. Um termo com 11 dígitos é tratado como
+CPF e procurado pelo hash (`cpf_hash`), o mesmo usado por `Paciente`.
+"""
+
+import unicodedata
+from collections.abc import Iterable
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, QuerySet, Value, When
+from django.db.models.functions import Length
+
+from apps.core.models import PalavraPaciente, Usuario
+from apps.core.models.paciente import hash_cpf
+
+LIMITE_PADRAO = 20
+# Palavras digitadas além disso não filtram mais nada na prática
+MAX_PALAVRAS = 5
+
+
+def palavras(texto: str) -> list[str]:
+    """Palavras do texto sem acento e em minúsculas."""
+    sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return "".join(c if c.isalnum() else " " for c in sem_acento.lower()).split()
+
+
+def normalizar(texto: str) -> str:
+    return " ".join(palavras(texto))
+
+
+def parece_cpf(termo: str) -> bool:
+    digitos = [c for c in termo if c.isdigit()]
+    return len(digitos) == 11 and all(c.isdigit() or c in ".-/ " for c in termo.strip())
+
+
+def cpf_hash(cpf: str | None) -> str:
+    """Valor de `Usuario.cpf_hash`; vazio quando o paciente não tem CPF."""
+    return hash_cpf(cpf) if cpf and any(c.isdigit() for c in cpf) else ""
+
+
+# ----------------------------------------------------------------------
+# Busca
+# ----------------------------------------------------------------------
+
+
+def consulta(termo: str) -> QuerySet:
+    """Pacientes que casam com `termo`, sem ordem nem limite (para usar em subconsultas)."""
+    termo = (termo or "").strip()
+    if parece_cpf(termo):
+        return Usuario.objects.filter(cpf_hash=cpf_hash(termo))
+
+    digitadas = palavras(termo)[:MAX_PALAVRAS]
+    if not digitadas:
+        return Usuario.objects.none()
+
+    pacientes = Usuario.objects.all()
+    for palavra in digitadas:
+        pacientes = pacientes.filter(pk__in=PalavraPaciente.objects.filter(
+            palavra__gte=palavra, palavra__lt=palavra + "\uffff",
+        ).values("usuario"))
+    return pacientes
+
+
+def buscar(termo: str, limite: int = LIMITE_PADRAO) -> list[Usuario]:
+    """Até `limite` pacientes que casam com `termo`, os mais prováveis primeiro."""
+    inicio = normalizar(termo)
+    return list(
+        consulta(termo)
+        .annotate(
+            comeca=Case(When(nome_busca__startswith=inicio, then=Value(0)), default=Value(1),
+                        output_field=IntegerField()),
+            tamanho=Length("nome_busca"),
+        )
+        .order_by("comeca", "tamanho", "nome_busca", "pk")[:limite]
+    )
+
+
+# ----------------------------------------------------------------------
+# Índice
+# ----------------------------------------------------------------------
+
+
+def preencher(usuario: Usuario) -> None:
+    """Atualiza as colunas de busca do paciente antes de gravar."""
+    usuario.nome_busca = normalizar(usuario.nome)[:155]
+    usuario.cpf_hash = cpf_hash(usuario.cpf)
+
+
+def indexar(usuarios: Iterable[Usuario]) -> int:
+    """Refaz as palavras de busca dos pacientes. Retorna quantas palavras foram gravadas."""
+    usuarios = list(usuarios)
+    with transaction.atomic():
+        PalavraPaciente.objects.filter(usuario__in=usuarios).delete()
+        criadas = PalavraPaciente.objects.bulk_create([
+            PalavraPaciente(usuario=usuario, palavra=palavra[:60])
+            for usuario in usuarios
+            for palavra in set(palavras(usuario.nome))
+        ])
+    return len(criadas)
+
+
+def reindexar(lote: int = 2000) -> tuple[int, int]:
+    """
+    Preenche `nome_busca`/`cpf_hash` e refaz as palavras de todos os pacientes, em lotes
+    de `lote` pacientes por transação. Retorna (pacientes, palavras).
+    """
+    pacientes = palavras_gravadas = 0
+    ultimo = 0
+    while True:
+        usuarios = list(Usuario.objects.filter(pk__gt=ultimo).order_by("pk").only("pk", "nome", "cpf")[:lote])
+        if not usuarios:
+            return pacientes, palavras_gravadas
+        for usuario in usuarios:
+            preencher(usuario)
+        with transaction.atomic():
+            Usuario.objects.bulk_update(usuarios, ["nome_busca", "cpf_hash"])
+            palavras_gravadas += indexar(usuarios)
+        pacientes += len(usuarios)
+        ultimo = usuarios[-1].pk
@@ -0,0 +1,89 @@
+"""
+Métricas do painel administrativo.
+
+Todos os números do painel saem de três consultas agrupadas (fila do dia, exames do
+dia e receita consolidada de dia/semana/mês), com contagens condicionais em vez de
+um COUNT por quadro. O resultado fica em cache por tenant por `PAINEL_CACHE_TTL`
+segundos e é descartado quando fila, exames ou receita mudam (ver apps/core/signals.py);
+o descarte vale para todos os processos porque o cache é compartilhado (CACHES em settings).
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.agenda.services import fila
+from apps.atendimento.models import Reais
+from apps.atendimento.services import receita, relatorio
+from apps.exame.models import Exame
+from apps.platform.middleware import get_current_tenant
+
+PAINEL_CACHE_TTL = getattr(settings, "PAINEL_CACHE_TTL", 30)
+
+
+def _chave(tenant) -> str:
+    return f"painel:metricas:{getattr(tenant, 'pk', 'global')}"
+
+
+def calcular(hoje: date) -> dict:
+    semana = relatorio.semana(hoje)
+    mes = relatorio.mes(hoje)
+
+    fila_do_dia = fila.contagem(hoje)
+    exames = Exame.objects.filter(data_cadastro__date=hoje).aggregate(
+        qtd_exames=Count("pk", filter=Q(status_exame="AGUARDANDO", padrao=False, terceirizado=False)),
+        qtd_exames_realizados=Count("pk", filter=Q(status_exame="REALIZADO")),
+    )
+    receitas = receita.receita(min(semana.inicio, mes.inicio), max(semana.fim, mes.fim)).aggregate(
+        ated_diario=Sum("quantidade", filter=Q(data=hoje)),
+        atendimentos=Sum("quantidade", filter=Q(data__range=semana)),
+        atendimentos_mes=Sum("quantidade", filter=Q(data__range=mes)),
+        # Os aliases não podem repetir o nome do campo `total`
+        receita_semana=Reais(Sum("total", filter=Q(data__range=semana))),
+        receita_mes=Reais(Sum("total", filter=Q(data__range=mes))),
+    )
+
+    return {
+        "data": hoje,
+        "inicio": semana.inicio,
+        "final": semana.fim,
+        "primeiro": mes.inicio,
+        "ultimo": mes.fim,
+        "fila_total": fila_do_dia.total,
+        "fila_aguardando": fila_do_dia.aguardando,
+        "fila_atendido": fila_do_dia.atendido,
+        **exames,
+        "ated_diario": receitas["ated_diario"] or 0,
+        "atendimentos": receitas["atendimentos"] or 0,
+        "atendimentos_mes": receitas["atendimentos_mes"] or 0,
+        "total": receitas["receita_semana"],
+        "total1": receitas["receita_mes"],
+    }
+
+
+def metricas(tenant=None) -> dict:
+    """Métricas de hoje do tenant (padrão: o do request atual), do cache quando possível."""
+    tenant = tenant if tenant is not None else get_current_tenant()
+    hoje = timezone.localdate()
+    chave = _chave(tenant)
+
+    valores = cache.get(chave)
+    if valores is None or valores["data"] != hoje:
+        valores = calcular(hoje)
+        cache.set(chave, valores, PAINEL_CACHE_TTL)
+    return valores
+
+
+def invalidar(tenant=None) -> None:
+    cache.delete(_chave(tenant if tenant is not None else get_current_tenant()))
+
+
+def para_json(valores: dict) -> dict:
+    return {
+        chave: valor.isoformat() if isinstance(valor, date) else str(valor) if isinstance(valor, Decimal) else valor
+        for chave, valor in valores.items()
+    }
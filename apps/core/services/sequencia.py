@@ -0,0 +1,138 @@
+import threading
+from collections.abc import Callable
+
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+
+from apps.core.models.sequencia import Sequencia
+
+
+def reservar(
+    escopo: str,
+    chave: str,
+    quantidade: int = 1,
+    tenant=None,
+    inicial: Callable[[], int] | None = None,
+) -> range:
+    """
+    Reserva `quantidade` valores consecutivos da sequência (tenant, escopo, chave).
+
+    O incremento é um único `UPDATE ... SET valor = valor + n`: o banco trava a linha
+    do contador até o fim da transação, então duas reservas concorrentes nunca
+    recebem o mesmo valor. Dentro de uma transação que sofre rollback os valores
+    voltam para o contador — útil para numeração sem buracos.
+
+    `inicial` é chamado apenas quando o contador ainda não existe e deve retornar o
+    último valor já emitido (ex.: o maior número gravado antes do contador existir).
+    """
+    if quantidade < 1:
+        raise ValueError("A quantidade reservada deve ser maior que zero.")
+
+    with transaction.atomic():
+        contador = Sequencia.objects.filter(tenant=tenant, escopo=escopo, chave=chave)
+        if not contador.update(valor=F("valor") + quantidade):
+            _criar_contador(tenant, escopo, chave, inicial)
+            contador.update(valor=F("valor") + quantidade)
+        ultimo = contador.values_list("valor", flat=True).get()
+
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def proximo(escopo: str, chave: str, tenant=None, inicial: Callable[[], int] | None = None) -> int:
+    """Atalho para reservar um único valor."""
+    return reservar(escopo, chave, 1, tenant=tenant, inicial=inicial)[0]
+
+
+def _criar_contador(tenant, escopo: str, chave: str, inicial: Callable[[], int] | None) -> None:
+    valor = inicial() if inicial else 0
+    try:
+        # Savepoint: se outro processo criou o contador ao mesmo tempo, a
+        # transação externa continua válida e o UPDATE seguinte usa a linha dele.
+        with transaction.atomic():
+            Sequencia.objects.create(tenant=tenant, escopo=escopo, chave=chave, valor=valor)
+    except IntegrityError:
+        pass
+
+
+class BlocoSequencia:
+    """
+    Entrega valores de uma sequência reservando blocos de `tamanho` por vez.
+
+    Cada processo guarda em memória o restante do bloco reservado, então a maior
+    parte das chamadas não toca o banco e a linha do contador fica travada só
+    durante a reserva do bloco. Os valores são únicos, mas não contíguos entre
+    processos, e os não usados de um bloco se perdem quando o processo termina —
+    use apenas para numeração que tolera buracos (ex.: código de exame).
+
+    Uso:
+        codigos = BlocoSequencia("exame.codigo", tamanho=50)
+        numeros = codigos.reservar("102026", quantidade=10)
+    """
+
+    def __init__(self, escopo: str, tamanho: int = 50):
+        self.escopo = escopo
+        self.tamanho = tamanho
+        self._blocos: dict[tuple, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def reservar(
+        self,
+        chave: str,
+        quantidade: int = 1,
+        tenant=None,
+        inicial: Callable[[], int] | None = None,
+    ) -> list[int]:
+        if quantidade < 1:
+            raise ValueError("A quantidade reservada deve ser maior que zero.")
+
+        identificador = (getattr(tenant, "pk", None), chave)
+        with self._lock:
+            disponiveis = self._blocos.get(identificador, [])
+            if len(disponiveis) < quantidade:
+                falta = quantidade - len(disponiveis)
+                novos = self._reservar_bloco(chave, max(falta, self.tamanho), tenant, inicial)
+                if novos is None:
+                    # Sem bloco em cache: reserva apenas o necessário na transação atual.
+                    self._blocos.pop(identificador, None)
+                    return disponiveis + list(
+                        reservar(self.escopo, chave, falta, tenant=tenant, inicial=inicial)
+                    )
+                disponiveis = disponiveis + novos
+            entregues, self._blocos[identificador] = disponiveis[:quantidade], disponiveis[quantidade:]
+        return entregues
+
+    def descartar(self) -> None:
+        """Esquece os blocos em memória (os valores não usados viram buracos)."""
+        with self._lock:
+            self._blocos.clear()
+
+    def _reservar_bloco(self, chave, quantidade, tenant, inicial) -> list[int] | None:
+        if not connection.in_atomic_block:
+            return list(reservar(self.escopo, chave, quantidade, tenant=tenant, inicial=inicial))
+
+        if connection.vendor == "sqlite":
+            # SQLite tem uma única trava de escrita: uma segunda conexão esperaria a
+            # transação atual terminar. Nesse caso não há bloco em cache.
+            return None
+
+        # Dentro de uma transação o bloco precisa ser confirmado de forma independente:
+        # se a transação atual sofrer rollback, os valores guardados em memória não
+        # podem voltar para o contador. Uma thread usa a própria conexão e faz commit.
+        resultado: dict = {}
+
+        def _reservar():
+            try:
+                resultado["valores"] = list(
+                    reservar(self.escopo, chave, quantidade, tenant=tenant, inicial=inicial)
+                )
+            except Exception as exc:  # propagado para a thread chamadora
+                resultado["erro"] = exc
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=_reservar, name=f"sequencia-{self.escopo}")
+        thread.start()
+        thread.join()
+        if "erro" in resultado:
+            raise resultado["erro"]
+        return resultado["valores"]
@@ -0,0 +1,37 @@
+"""
+Descarta as métricas do painel em cache quando a fila ou os exames mudam. A receita
+consolidada descarta o cache por conta própria, depois de recalcular os dias.
+
+Mantém as colunas e as palavras de busca de cada paciente (ver services/paciente.py).
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.agenda.models import OrdemChegada
+from apps.core.models import Usuario
+from apps.core.services import painel, paciente
+from apps.exame.models import Exame
+from apps.platform.middleware import get_current_tenant
+
+
+@receiver(post_save, sender=OrdemChegada)
+@receiver(post_delete, sender=OrdemChegada)
+@receiver(post_save, sender=Exame)
+@receiver(post_delete, sender=Exame)
+def invalidar_painel(sender, **kwargs):
+    transaction.on_commit(partial(painel.invalidar, get_current_tenant()))
+
+
+@receiver(pre_save, sender=Usuario)
+def preencher_busca_paciente(sender, instance, **kwargs):
+    paciente.preencher(instance)
+
+
+@receiver(post_save, sender=Usuario)
+def indexar_paciente(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "nome" in update_fields:
+        paciente.indexar([instance])
@@ -1,3 +1,108 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+
+from apps.core.models import PalavraPaciente, Usuario
+from apps.core.models.paciente import hash_cpf
+from apps.core.models.sequencia import Sequencia
+from apps.core.services import paciente, sequencia
+from apps.core.services.sequencia import BlocoSequencia
+
+
+def _em_paralelo(funcao, threads=8):
+    """Roda `funcao` em `threads` threads ao mesmo tempo e devolve os resultados."""
+    inicio = threading.Barrier(threads)
+    resultados, erros = [], []
+
+    def executar():
+        try:
+            inicio.wait()
+            resultados.append(funcao())
+        except Exception as exc:
+            erros.append(exc)
+        finally:
+            connections.close_all()
+
+    trabalhadores = [threading.Thread(target=executar) for _ in range(threads)]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    if erros:
+        raise erros[0]
+    return resultados
+
+
+class ReservarTest(TestCase):
+
+    def test_reserva_valores_consecutivos(self):
+        self.assertEqual(list(sequencia.reservar("teste", "a", 3)), [1, 2, 3])
+        self.assertEqual(sequencia.proximo("teste", "a"), 4)
+        self.assertEqual(sequencia.proximo("teste", "b"), 1)
+
+    def test_contador_novo_parte_do_inicial(self):
+        self.assertEqual(list(sequencia.reservar("teste", "a", 2, inicial=lambda: 41)), [42, 43])
+
+    def test_quantidade_invalida(self):
+        with self.assertRaises(ValueError):
+            sequencia.reservar("teste", "a", 0)
+
+
+class ReservaConcorrenteTest(TransactionTestCase):
+
+    def test_reservar_em_paralelo_nao_repete_valores(self):
+        def reservas():
+            return [
+                valor
+                for _ in range(25)
+                for valor in sequencia.reservar("teste", "paralelo", 2)
+            ]
+
+        valores = [valor for lista in _em_paralelo(reservas) for valor in lista]
+        self.assertEqual(len(valores), 8 * 25 * 2)
+        self.assertEqual(sorted(valores), list(range(1, len(valores) + 1)))
+        self.assertEqual(Sequencia.objects.get(escopo="teste", chave="paralelo").valor, len(valores))
+
+    def test_bloco_em_paralelo_nao_repete_valores(self):
+        blocos = [BlocoSequencia("teste.bloco", tamanho=7) for _ in range(2)]
+
+        def reservas():
+            return [
+                valor
+                for posicao in range(40)
+                for valor in blocos[posicao % 2].reservar("mes", 3)
+            ]
+
+        valores = [valor for lista in _em_paralelo(reservas) for valor in lista]
+        self.assertEqual(len(valores), 8 * 40 * 3)
+        self.assertEqual(len(set(valores)), len(valores))
+
+
+class BuscaPacienteTest(TestCase):
+
+    def setUp(self):
+        self.maria = Usuario.objects.create(nome='Maria da Silva', sexo='F', cpf='123.456.789-09')
+        self.mario = Usuario.objects.create(nome='Mário Silveira', sexo='M')
+        self.ana = Usuario.objects.create(nome='Ana Maria Souza', sexo='F')
+
+    def test_gravar_mantem_nome_busca_cpf_hash_e_palavras(self):
+        self.assertEqual(self.mario.nome_busca, 'mario silveira')
+        self.assertEqual(self.mario.cpf_hash, '')
+        self.assertEqual(self.maria.cpf_hash, hash_cpf('12345678909'))
+
+        self.mario.nome = 'Mário Costa'
+        self.mario.save(update_fields=['nome'])
+        self.assertEqual(sorted(PalavraPaciente.objects.filter(usuario=self.mario).values_list('palavra', flat=True)),
+                         ['costa', 'mario'])
+
+    def test_cada_palavra_casa_com_o_comeco_de_uma_palavra_do_nome(self):
+        self.assertEqual(paciente.buscar('mar sil'), [self.maria, self.mario])
+        self.assertEqual(paciente.buscar('MARI'), [self.maria, self.mario, self.ana])
+        self.assertEqual(paciente.buscar('ari'), [])
+        self.assertEqual(paciente.buscar('souza ana'), [self.ana])
+
+    def test_cpf_e_procurado_pelo_hash(self):
+        for termo in ('123.456.789-09', '12345678909'):
+            self.assertEqual(paciente.buscar(termo), [self.maria])
+        self.assertEqual(paciente.buscar('000.000.000-00'), [])
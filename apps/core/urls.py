@@ -15,6 +15,7 @@ urlpatterns = [
     path('painel/cadastrar/novo/funcionario/', views.CadastrarFuncionario.as_view(), name='add_funcionario'),
     path('painel/<int:id>/endereco/', views.EnderecoCad.as_view(), name='endereco'),
     path('painel/administrativo/', views.Painel.as_view(), name='painel'),
+    path('painel/administrativo/metricas/', views.PainelMetricas.as_view(), name='painel_metricas'),
     path('painel/lista/pacientes/', views.Pacientes.as_view(), name='pacientes'),
     path('painel/lista/funcionarios/', views.Funcionarios.as_view(), name='funcionarios'),
     path('buscar/atendimento/paciente/', views.BuscarAtendimentoPaciente.as_view(), name='buscar_paciente'),
@@ -2,7 +2,7 @@
 # sem alterações enquanto a migração para a API REST não é concluída.
 from apps.core.views_legacy import (
     Home, Sobre, Servicos, Blog, Contato,
-    Painel,
+    Painel, PainelMetricas,
     Cadastrar, AtualizarUser, CadastrarFuncionario,
     EnderecoCad,
     custom_login_redirect,
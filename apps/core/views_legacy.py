@@ -1,5 +1,3 @@
-from datetime import date, timedelta
-
 from django.contrib import messages
 from django.contrib.auth.forms import PasswordChangeForm, SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -10,13 +8,11 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView, CreateView, ListView, DetailView, UpdateView, FormView
+from django.views.generic import View, TemplateView, CreateView, ListView, DetailView, UpdateView, FormView
 from .models import Usuario, Endereco
 from .forms import CriarUsuarioForm, EnderecoForm, CriarFuncionarioForm, AtualizarUsuarioForm
 from .permissoes import PermissaoFuncionariosMixin
-from ..agenda.models import OrdemChegada
-from ..atendimento.models import OrcamentoExames
-from ..exame.models import Exame
+from .services import painel, paciente as busca_paciente
 
 
 class Home(TemplateView):
@@ -44,46 +40,17 @@ class Painel(PermissaoFuncionariosMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         contexto = super().get_context_data(**kwargs)
-        #DATA
-        today = date.today()
-        inicio_semana = today - timedelta(days=today.weekday())
-        final_semana = inicio_semana + timedelta(days=6)
-        primeiro_dia = date(today.year, today.month, 1)
-        next_month = today.replace(day=28) + timedelta(days=4)
-        ultimo_dia = next_month - timedelta(days=next_month.day)
-        #ATENDIMENTOS
-        total, atendimentos = OrcamentoExames.calcular_total_por_periodo(data_inicio=inicio_semana,
-                                                                         data_fim=final_semana)
-
-        total1, atendimentos_mes = OrcamentoExames.calcular_total_por_periodo(data_inicio=primeiro_dia,
-                                                                         data_fim=ultimo_dia)
-        #FILA
-        fila_total = OrdemChegada.fila_dia_total(today)
-        fila_aguardando = OrdemChegada.fila_dia_aguardando(today)
-        fila_atendido = OrdemChegada.fila_dia_atendido(today)
-
-        #Exames
-        exames_aguardando = Exame.objects.filter(data_cadastro__date=today, status_exame='AGUARDANDO', padrao=False, terceirizado=False).count
-        exames_realizados = Exame.objects.filter(data_cadastro__date=today, status_exame='REALIZADO').count
-
-        contexto['ated_diario'] = OrcamentoExames.total_atendimentos_diarios
-        contexto['data'] = today
-        contexto['total'] = total
-        contexto['total1'] = total1
-        contexto['inicio'] = inicio_semana
-        contexto['final'] = final_semana
-        contexto['primeiro'] = primeiro_dia
-        contexto['ultimo'] = ultimo_dia
-        contexto['atendimentos'] = atendimentos.count
-        contexto['atendimentos_mes'] = atendimentos_mes.count
-        contexto['fila_total'] = fila_total
-        contexto['fila_aguardando'] = fila_aguardando
-        contexto['fila_atendido'] = fila_atendido
-        contexto['qtd_exames'] = exames_aguardando
-        contexto['qtd_exames_realizados'] = exames_realizados
+        contexto.update(painel.metricas())
         return contexto
 
 
+class PainelMetricas(PermissaoFuncionariosMixin, View):
+    """Números do painel em JSON, para atualizar os quadros sem recarregar a página."""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(painel.para_json(painel.metricas()))
+
+
 class Cadastrar(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     model = Usuario
     form_class = CriarUsuarioForm
@@ -241,28 +208,21 @@ class AtualizarEndereco(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
         return reverse_lazy('home:perfil', kwargs={'pk': endereco.pessoa.pk})
 
 
-def buscar_atendimento_paciente(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Usuario.objects.filter(nome__icontains=nomes)
+def _busca_paciente_ajax(request, sem_cpf=None):
+    if request.POST.get('ajax_request') != 'true':
+        return JsonResponse({})
 
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for paciente in query_se:
-                item = {
-                    'pk': paciente.pk,
-                    'nome': paciente.nome,
-                    'cpf': paciente.cpf,
-                }
+    pacientes = busca_paciente.buscar(request.POST.get('nomes', ''))
+    if not pacientes:
+        return JsonResponse({'data': 'Nenhum paciente encontrado'})
+    return JsonResponse({'data': [
+        {'pk': paciente.pk, 'nome': paciente.nome, 'cpf': paciente.cpf or sem_cpf}
+        for paciente in pacientes
+    ]})
 
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum paciente encontrado'
 
-        return JsonResponse({'data': res})
-    return JsonResponse({})
+def buscar_atendimento_paciente(request):
+    return _busca_paciente_ajax(request)
 
 
 class BuscarOpcoesPaciente(LoginRequiredMixin, TemplateView):
@@ -270,30 +230,7 @@ class BuscarOpcoesPaciente(LoginRequiredMixin, TemplateView):
 
 
 def buscar_paciente(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Usuario.objects.filter(nome__icontains=nomes)
-
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for paciente in query_se:
-                retorno = 'CPF não cadastrado'
-                if paciente.cpf:
-                    retorno = paciente.cpf
-                item = {
-                    'pk': paciente.pk,
-                    'nome': paciente.nome,
-                    'cpf': retorno,
-                }
-
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum paciente encontrado'
-
-        return JsonResponse({'data': res})
-    return JsonResponse({})
+    return _busca_paciente_ajax(request, sem_cpf='CPF não cadastrado')
 
 
 class OpcoesPaciente(LoginRequiredMixin, TemplateView):
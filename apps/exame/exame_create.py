@@ -1,111 +1,107 @@
-from django.shortcuts import get_object_or_404, get_list_or_404
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+
 from .models import *
 from ..agenda.models import Plano
 
 
+def _plano_selecionado(exame_padrao, selecionados):
+    # Vale o primeiro plano selecionado do exame, como o `exame.planos.first()` de antes
+    return next((plano for plano in exame_padrao.planos.all() if plano.pk in selecionados), None)
+
+
 def objeto_exame(pk, sequencia):
-    exame_padrao = get_object_or_404(Exame, pk=pk)
-    planos_padrao = exame_padrao.planos.all()
+    return clonar_exames([pk], sequencia)[0]
 
-    exame_copia = Exame.objects.create(
-        nome=exame_padrao.nome,
-        material=exame_padrao.material,
-        metodo=exame_padrao.metodo,
-        comentario=exame_padrao.comentario,
-        padrao=False,
-        terceirizado=exame_padrao.terceirizado
-    )
 
-    for plano1 in planos_padrao:
-        for num in sequencia:
-            if num == plano1.pk:
-                plano2 = Plano.objects.create(
-                    plano=plano1.plano,
-                    preco=plano1.preco,
-                    habilitado=True
-                )
-                exame_copia.planos.add(plano2)
+@transaction.atomic
+def clonar_exames(pks, sequencia):
+    """
+    Copia exames do catálogo (padrao=True) para um atendimento.
 
-    exame_copia.save()
+    Toda a árvore do catálogo (planos, referências, fatores e valores esperados) é
+    carregada de uma vez e as cópias são gravadas com um `bulk_create` por tabela,
+    então o número de consultas não depende de quantos exames ou referências existem.
+    Os planos não são copiados: o clone guarda só o nome e o preço do plano cobrado.
 
-    referencias_do_exame_padrao = exame_padrao.referencias.all()
+    :param pks: ids dos exames do catálogo, na ordem em que devem ser clonados
+    :param sequencia: ids dos planos do catálogo selecionados no atendimento
+    :return: lista de exames clonados, na mesma ordem de `pks`
+    """
+    pks = [int(pk) for pk in pks]
+    if not pks:
+        return []
 
-    for ref_padrao in referencias_do_exame_padrao:
-        if ref_padrao.fator is False and ref_padrao.esperado is False:
-            referencia_exame_copia = ReferenciaExame.objects.create(
-                exame=exame_copia,
-                nome_referencia=ref_padrao.nome_referencia,
-                limite_inferior=ref_padrao.limite_inferior,
-                limite_superior=ref_padrao.limite_superior,
-                valor_obtido=ref_padrao.valor_obtido,
-            )
-        elif ref_padrao.fator is True and ref_padrao.esperado is True:
-            referencia_exame_copia = ReferenciaExame.objects.create(
-                exame=exame_copia,
-                nome_referencia=ref_padrao.nome_referencia,
-                limite_inferior=ref_padrao.limite_inferior,
-                limite_superior=ref_padrao.limite_superior,
-                valor_obtido=ref_padrao.valor_obtido,
-                fator=True,
-                esperado=True
-            )
-            fatores_referencia_padrao = ref_padrao.fatores.all()
+    catalogo = Exame.objects.filter(pk__in=set(pks)).prefetch_related(
+        Prefetch('planos', queryset=Plano.objects.order_by('pk')),
+        Prefetch('referencias', queryset=ReferenciaExame.objects.order_by('pk').prefetch_related(
+            Prefetch('fatores', queryset=FatoresReferencia.objects.order_by('pk')),
+            Prefetch('padrao', queryset=ValorEsperado.objects.order_by('pk')),
+        )),
+    )
+    exames_padrao = {exame.pk: exame for exame in catalogo}
+    for pk in pks:
+        if pk not in exames_padrao:
+            raise Http404('Nenhum Exame corresponde à busca.')
 
-            for fatores_padrao in fatores_referencia_padrao:
-                fatores_copia = FatoresReferencia.objects.create(
-                    referencia_exame=referencia_exame_copia,
-                    nome_fator=fatores_padrao.nome_fator,
-                    idade=fatores_padrao.idade,
-                    limite_inferior=fatores_padrao.limite_inferior,
-                    limite_superior=fatores_padrao.limite_superior
-                )
+    origem = [exames_padrao[pk] for pk in pks]
+    codigos = Exame.gerar_codigos(len(origem))
+    selecionados = set(sequencia)
 
-            valores_esperados_padrao = ref_padrao.padrao.all()
+    copias = [
+        Exame(
+            nome=exame_padrao.nome,
+            material=exame_padrao.material,
+            metodo=exame_padrao.metodo,
+            comentario=exame_padrao.comentario,
+            codigo=codigo,
+            padrao=False,
+            terceirizado=exame_padrao.terceirizado,
+            catalogo=exame_padrao,
+        )
+        for exame_padrao, codigo in zip(origem, codigos)
+    ]
+    for exame_padrao, exame_copia in zip(origem, copias):
+        exame_copia.cobrar(_plano_selecionado(exame_padrao, selecionados))
+    Exame.objects.bulk_create(copias)
 
-            for valor_esperado1 in valores_esperados_padrao:
-                valor_esperado_copia = ValorEsperado.objects.create(
-                    referencia=referencia_exame_copia,
-                    tipo_valor=valor_esperado1.tipo_valor,
-                    valor_esperado=valor_esperado1.valor_esperado,
-                    esperado_obtido=valor_esperado1.esperado_obtido
-                )
-        elif ref_padrao.fator is True and ref_padrao.esperado is False:
-            referencia_exame_copia = ReferenciaExame.objects.create(
+    # Referências, mantendo o vínculo referência do catálogo -> referência copiada
+    referencias_copia = []
+    for exame_padrao, exame_copia in zip(origem, copias):
+        for ref_padrao in exame_padrao.referencias.all():
+            referencias_copia.append((ref_padrao, ReferenciaExame(
                 exame=exame_copia,
                 nome_referencia=ref_padrao.nome_referencia,
                 limite_inferior=ref_padrao.limite_inferior,
                 limite_superior=ref_padrao.limite_superior,
                 valor_obtido=ref_padrao.valor_obtido,
-                fator=True,
-            )
-            fatores_referencia_padrao = ref_padrao.fatores.all()
+                fator=ref_padrao.fator,
+                esperado=ref_padrao.esperado,
+            )))
+    ReferenciaExame.objects.bulk_create([referencia for _, referencia in referencias_copia])
 
-            for fatores_padrao in fatores_referencia_padrao:
-                fatores_copia = FatoresReferencia.objects.create(
-                    referencia_exame=referencia_exame_copia,
+    fatores_copia = []
+    valores_copia = []
+    for ref_padrao, referencia_copia in referencias_copia:
+        if ref_padrao.fator:
+            for fatores_padrao in ref_padrao.fatores.all():
+                fatores_copia.append(FatoresReferencia(
+                    referencia_exame=referencia_copia,
                     nome_fator=fatores_padrao.nome_fator,
                     idade=fatores_padrao.idade,
                     limite_inferior=fatores_padrao.limite_inferior,
-                    limite_superior=fatores_padrao.limite_superior
-                )
-        elif ref_padrao.fator is False and ref_padrao.esperado is True:
-            referencia_exame_copia = ReferenciaExame.objects.create(
-                exame=exame_copia,
-                nome_referencia=ref_padrao.nome_referencia,
-                limite_inferior=ref_padrao.limite_inferior,
-                limite_superior=ref_padrao.limite_superior,
-                valor_obtido=ref_padrao.valor_obtido,
-                esperado=True
-            )
-
-            valores_esperados_padrao = ref_padrao.padrao.all()
-
-            for valor_esperado1 in valores_esperados_padrao:
-                valor_esperado_copia = ValorEsperado.objects.create(
-                    referencia=referencia_exame_copia,
+                    limite_superior=fatores_padrao.limite_superior,
+                ))
+        if ref_padrao.esperado:
+            for valor_esperado1 in ref_padrao.padrao.all():
+                valores_copia.append(ValorEsperado(
+                    referencia=referencia_copia,
                     tipo_valor=valor_esperado1.tipo_valor,
                     valor_esperado=valor_esperado1.valor_esperado,
-                    esperado_obtido = valor_esperado1.esperado_obtido
-                )
+                    esperado_obtido=valor_esperado1.esperado_obtido,
+                ))
+    FatoresReferencia.objects.bulk_create(fatores_copia)
+    ValorEsperado.objects.bulk_create(valores_copia)
 
-    return exame_copia
+    return copias
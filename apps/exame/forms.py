@@ -1,6 +1,8 @@
 from django import forms
 from django.forms import TextInput, inlineformset_factory
+from ..agenda.models import Plano
 from ..exame.models import Exame, ReferenciaExame, FatoresReferencia, ValorEsperado, GrupoExame
+from .services import catalogo
 from .validacao import validate_pdf_extension
 
 class ExameForm(forms.ModelForm):
@@ -19,10 +21,9 @@ class ExameFormUpdate(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         exame_instance = kwargs.pop('instance', None)
         super().__init__(*args, **kwargs)
-        if exame_instance:
-            exames_padrao = Exame.objects.filter(padrao=True, nome=exame_instance.nome)
-            if exames_padrao.exists():
-                self.fields['planos_relacionados'].queryset = exames_padrao.first().planos.all()
+        exame_catalogo = catalogo.do_clone(exame_instance) if exame_instance else None
+        if exame_catalogo:
+            self.fields['planos_relacionados'].queryset = Plano.objects.filter(planos_list=exame_catalogo)
 
 
 class ReferenciaForm(forms.ModelForm):
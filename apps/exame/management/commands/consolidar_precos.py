@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.exame.services import precos
+
+
+class Command(BaseCommand):
+    help = "Passa os planos copiados para os exames clonados para Exame.preco_cobrado e apaga as cópias."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=precos.LOTE_PADRAO, help="Clones por transação.")
+
+    def handle(self, *args, lote=precos.LOTE_PADRAO, **options):
+        clones, planos = precos.consolidar(lote=lote)
+        self.stdout.write(self.style.SUCCESS(f"{clones} clone(s) consolidado(s), {planos} plano(s) copiado(s) apagado(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.exame.services import artefatos
+
+
+class Command(BaseCommand):
+    help = "Apaga os laudos gerados sem uso há mais de --dias dias (são desenhados de novo se pedidos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=artefatos.LAUDO_ARTEFATOS_DIAS,
+                            help="Idade mínima, em dias, desde a geração ou o último download.")
+
+    def handle(self, *args, dias=artefatos.LAUDO_ARTEFATOS_DIAS, **options):
+        apagados = artefatos.limpar(dias)
+        self.stdout.write(self.style.SUCCESS(f"{apagados} laudo(s) apagado(s)."))
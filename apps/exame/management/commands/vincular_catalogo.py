@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.exame.services import catalogo
+
+
+class Command(BaseCommand):
+    help = "Liga os exames clonados antes de Exame.catalogo existir ao exame do catálogo de mesmo nome."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=2000, help="Clones por transação.")
+
+    def handle(self, *args, lote=2000, **options):
+        vinculados, sem_catalogo = catalogo.vincular_clones(lote=lote)
+        self.stdout.write(self.style.SUCCESS(f"{vinculados} clone(s) vinculado(s)."))
+        if sem_catalogo:
+            self.stdout.write(self.style.WARNING(
+                f"{sem_catalogo} clone(s) sem exame de mesmo nome no catálogo ficaram sem vínculo."))
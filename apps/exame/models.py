@@ -4,6 +4,10 @@ from django.utils import timezone
 from .validacao import validate_pdf_extension
 from ..agenda.models import Plano
 from ..core.models import Usuario
+from ..core.services.sequencia import BlocoSequencia
+
+# Códigos de exame são reservados em blocos: a maioria dos cadastros não toca o contador
+_codigos_exame = BlocoSequencia('exame.codigo', tamanho=50)
 
 
 class Exame(models.Model):
@@ -28,6 +32,14 @@ class Exame(models.Model):
     terceirizado = models.BooleanField(default=False)
     padrao = models.BooleanField(default=False)
     ativo = models.BooleanField(default=True)
+    # Exame do catálogo de onde o clone saiu; vazio nos exames do catálogo
+    catalogo = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 related_name='clones', verbose_name='Exame do Catálogo')
+    # Plano e preço cobrados no atendimento, copiados do catálogo quando o exame é clonado;
+    # mudanças posteriores nos planos do catálogo não alteram orçamentos já feitos
+    plano_cobrado = models.CharField(verbose_name='Plano Cobrado', max_length=150, blank=True, editable=False)
+    preco_cobrado = models.DecimalField(verbose_name='Preço Cobrado', max_digits=8, decimal_places=2, null=True,
+                                        blank=True, editable=False)
 
 
     def __str__(self):
@@ -36,19 +48,34 @@ class Exame(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.codigo:  # Se o código não estiver definido
-            data_hora_atual = timezone.now()
-            ano_mes_corrente = data_hora_atual.strftime('%m%Y')
-            # Encontra o último número sequencial para o ano e mês correntes
-            ultimo_exame_mes_ano_corrente = Exame.objects.filter(
-                codigo__startswith=ano_mes_corrente).order_by('-codigo').first()
-            if ultimo_exame_mes_ano_corrente:
-                ultimo_numero = int(ultimo_exame_mes_ano_corrente.codigo[-6:]) + 1
-            else:
-                ultimo_numero = 1
-            self.codigo = f"{ano_mes_corrente}{str(ultimo_numero).zfill(6)}"
+            self.codigo = Exame.gerar_codigos(1)[0]
 
         super().save(*args, **kwargs)
 
+    def cobrar(self, plano):
+        """Registra `plano` (do catálogo) como o plano cobrado deste exame."""
+        self.plano_cobrado = plano.plano if plano else ''
+        self.preco_cobrado = plano.preco if plano else None
+        # Lido pelos signals da receita (apps/atendimento/signals.py) no próximo save
+        self._cobranca_alterada = True
+
+    @classmethod
+    def gerar_codigos(cls, quantidade):
+        """Gera `quantidade` códigos únicos do mês corrente (MMAAAA + 6 dígitos)."""
+        ano_mes_corrente = timezone.now().strftime('%m%Y')
+        numeros = _codigos_exame.reservar(
+            ano_mes_corrente, quantidade, inicial=lambda: cls._ultimo_numero_do_mes(ano_mes_corrente))
+        return [f"{ano_mes_corrente}{str(numero).zfill(6)}" for numero in numeros]
+
+    @classmethod
+    def _ultimo_numero_do_mes(cls, ano_mes_corrente):
+        # Usado só para iniciar o contador do mês a partir dos códigos já gravados
+        ultimo_exame_mes_ano_corrente = Exame.objects.filter(
+            codigo__startswith=ano_mes_corrente).order_by('-codigo').first()
+        if ultimo_exame_mes_ano_corrente:
+            return int(ultimo_exame_mes_ano_corrente.codigo[-6:])
+        return 0
+
     class Meta:
         verbose_name = 'EXAME'
         verbose_name_plural = 'EXAMES'
@@ -0,0 +1,149 @@
+"""
+Laudos já gerados, guardados por endereço de conteúdo.
+
+A chave de um laudo é o hash de tudo que aparece no PDF: tipo de laudo, exames,
+resultados (referências, fatores e valores esperados), paciente, biomédico e a
+versão do cabeçalho do tenant. Se nada disso mudou, a chave é a mesma e o PDF
+já gravado é servido como um arquivo, sem renderizar de novo.
+
+Os PDFs têm resultados de pacientes: ficam em `LAUDO_ARTEFATOS_DIR` (padrão
+BASE_DIR/privado/laudos), nunca dentro de MEDIA_ROOT, que é servida publicamente, e
+só saem pela view `baixar_laudo`, depois da verificação de acesso. Como qualquer
+laudo pode ser desenhado de novo, os artefatos sem uso há `LAUDO_ARTEFATOS_DIAS`
+dias são apagados por `limpar` (`manage.py limpar_laudos`).
+"""
+
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from apps.atendimento.models import OrcamentoExames
+from apps.exame.models import Exame, FatoresReferencia, ReferenciaExame, ValorEsperado
+
+# Incrementar quando o desenho dos laudos mudar, para não servir PDFs antigos
+VERSAO_LAYOUT = 4
+
+PASTA = "laudos"
+LAUDO_ARTEFATOS_DIAS = getattr(settings, "LAUDO_ARTEFATOS_DIAS", 30)
+
+
+def chave_laudo(tipo: str, exames_ids: list[int], tenant=None) -> str:
+    """
+    Hash do conteúdo de um laudo. Usa um número fixo de consultas, independente de
+    quantos exames ou referências o laudo tem.
+    """
+    exames = list(
+        Exame.objects.filter(pk__in=exames_ids)
+        .order_by("pk")
+        .values_list(
+            "pk", "nome", "codigo", "material", "metodo", "comentario", "data_cadastro",
+            "data_alterado", "bio_medico_id", "bio_medico__assinatura",
+        )
+    )
+    referencias = list(
+        ReferenciaExame.objects.filter(exame_id__in=exames_ids)
+        .order_by("pk")
+        .values_list(
+            "pk", "exame_id", "nome_referencia", "limite_inferior", "limite_superior",
+            "valor_obtido", "fator", "esperado",
+        )
+    )
+    fatores = list(
+        FatoresReferencia.objects.filter(referencia_exame__exame_id__in=exames_ids)
+        .order_by("pk")
+        .values_list("pk", "referencia_exame_id", "nome_fator", "idade", "limite_inferior", "limite_superior")
+    )
+    esperados = list(
+        ValorEsperado.objects.filter(referencia__exame_id__in=exames_ids)
+        .order_by("pk")
+        .values_list("pk", "referencia_id", "tipo_valor", "valor_esperado", "esperado_obtido")
+    )
+    pacientes = list(
+        OrcamentoExames.exame.through.objects.filter(exame_id__in=exames_ids)
+        .order_by("exame_id", "orcamentoexames_id")
+        .values_list(
+            "exame_id", "orcamentoexames__paciente__nome", "orcamentoexames__paciente__cpf",
+            "orcamentoexames__paciente__data_nascimento", "orcamentoexames__paciente__sexo",
+        )
+    )
+
+    conteudo = json.dumps(
+        {
+            "layout": VERSAO_LAYOUT,
+            "tipo": tipo,
+            "ordem": list(exames_ids),
+            "tenant": [str(getattr(tenant, "pk", "")), str(getattr(tenant, "updated_at", ""))],
+            "exames": exames,
+            "referencias": referencias,
+            "fatores": fatores,
+            "esperados": esperados,
+            "pacientes": pacientes,
+        },
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def pasta() -> Path:
+    """Pasta dos artefatos: `LAUDO_ARTEFATOS_DIR` ou BASE_DIR/privado/laudos, nunca dentro de MEDIA_ROOT."""
+    base = Path(getattr(settings, "LAUDO_ARTEFATOS_DIR", None) or Path(settings.BASE_DIR) / "privado" / PASTA).resolve()
+    midia = Path(settings.MEDIA_ROOT).resolve()
+    if base == midia or midia in base.parents:
+        raise ImproperlyConfigured("LAUDO_ARTEFATOS_DIR não pode ficar dentro de MEDIA_ROOT.")
+    return base
+
+
+def _storage() -> FileSystemStorage:
+    # Sem base_url: os arquivos não têm endereço público
+    return FileSystemStorage(location=pasta(), base_url=None)
+
+
+def caminho(chave: str) -> str:
+    return f"{chave[:2]}/{chave}.pdf"
+
+
+def existe(chave: str) -> bool:
+    return _storage().exists(caminho(chave))
+
+
+def abrir(chave: str):
+    arquivo = pasta() / caminho(chave)
+    # Baixar conta como uso para `limpar`
+    arquivo.touch(exist_ok=True)
+    return open(arquivo, "rb")
+
+
+def gravar(chave: str, conteudo: bytes) -> str:
+    storage = _storage()
+    nome = caminho(chave)
+    if not storage.exists(nome):
+        storage.save(nome, ContentFile(conteudo))
+    return nome
+
+
+def limpar(dias: int = LAUDO_ARTEFATOS_DIAS) -> int:
+    """
+    Apaga os artefatos gravados ou baixados pela última vez há mais de `dias` dias e
+    os laudos que versões antigas gravavam em MEDIA_ROOT/laudos. Retorna quantos
+    arquivos foram apagados.
+    """
+    limite = time.time() - dias * 86400
+    apagados = 0
+    for arquivo in pasta().glob("*/*.pdf"):
+        if arquivo.stat().st_mtime < limite:
+            arquivo.unlink(missing_ok=True)
+            apagados += 1
+
+    publicos = Path(settings.MEDIA_ROOT) / PASTA
+    if publicos.is_dir():
+        apagados += sum(1 for arquivo in publicos.rglob("*.pdf"))
+        shutil.rmtree(publicos)
+    return apagados
@@ -0,0 +1,184 @@
+"""
+Busca no catálogo de exames (`Exame` com padrao=True) para o autocomplete do orçamento.
+
+A tabela de exames também guarda os clones de cada atendimento, então um
+`nome__icontains` piora conforme o histórico cresce. Aqui o catálogo é carregado
+uma vez num índice em memória: os nomes são quebrados em palavras sem acento e em
+minúsculas, e cada palavra digitada casa com o começo de uma palavra do nome ("hemo comp" encontra "Hemograma Completo"). Os resultados saem ordenados
+pela quantidade de clones do exame, isto é, de vezes que ele já foi pedido.
+
+O catálogo é global (`Exame` não tem tenant), então há um único índice e uma única
+versão. O índice é refeito quando o catálogo muda (a versão é um contador no banco,
+lido pelo cache compartilhado, ver `versao`) ou depois de `CATALOGO_INDICE_TTL`
+segundos, para atualizar a contagem de uso. A mesma versão refaz o índice dos fatores
+de referência (ver services/faixas.py).
+"""
+
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from apps.core.models.sequencia import Sequencia
+from apps.core.services import sequencia
+from apps.exame.models import Exame
+
+CATALOGO_INDICE_TTL = getattr(settings, "CATALOGO_INDICE_TTL", 600)
+LIMITE_PADRAO = 10
+
+
+class ExameCatalogo(NamedTuple):
+    id: int
+    nome: str
+    usos: int
+
+
+def normalizar(texto: str) -> list[str]:
+    """Palavras do texto sem acento e em minúsculas."""
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return "".join(c if c.isalnum() else " " for c in sem_acento.lower()).split()
+
+
+class IndiceCatalogo:
+    """Palavras ordenadas do catálogo para busca por prefixo com `bisect`."""
+
+    def __init__(self, exames: list[ExameCatalogo]):
+        # A posição no catálogo já é a ordem do resultado: mais usado primeiro
+        self.exames = sorted(exames, key=lambda exame: (-exame.usos, exame.nome.lower(), exame.id))
+        pares = sorted({
+            (palavra, posicao)
+            for posicao, exame in enumerate(self.exames)
+            for palavra in normalizar(exame.nome)
+        })
+        self._palavras = [palavra for palavra, _ in pares]
+        self._posicoes = [posicao for _, posicao in pares]
+
+    def _com_prefixo(self, prefixo: str) -> set[int]:
+        inicio = bisect_left(self._palavras, prefixo)
+        fim = bisect_left(self._palavras, prefixo + "\uffff", inicio)
+        return set(self._posicoes[inicio:fim])
+
+    def buscar(self, termo: str, limite: int = LIMITE_PADRAO) -> list[ExameCatalogo]:
+        candidatos = None
+        # Palavras mais longas primeiro: casam menos nomes e encurtam as interseções
+        for palavra in sorted(set(normalizar(termo)), key=len, reverse=True):
+            encontrados = self._com_prefixo(palavra)
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                return []
+        return [self.exames[posicao] for posicao in nsmallest(limite, candidatos or ())]
+
+
+# ----------------------------------------------------------------------
+# Índice
+# ----------------------------------------------------------------------
+
+
+def carregar() -> IndiceCatalogo:
+    """Monta o índice numa consulta: o catálogo com a contagem de clones de cada exame."""
+    catalogo = Exame.objects.filter(padrao=True).annotate(usos=Count("clones")).values_list("pk", "nome", "usos")
+    return IndiceCatalogo([ExameCatalogo(*exame) for exame in catalogo])
+
+
+_indice: tuple | None = None
+_indice_lock = threading.Lock()
+
+_ESCOPO_VERSAO = "exame.catalogo"
+_CHAVE_VERSAO = "catalogo:versao"
+
+
+def versao() -> int:
+    """
+    Versão do catálogo; muda a cada `invalidar`. O valor de verdade é um contador no
+    banco (`Sequencia`); o cache compartilhado só evita a consulta, e se a chave for
+    descartada a próxima leitura a repõe a partir do banco.
+    """
+    atual = cache.get(_CHAVE_VERSAO)
+    if atual is None:
+        atual = (
+            Sequencia.objects.filter(tenant=None, escopo=_ESCOPO_VERSAO, chave="versao")
+            .values_list("valor", flat=True).first() or 0
+        )
+        cache.set(_CHAVE_VERSAO, atual, None)
+    return atual
+
+
+def indice() -> IndiceCatalogo:
+    """Índice do catálogo, refeito só quando necessário."""
+    global _indice
+    atual = versao()
+
+    with _indice_lock:
+        em_cache = _indice
+        if em_cache and em_cache[0] == atual and time.monotonic() - em_cache[1] < CATALOGO_INDICE_TTL:
+            return em_cache[2]
+
+    novo = carregar()
+    with _indice_lock:
+        _indice = (atual, time.monotonic(), novo)
+    return novo
+
+
+def buscar(termo: str, limite: int = LIMITE_PADRAO) -> list[ExameCatalogo]:
+    return indice().buscar(termo, limite) if termo else []
+
+
+def invalidar() -> None:
+    """Marca o catálogo como alterado; cada processo refaz os índices na próxima leitura."""
+    cache.set(_CHAVE_VERSAO, sequencia.proximo(_ESCOPO_VERSAO, "versao"), None)
+
+
+# ----------------------------------------------------------------------
+# Vínculo dos clones antigos
+# ----------------------------------------------------------------------
+
+
+def do_clone(exame: Exame) -> Exame | None:
+    """
+    Exame do catálogo de onde `exame` saiu. Clones ainda não vinculados casam pelo
+    nome, como em `vincular_clones` (o ativo de menor id).
+    """
+    if exame.catalogo_id is not None:
+        return exame.catalogo
+    return Exame.objects.filter(padrao=True, nome=exame.nome).order_by("-ativo", "pk").first()
+
+
+def vincular_clones(lote: int = 2000) -> tuple[int, int]:
+    """
+    Preenche `Exame.catalogo` dos clones gravados antes do campo existir, casando pelo
+    nome, em lotes de `lote` clones por transação (pode ser interrompido e rodado de
+    novo). Com nomes repetidos no catálogo vale o exame ativo de menor id.
+    Retorna (vinculados, sem exame de catálogo com o mesmo nome).
+    """
+    do_nome: dict[str, int] = {}
+    for pk, nome in Exame.objects.filter(padrao=True).order_by("-ativo", "pk").values_list("pk", "nome"):
+        do_nome.setdefault(nome, pk)
+
+    vinculados = sem_catalogo = 0
+    ultimo = 0
+    while True:
+        clones = list(
+            Exame.objects.filter(pk__gt=ultimo, padrao=False, catalogo__isnull=True)
+            .order_by("pk").only("pk", "nome")[:lote]
+        )
+        if not clones:
+            return vinculados, sem_catalogo
+        ultimo = clones[-1].pk
+
+        encontrados = []
+        for clone in clones:
+            clone.catalogo_id = do_nome.get(clone.nome)
+            if clone.catalogo_id is None:
+                sem_catalogo += 1
+            else:
+                encontrados.append(clone)
+        with transaction.atomic():
+            Exame.objects.bulk_update(encontrados, ["catalogo"])
+        vinculados += len(encontrados)
@@ -0,0 +1,69 @@
+"""
+Busca de exames pelo código (MMAAAA + 6 dígitos), digitado ou lido do código de
+barras da etiqueta.
+
+Um código completo é procurado por igualdade; um código parcial, pelo começo, como
+uma faixa `codigo >= '1020' AND codigo < '1020\\uffff'` sobre o índice único de
+`codigo` (o `LIKE` do SQLite não usa índice). Todas as buscas têm limite.
+"""
+
+from django.db.models import QuerySet
+
+from apps.exame.models import Exame
+
+TAMANHO_CODIGO = 12
+LIMITE_PADRAO = 20
+
+
+def normalizar(codigo: str | None) -> str:
+    """Tira espaços e quebras de linha que leitores de código de barras costumam enviar."""
+    return "".join((codigo or "").split())
+
+
+def _exames(terceirizado: bool | None) -> QuerySet:
+    exames = Exame.objects.all()
+    return exames if terceirizado is None else exames.filter(terceirizado=terceirizado)
+
+
+def buscar(termo: str, terceirizado: bool | None = None, limite: int = LIMITE_PADRAO) -> list[dict]:
+    """Exames (pk, código e nome) com o código igual a `termo` ou começando por ele."""
+    termo = normalizar(termo)
+    if not termo:
+        return []
+
+    exames = _exames(terceirizado).values("pk", "codigo", "nome")
+    if len(termo) >= TAMANHO_CODIGO:
+        return list(exames.filter(codigo=termo)[:1])
+    return list(exames.filter(codigo__gte=termo, codigo__lt=termo + "\uffff").order_by("codigo")[:limite])
+
+
+def leitura(codigo: str) -> dict | None:
+    """
+    Exame lido pelo código de barras, com o orçamento e o paciente dele, numa única
+    consulta. `orcamento` e `paciente` vêm vazios para exames sem orçamento.
+    """
+    linha = (
+        Exame.objects.filter(codigo=normalizar(codigo))
+        .values(
+            "pk", "codigo", "nome", "material", "status_exame", "terceirizado",
+            "r_exame__pk", "r_exame__data_cadastro",
+            "r_exame__paciente__pk", "r_exame__paciente__nome", "r_exame__paciente__sexo",
+            "r_exame__paciente__data_nascimento",
+        )
+        .order_by("r_exame__pk")
+        .first()
+    )
+    if linha is None:
+        return None
+
+    exame = {campo: linha[campo] for campo in ("pk", "codigo", "nome", "material", "status_exame", "terceirizado")}
+    orcamento = paciente = None
+    if linha["r_exame__pk"] is not None:
+        orcamento = {"pk": linha["r_exame__pk"], "data": linha["r_exame__data_cadastro"]}
+        paciente = {
+            "pk": linha["r_exame__paciente__pk"],
+            "nome": linha["r_exame__paciente__nome"],
+            "sexo": linha["r_exame__paciente__sexo"],
+            "data_nascimento": linha["r_exame__paciente__data_nascimento"],
+        }
+    return {"exame": exame, "orcamento": orcamento, "paciente": paciente}
@@ -0,0 +1,383 @@
+"""
+Etiquetas de tubos em linguagem nativa de impressora (ZPL e ESC/POS).
+
+As etiquetas de um dia inteiro (a lista de `ExamesEtiquetas`) são carregadas com uma
+única consulta e convertidas em bytes etiqueta por etiqueta, prontos para a
+impressora térmica — sem PDF no meio. O código de barras é o `Exame.codigo` em
+Code 128, codificado pelo python-barcode e enviado como gráfico monocromático, então
+ZPL e ESC/POS imprimem exatamente as mesmas barras.
+
+Os geradores produzem `bytes` por etiqueta e podem ir direto para um
+`StreamingHttpResponse` ou para o spool local (`enviar_para_spool`), que faz o papel
+da fila de impressão do servidor (CUPS, `lp -o raw`).
+"""
+
+import os
+import uuid
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import barcode
+import zpl
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from escpos.printer import Dummy
+from PIL import Image
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from apps.exame.models import Exame
+
+
+class Etiqueta(NamedTuple):
+    exame_id: int
+    exame: str
+    codigo: str
+    orcamento_id: int | None
+    paciente_id: int | None
+    paciente: str
+
+
+class EstoqueEtiqueta(NamedTuple):
+    """Dimensões do rolo de etiquetas. O padrão é 100 x 25 mm em 203 dpi (8 pontos/mm)."""
+
+    largura_mm: float = 100
+    altura_mm: float = 25
+    dpmm: int = 8
+
+
+ESTOQUE_PADRAO = EstoqueEtiqueta()
+
+# Perfil da impressora ESC/POS (python-escpos); define a largura útil da cabeça
+PERFIL_ESCPOS = getattr(settings, "ETIQUETA_PERFIL_ESCPOS", "TM-T20II")
+
+
+# ----------------------------------------------------------------------
+# Dados
+# ----------------------------------------------------------------------
+
+
+def _carregar(exames) -> list[Etiqueta]:
+    """
+    Uma consulta para todas as etiquetas, ordenadas por paciente. Cada exame aparece
+    uma vez, com o paciente do orçamento mais antigo (como em `exame.r_exame.first()`).
+    """
+    linhas = exames.order_by("pk", "r_exame__pk").values_list(
+        "pk", "nome", "codigo", "r_exame__pk", "r_exame__paciente_id", "r_exame__paciente__nome",
+    )
+    etiquetas = {}
+    for exame_id, nome, codigo, orcamento_id, paciente_id, paciente in linhas:
+        if exame_id not in etiquetas:
+            etiquetas[exame_id] = Etiqueta(exame_id, nome, codigo, orcamento_id, paciente_id, paciente or "")
+    return sorted(etiquetas.values(), key=lambda etiqueta: (etiqueta.paciente, etiqueta.exame_id))
+
+
+def etiquetas_do_dia(data) -> list[Etiqueta]:
+    """Exames aguardando coleta cadastrados em `data` (mesmo critério de `ExamesEtiquetas`)."""
+    return _carregar(Exame.objects.filter(data_cadastro__date=data, status_exame="AGUARDANDO", padrao=False))
+
+
+def etiquetas_dos_exames(exames_ids: Iterable[int]) -> list[Etiqueta]:
+    return _carregar(Exame.objects.filter(pk__in=set(exames_ids)))
+
+
+def etiquetas_do_orcamento(orcamento_id: int) -> list[Etiqueta]:
+    return _carregar(Exame.objects.filter(r_exame=orcamento_id))
+
+
+# ----------------------------------------------------------------------
+# Código de barras
+# ----------------------------------------------------------------------
+
+
+def modulos_codigo_barras(codigo: str) -> str:
+    """Módulos do Code 128 de `codigo`: '1' é barra e '0' é espaço."""
+    return barcode.get("code128", codigo).build()[0]
+
+
+def imagem_codigo_barras(codigo: str, largura_max_px: int, altura_px: int, modulo_px: int = 2) -> Image.Image:
+    """
+    Código de barras como imagem de 1 bit (preto = 0), com largura inteira por módulo
+    para não distorcer as barras. O módulo é reduzido até caber em `largura_max_px`.
+    """
+    modulos = modulos_codigo_barras(codigo)
+    modulo_px = max(1, min(modulo_px, largura_max_px // len(modulos)))
+
+    linha = Image.new("1", (len(modulos) * modulo_px, 1), 1)
+    for posicao, modulo in enumerate(modulos):
+        if modulo == "1":
+            linha.paste(0, (posicao * modulo_px, 0, (posicao + 1) * modulo_px, 1))
+    return linha.resize((linha.width, altura_px), Image.NEAREST)
+
+
+def _texto(valor: str, limite: int) -> str:
+    # ^ e ~ iniciam comandos ZPL; o resto vai em UTF-8 (^CI28)
+    return (valor or "").replace("^", " ").replace("~", " ")[:limite]
+
+
+# ----------------------------------------------------------------------
+# ZPL
+# ----------------------------------------------------------------------
+
+
+def _grafico_zpl(imagem: Image.Image) -> str:
+    """
+    ^GFA de uma imagem de 1 bit. Linhas iguais à anterior viram ':' (compressão ASCII
+    do ZPL), então as barras ocupam uma linha de dados independente da altura.
+    """
+    por_linha = (imagem.width + 7) // 8
+    # No ZPL o bit 1 é ponto preto, o inverso do PIL
+    dados = bytes(b ^ 0xFF for b in imagem.tobytes())
+
+    linhas, anterior = [], None
+    for inicio in range(0, len(dados), por_linha):
+        atual = dados[inicio:inicio + por_linha].hex().upper()
+        linhas.append(":" if atual == anterior else atual)
+        anterior = atual
+
+    total = por_linha * imagem.height
+    return f"^GFA,{total},{total},{por_linha},{''.join(linhas)}"
+
+
+def _campos_zpl(label: zpl.Label, etiqueta: Etiqueta, largura: float, altura: float, x: float = 0, y: float = 0):
+    """Campos de uma etiqueta `largura` x `altura` mm com o canto em (`x`, `y`) mm."""
+    dpmm = label.dpmm
+    escala = altura / 25
+
+    label.origin(x + 2, y + 1.5 * escala)
+    label.write_text(_texto(etiqueta.paciente, 50), char_height=3.2 * escala, char_width=2.8 * escala,
+                     line_width=largura - 4, justification="C")
+    label.endorigin()
+    label.origin(x + 2, y + 5.5 * escala)
+    label.write_text(_texto(etiqueta.exame, 46), char_height=2.8 * escala, char_width=2.4 * escala,
+                     line_width=largura - 4, justification="C")
+    label.endorigin()
+
+    barras = imagem_codigo_barras(etiqueta.codigo, int((largura - 4) * dpmm), int(altura * 0.36 * dpmm))
+    barras_x = int(x * dpmm) + (int(largura * dpmm) - barras.width) // 2
+    label.zpl_raw(f"^FO{barras_x},{int((y + 9.5 * escala) * dpmm)}{_grafico_zpl(barras)}^FS")
+
+    label.origin(x + 2, y + altura - 4.5 * escala)
+    label.write_text(_texto(etiqueta.codigo, 32), char_height=2.5 * escala, char_width=2.2 * escala,
+                     line_width=largura - 4, justification="C")
+    label.endorigin()
+
+
+def etiqueta_zpl(etiqueta: Etiqueta, estoque: EstoqueEtiqueta = ESTOQUE_PADRAO) -> bytes:
+    largura, altura, dpmm = estoque
+    label = zpl.Label(altura, largura, dpmm)
+    label.change_international_font(28)
+    _campos_zpl(label, etiqueta, largura, altura)
+    return label.dumpZPL().encode()
+
+
+def gerar_zpl(etiquetas: Iterable[Etiqueta], estoque: EstoqueEtiqueta = ESTOQUE_PADRAO) -> Iterator[bytes]:
+    for etiqueta in etiquetas:
+        yield etiqueta_zpl(etiqueta, estoque) + b"\n"
+
+
+# ----------------------------------------------------------------------
+# ESC/POS
+# ----------------------------------------------------------------------
+
+
+def etiqueta_escpos(etiqueta: Etiqueta, perfil: str = PERFIL_ESCPOS) -> bytes:
+    impressora = Dummy(profile=perfil)
+    largura_px = int(impressora.profile.profile_data["media"]["width"]["pixels"])
+    impressora.set(align="center", bold=True)
+    impressora.text(f"{etiqueta.paciente[:40]}\n")
+    impressora.set(align="center", bold=False)
+    impressora.text(f"{etiqueta.exame[:40]}\n")
+    impressora.image(imagem_codigo_barras(etiqueta.codigo, largura_px, 72), center=True)
+    impressora.text(f"{etiqueta.codigo}\n\n")
+    return impressora.output
+
+
+def gerar_escpos(etiquetas: Iterable[Etiqueta], perfil: str = PERFIL_ESCPOS) -> Iterator[bytes]:
+    for etiqueta in etiquetas:
+        yield etiqueta_escpos(etiqueta, perfil)
+    impressora = Dummy(profile=perfil)
+    impressora.cut()
+    yield impressora.output
+
+
+# ----------------------------------------------------------------------
+# Folhas com várias etiquetas (N-up)
+# ----------------------------------------------------------------------
+
+
+class Folha(NamedTuple):
+    """
+    Estoque com várias etiquetas por página: folhas A4/Carta para impressora comum
+    ou uma fileira de um rolo com várias colunas para impressora térmica.
+    Medidas em milímetros; o topo da página é y = 0.
+    """
+
+    largura_mm: float
+    altura_mm: float
+    colunas: int
+    linhas: int
+    etiqueta: EstoqueEtiqueta
+    margem_esquerda_mm: float = 0
+    margem_topo_mm: float = 0
+    espaco_horizontal_mm: float = 0
+    espaco_vertical_mm: float = 0
+
+    @property
+    def por_pagina(self) -> int:
+        return self.colunas * self.linhas
+
+    def posicao(self, indice: int) -> tuple[float, float]:
+        """Canto superior esquerdo (mm) da etiqueta `indice` da página."""
+        linha, coluna = divmod(indice, self.colunas)
+        return (
+            self.margem_esquerda_mm + coluna * (self.etiqueta.largura_mm + self.espaco_horizontal_mm),
+            self.margem_topo_mm + linha * (self.etiqueta.altura_mm + self.espaco_vertical_mm),
+        )
+
+
+FOLHAS = {
+    # Pimaco A4356: 33 etiquetas de 63,5 x 25,4 mm em A4
+    "a4356": Folha(210, 297, 3, 11, EstoqueEtiqueta(63.5, 25.4), 7.2, 8.8, 2.5, 0),
+    # Pimaco 6180: 30 etiquetas de 66,7 x 25,4 mm em Carta
+    "6180": Folha(215.9, 279.4, 3, 10, EstoqueEtiqueta(66.7, 25.4), 4.8, 12.7, 3.2, 0),
+    # Rolo térmico de 3 colunas (33 x 22 mm); cada página é uma fileira
+    "rolo-3": Folha(104, 22, 3, 1, EstoqueEtiqueta(33, 22), 1, 0, 2, 0),
+}
+
+
+def obter_folha(nome: str) -> Folha | None:
+    return {**FOLHAS, **getattr(settings, "ETIQUETA_FOLHAS", {})}.get(nome)
+
+
+def paginar(etiquetas: Iterable[Etiqueta], folha: Folha, inicio: int = 0,
+            agrupar: bool = True) -> Iterator[list[tuple[int, Etiqueta]]]:
+    """
+    Distribui as etiquetas nas páginas, devolvendo cada página como uma lista de
+    (posição, etiqueta) assim que ela fica completa. `inicio` pula as primeiras
+    posições da primeira folha (folha já usada em parte). Com `agrupar`, as
+    etiquetas de cada paciente começam numa linha nova.
+    """
+    pagina, posicao, paciente = [], inicio % folha.por_pagina, None
+    for etiqueta in etiquetas:
+        if agrupar and paciente is not None and etiqueta.paciente_id != paciente and posicao % folha.colunas:
+            posicao += folha.colunas - posicao % folha.colunas
+        if posicao >= folha.por_pagina:
+            yield pagina
+            pagina, posicao = [], 0
+        pagina.append((posicao, etiqueta))
+        posicao += 1
+        paciente = etiqueta.paciente_id
+    if pagina:
+        yield pagina
+
+
+def _caber(c: canvas.Canvas, texto: str, fonte: str, tamanho: float, largura: float) -> str:
+    texto = texto or ""
+    while texto and c.stringWidth(texto, fonte, tamanho) > largura:
+        texto = texto[:-1]
+    return texto
+
+
+def _desenhar_etiqueta(c: canvas.Canvas, etiqueta: Etiqueta, x: float, y: float, largura: float, altura: float):
+    """Etiqueta com o canto inferior esquerdo em (`x`, `y`), em pontos."""
+    centro, util = x + largura / 2, largura - 4 * mm
+    escala = altura / (25 * mm)
+
+    topo = y + altura - 3.5 * mm * escala
+    c.setFont("Helvetica-Bold", 7 * escala)
+    c.drawCentredString(centro, topo, _caber(c, etiqueta.paciente, "Helvetica-Bold", 7 * escala, util))
+    c.setFont("Helvetica", 6.5 * escala)
+    c.drawCentredString(centro, topo - 3 * mm * escala, _caber(c, etiqueta.exame, "Helvetica", 6.5 * escala, util))
+
+    modulos = modulos_codigo_barras(etiqueta.codigo)
+    modulo = min(0.33 * mm, util / len(modulos))
+    barras_x, barras_y, barras_altura = centro - len(modulos) * modulo / 2, y + 4 * mm * escala, 9 * mm * escala
+    inicio = None
+    for posicao, valor in enumerate(modulos + "0"):
+        if valor == "1" and inicio is None:
+            inicio = posicao
+        elif valor == "0" and inicio is not None:
+            c.rect(barras_x + inicio * modulo, barras_y, (posicao - inicio) * modulo, barras_altura, stroke=0, fill=1)
+            inicio = None
+
+    c.setFont("Helvetica", 6 * escala)
+    c.drawCentredString(centro, y + 1.5 * mm * escala, etiqueta.codigo)
+
+
+def folha_pdf(saida, etiquetas: Iterable[Etiqueta], folha: Folha, inicio: int = 0, agrupar: bool = True) -> int:
+    """Escreve a folha em PDF em `saida`. Retorna o número de páginas."""
+    largura, altura = folha.largura_mm * mm, folha.altura_mm * mm
+    etiqueta_largura, etiqueta_altura = folha.etiqueta.largura_mm * mm, folha.etiqueta.altura_mm * mm
+    c = canvas.Canvas(saida, pagesize=(largura, altura))
+
+    paginas = 0
+    for pagina in paginar(etiquetas, folha, inicio, agrupar):
+        for posicao, etiqueta in pagina:
+            x, y = folha.posicao(posicao)
+            _desenhar_etiqueta(c, etiqueta, x * mm, altura - y * mm - etiqueta_altura, etiqueta_largura,
+                               etiqueta_altura)
+        c.showPage()
+        paginas += 1
+    c.save()
+    return paginas
+
+
+def folha_zpl(etiquetas: Iterable[Etiqueta], folha: Folha, inicio: int = 0, agrupar: bool = True) -> Iterator[bytes]:
+    """Uma etiqueta ZPL (^XA...^XZ) por página da folha, produzida assim que a página fica pronta."""
+    for pagina in paginar(etiquetas, folha, inicio, agrupar):
+        label = zpl.Label(folha.altura_mm, folha.largura_mm, folha.etiqueta.dpmm)
+        label.change_international_font(28)
+        for posicao, etiqueta in pagina:
+            x, y = folha.posicao(posicao)
+            _campos_zpl(label, etiqueta, folha.etiqueta.largura_mm, folha.etiqueta.altura_mm, x, y)
+        yield label.dumpZPL().encode() + b"\n"
+
+
+# ----------------------------------------------------------------------
+# Saída
+# ----------------------------------------------------------------------
+
+
+class Formato(NamedTuple):
+    gerar: Callable[[Iterable[Etiqueta]], Iterator[bytes]]
+    content_type: str
+    extensao: str
+
+
+FORMATOS = {
+    "zpl": Formato(gerar_zpl, "application/vnd.zebra-zpl", "zpl"),
+    "escpos": Formato(gerar_escpos, "application/octet-stream", "bin"),
+}
+
+
+def pasta_spool(fila: str = "etiquetas") -> Path:
+    """
+    Pasta da fila de impressão: `ETIQUETA_SPOOL_DIR` ou BASE_DIR/spool. Nunca dentro
+    de MEDIA_ROOT, que é servida como mídia pública e as etiquetas têm nomes de pacientes.
+    """
+    base = Path(getattr(settings, "ETIQUETA_SPOOL_DIR", None) or Path(settings.BASE_DIR) / "spool").resolve()
+    midia = Path(settings.MEDIA_ROOT).resolve()
+    if base == midia or midia in base.parents:
+        raise ImproperlyConfigured("ETIQUETA_SPOOL_DIR não pode ficar dentro de MEDIA_ROOT.")
+    return base / fila
+
+
+def enviar_para_spool(partes: Iterable[bytes], extensao: str, fila: str = "etiquetas") -> Path:
+    """
+    Grava o trabalho de impressão no spool local, parte por parte. O arquivo só
+    recebe o nome final quando está completo, então quem consome a pasta nunca
+    lê um trabalho pela metade.
+    """
+    pasta = pasta_spool(fila)
+    pasta.mkdir(parents=True, exist_ok=True)
+    nome = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.{extensao}"
+    temporario = pasta / f".{nome}.tmp"
+
+    with open(temporario, "wb") as arquivo:
+        for parte in partes:
+            arquivo.write(parte)
+    os.replace(temporario, pasta / nome)
+    return pasta / nome
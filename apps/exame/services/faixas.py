@@ -0,0 +1,433 @@
+"""
+Faixas de referência numéricas e sinalização dos resultados.
+
+Limites, fatores e resultados são texto livre ("3,5", "1.200 mg/dL", "Homem adulto",
+"0 a 12 anos"). Cada faixa é convertida em números uma vez e fica em cache pelo
+texto: os clones de um exame repetem os textos da referência do catálogo, então um
+dia inteiro de exames compila só as faixas distintas do catálogo.
+
+Os resultados são comparados em lote com arrays NumPy (`sinalizar`): um dia inteiro
+de referências é avaliado numa passada, com três consultas (`avaliar_dia`).
+
+O fator de uma referência que vale para o paciente (sexo e idade) sai de um índice
+por sexo e faixa etária (`ResolvedorFatores`). O índice fica em memória, um só como
+o catálogo, e é refeito quando a versão do catálogo muda (ver services/catalogo.py).
+
+Sinais: NORMAL dentro da faixa, BAIXO/ALTO fora dela, CRITICO_BAIXO/CRITICO_ALTO
+além da margem crítica. O cadastro não tem limites críticos, então a margem é
+`FAIXA_MARGEM_CRITICA` vezes a largura da faixa (ou o próprio limite, quando só um
+dos dois existe) para fora dela.
+"""
+
+import math
+import re
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import QuerySet
+
+from apps.exame.models import Exame, FatoresReferencia, ReferenciaExame
+from apps.exame.services import catalogo
+from apps.exame.services.catalogo import normalizar
+
+FAIXA_MARGEM_CRITICA = getattr(settings, "FAIXA_MARGEM_CRITICA", 1.0)
+FATORES_LIMITE_EXTRAS = getattr(settings, "FATORES_LIMITE_EXTRAS", 4096)
+
+NORMAL = "NORMAL"
+BAIXO = "BAIXO"
+ALTO = "ALTO"
+CRITICO_BAIXO = "CRITICO_BAIXO"
+CRITICO_ALTO = "CRITICO_ALTO"
+
+# Posição no array de códigos devolvido por `sinalizar`; -1 é "sem sinal"
+SINAIS = (NORMAL, BAIXO, ALTO, CRITICO_BAIXO, CRITICO_ALTO)
+SEM_SINAL = -1
+GRAVIDADE = {None: 0, NORMAL: 1, BAIXO: 2, ALTO: 2, CRITICO_BAIXO: 3, CRITICO_ALTO: 3}
+
+SEM_LIMITE = math.nan
+_NUMERO = re.compile(r"[-+]?\d+(?:[.,]\d+)*")
+# Pontos separando grupos de três dígitos: milhar ("150.000"), não decimal
+_MILHAR = re.compile(r"[-+]?[1-9]\d{0,2}(?:\.\d{3})+")
+
+
+def numero(texto: str | None) -> float | None:
+    """
+    Número digitado no formato brasileiro ("1.234,5", "150.000") ou com ponto decimal
+    ("4.5"). Sem vírgula, o ponto só é milhar quando separa grupos de três dígitos.
+    """
+    texto = "".join((texto or "").split())
+    if "," in texto or _MILHAR.fullmatch(texto):
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        valor = float(texto)
+    except ValueError:
+        return None
+    return valor if math.isfinite(valor) else None
+
+
+def limite(texto: str | None) -> float:
+    """Primeiro número do texto do limite ("70 mg/dL", "até 10"); NaN quando não há."""
+    encontrado = _NUMERO.search(texto or "")
+    valor = numero(encontrado.group()) if encontrado else None
+    return SEM_LIMITE if valor is None else valor
+
+
+# ----------------------------------------------------------------------
+# Faixas
+# ----------------------------------------------------------------------
+
+
+class Faixa(NamedTuple):
+    inferior: float
+    superior: float
+
+    @property
+    def vazia(self) -> bool:
+        return math.isnan(self.inferior) and math.isnan(self.superior)
+
+
+class FaixaFator(NamedTuple):
+    """Faixa de um `FatoresReferencia`: sexo ("M", "F" ou None para ambos) e idades em anos [inicio, fim)."""
+    sexo: str | None
+    idade_inicio: float
+    idade_fim: float
+    faixa: Faixa
+
+
+@lru_cache(maxsize=4096)
+def compilar(inferior: str | None, superior: str | None) -> Faixa:
+    return Faixa(limite(inferior), limite(superior))
+
+
+_MASCULINO = {"homem", "homens", "masculino", "masc", "m"}
+_FEMININO = {"mulher", "mulheres", "feminino", "fem", "f", "gestante", "gestantes"}
+
+_DIA = 1 / 365.25
+# Faixas etárias por palavra, em anos [inicio, fim)
+_IDADE_POR_PALAVRA = {
+    "recem": (0.0, 28 * _DIA),
+    "neonato": (0.0, 28 * _DIA),
+    "neonatal": (0.0, 28 * _DIA),
+    "lactente": (28 * _DIA, 2.0),
+    "lactentes": (28 * _DIA, 2.0),
+    "crianca": (0.0, 12.0),
+    "criancas": (0.0, 12.0),
+    "infantil": (0.0, 12.0),
+    "adolescente": (12.0, 18.0),
+    "adolescentes": (12.0, 18.0),
+    "adulto": (18.0, math.inf),
+    "adultos": (18.0, math.inf),
+    "idoso": (60.0, math.inf),
+    "idosos": (60.0, math.inf),
+}
+_UNIDADE = {"ano": 1.0, "anos": 1.0, "mes": 1 / 12, "meses": 1 / 12, "semana": 7 * _DIA, "semanas": 7 * _DIA,
+            "dia": _DIA, "dias": _DIA}
+_IDADE_ENTRE = re.compile(r"(\d+) (?:a|ate) (\d+)(?: (anos?|mes|meses|semanas?|dias?))?")
+_IDADE_ACIMA = re.compile(r"(?:acima de|maior(?:es)? (?:de|que)|a partir de|apos) (\d+)(?: (anos?|mes|meses|semanas?|dias?))?")
+_IDADE_ATE = re.compile(r"(ate|abaixo de|menor(?:es)? (?:de|que)) (\d+)(?: (anos?|mes|meses|semanas?|dias?))?")
+
+
+def _idades(texto: str) -> tuple[float, float] | None:
+    """Idades em anos [inicio, fim) escritas no texto normalizado; None se não houver."""
+    if encontrado := _IDADE_ENTRE.search(texto):
+        unidade = _UNIDADE[encontrado.group(3) or "anos"]
+        # "0 a 12 anos" inclui quem tem 12 anos
+        return int(encontrado.group(1)) * unidade, (int(encontrado.group(2)) + 1) * unidade
+    if encontrado := _IDADE_ACIMA.search(texto):
+        return int(encontrado.group(1)) * _UNIDADE[encontrado.group(2) or "anos"], math.inf
+    if encontrado := _IDADE_ATE.search(texto):
+        unidade = _UNIDADE[encontrado.group(3) or "anos"]
+        fim = int(encontrado.group(2)) + (1 if encontrado.group(1) == "ate" else 0)
+        return 0.0, fim * unidade
+    for palavra in texto.split():
+        if palavra in _IDADE_POR_PALAVRA:
+            return _IDADE_POR_PALAVRA[palavra]
+    return None
+
+
+def fator(nome_fator: str | None, idade: str | None) -> tuple[str | None, float, float]:
+    """Sexo e idades em anos [inicio, fim) descritos no nome e na idade do fator."""
+    texto = f"{nome_fator or ''} {idade or ''}".replace(">", " acima de ").replace("<", " abaixo de ")
+    palavras = normalizar(texto)
+    sexo = "M" if _MASCULINO & set(palavras) else "F" if _FEMININO & set(palavras) else None
+    inicio, fim = _idades(" ".join(palavras)) or (0.0, math.inf)
+    return sexo, inicio, fim
+
+
+# ----------------------------------------------------------------------
+# Índice dos fatores
+# ----------------------------------------------------------------------
+
+# Chaves de `ResolvedorFatores`; qualquer outro sexo do paciente usa a de None
+_SEXOS = ("M", "F", None)
+
+# (nome_fator, idade, limite_inferior, limite_superior) de cada fator, na ordem dos ids
+TextosFatores = tuple[tuple[str | None, str | None, str | None, str | None], ...]
+
+
+class ResolvedorFatores:
+    """
+    Fatores de uma referência indexados por sexo e faixa etária.
+
+    Para cada sexo, as idades em que começa ou termina algum fator viram uma lista
+    ordenada de pontos. Entre dois pontos vizinhos vale sempre o mesmo fator, escolhido
+    uma vez na montagem: o de faixa etária mais estreita, depois o do mesmo sexo antes
+    do que vale para ambos, depois o de menor id. Assim "Crianças 0 a 12 anos" vale para
+    um menino de 5 anos mesmo havendo um fator "Homens" sem idade. Achar o fator de um
+    paciente é um `bisect` na lista do sexo dele, O(log n).
+    """
+
+    def __init__(self, fatores: tuple[FaixaFator, ...]):
+        self.fatores = fatores
+        self._pontos: dict[str | None, list[float]] = {}
+        self._escolhidos: dict[str | None, list[int | None]] = {}
+        self._sem_idade: dict[str | None, int | None] = {}
+        for sexo in _SEXOS:
+            candidatos = [posicao for posicao, f in enumerate(fatores) if f.sexo in (None, sexo)]
+            pontos = sorted(
+                {fatores[posicao].idade_inicio for posicao in candidatos}
+                | {fatores[posicao].idade_fim for posicao in candidatos} - {math.inf}
+            )
+            self._pontos[sexo] = pontos
+            self._escolhidos[sexo] = [
+                self._melhor(posicao for posicao in candidatos
+                             if fatores[posicao].idade_inicio <= ponto < fatores[posicao].idade_fim)
+                for ponto in pontos
+            ]
+            # Paciente sem idade conhecida: só os fatores que valem para qualquer idade
+            self._sem_idade[sexo] = self._melhor(
+                posicao for posicao in candidatos
+                if fatores[posicao].idade_inicio == 0 and fatores[posicao].idade_fim == math.inf
+            )
+
+    def _melhor(self, posicoes) -> int | None:
+        def ordem(posicao):
+            fator = self.fatores[posicao]
+            return fator.idade_fim - fator.idade_inicio, fator.sexo is None, posicao
+        return min(posicoes, key=ordem, default=None)
+
+    def escolher(self, sexo: str | None, idade: float | None) -> int | None:
+        """Posição (em `fatores`) do fator que vale para o paciente; None se nenhum vale."""
+        sexo = sexo if sexo in _SEXOS else None
+        if idade is None:
+            return self._sem_idade[sexo]
+        posicao = bisect_right(self._pontos[sexo], idade) - 1
+        return self._escolhidos[sexo][posicao] if posicao >= 0 else None
+
+    def faixa(self, sexo: str | None, idade: float | None) -> Faixa | None:
+        posicao = self.escolher(sexo, idade)
+        return None if posicao is None else self.fatores[posicao].faixa
+
+
+def resolvedor(fatores: TextosFatores) -> ResolvedorFatores:
+    return ResolvedorFatores(tuple(
+        FaixaFator(*fator(nome_fator, idade), compilar(inferior, superior))
+        for nome_fator, idade, inferior, superior in fatores
+    ))
+
+
+class IndiceFatores:
+    """
+    Resolvedores já montados, pelos textos dos fatores. Nasce com os fatores do
+    catálogo; os clones repetem esses textos e caem nos mesmos resolvedores. Fatores
+    editados num clone ganham o seu na primeira vez que aparecem (até
+    `FATORES_LIMITE_EXTRAS` por índice).
+    """
+
+    def __init__(self, resolvedores: dict[TextosFatores, ResolvedorFatores]):
+        self._resolvedores = resolvedores
+        self._extras = 0
+
+    def __len__(self) -> int:
+        return len(self._resolvedores)
+
+    def resolvedor(self, fatores: TextosFatores) -> ResolvedorFatores:
+        encontrado = self._resolvedores.get(fatores)
+        if encontrado is None:
+            encontrado = resolvedor(fatores)
+            if self._extras < FATORES_LIMITE_EXTRAS:
+                self._resolvedores[fatores] = encontrado
+                self._extras += 1
+        return encontrado
+
+
+def carregar_fatores() -> IndiceFatores:
+    """Monta o índice numa consulta: os fatores das referências com fator do catálogo."""
+    por_referencia: dict[int, list[tuple]] = {}
+    for referencia_id, *textos in (
+        FatoresReferencia.objects.filter(referencia_exame__exame__padrao=True, referencia_exame__fator=True)
+        .order_by("referencia_exame_id", "pk")
+        .values_list("referencia_exame_id", "nome_fator", "idade", "limite_inferior", "limite_superior")
+    ):
+        por_referencia.setdefault(referencia_id, []).append(tuple(textos))
+    textos_distintos = {tuple(fatores) for fatores in por_referencia.values()}
+    return IndiceFatores({textos: resolvedor(textos) for textos in textos_distintos})
+
+
+_indice_fatores: tuple | None = None
+_indice_fatores_lock = threading.Lock()
+
+
+def indice_fatores() -> IndiceFatores:
+    """Índice dos fatores do catálogo, refeito quando a versão do catálogo muda."""
+    global _indice_fatores
+    versao = catalogo.versao()
+
+    with _indice_fatores_lock:
+        em_cache = _indice_fatores
+        if em_cache and em_cache[0] == versao:
+            return em_cache[1]
+
+    novo = carregar_fatores()
+    with _indice_fatores_lock:
+        _indice_fatores = (versao, novo)
+    return novo
+
+
+def textos_fatores(referencia: ReferenciaExame) -> TextosFatores:
+    """Textos dos `fatores` já carregados da referência, na chave de `IndiceFatores`."""
+    return tuple((f.nome_fator, f.idade, f.limite_inferior, f.limite_superior) for f in referencia.fatores.all())
+
+
+def idade(data_nascimento: str | date | None, em: date) -> float | None:
+    """Idade em anos na data `em`; aceita "dd/mm/aaaa", "aaaa-mm-dd" ou date."""
+    if isinstance(data_nascimento, datetime):
+        nascimento = data_nascimento.date()
+    elif isinstance(data_nascimento, date):
+        nascimento = data_nascimento
+    else:
+        texto = (data_nascimento or "").strip()
+        for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+            try:
+                nascimento = datetime.strptime(texto, formato).date()
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    dias = (em - nascimento).days
+    return dias / 365.25 if dias >= 0 else None
+
+
+def fator_aplicado(referencia: ReferenciaExame, sexo: str | None, idade_paciente: float | None,
+                   indice: IndiceFatores | None = None) -> int | None:
+    """Posição, entre os `fatores` já carregados da referência, do fator que vale para o paciente."""
+    if referencia.esperado or not referencia.fator:
+        return None
+    indice = indice if indice is not None else indice_fatores()
+    return indice.resolvedor(textos_fatores(referencia)).escolher(sexo, idade_paciente)
+
+
+def faixa_da_referencia(referencia: ReferenciaExame, sexo: str | None, idade_paciente: float | None,
+                        indice: IndiceFatores | None = None) -> Faixa | None:
+    """Faixa numérica de uma referência com `fatores` já carregados; None para valores esperados."""
+    if referencia.esperado:
+        return None
+    if referencia.fator:
+        indice = indice if indice is not None else indice_fatores()
+        return indice.resolvedor(textos_fatores(referencia)).faixa(sexo, idade_paciente)
+    return compilar(referencia.limite_inferior, referencia.limite_superior)
+
+
+# ----------------------------------------------------------------------
+# Sinalização em lote
+# ----------------------------------------------------------------------
+
+
+def sinalizar(valores, inferior, superior, margem: float = FAIXA_MARGEM_CRITICA) -> np.ndarray:
+    """
+    Códigos (posição em `SINAIS`, ou `SEM_SINAL`) para arrays de valores e limites;
+    NaN marca valor ou limite ausente.
+    """
+    valores = np.asarray(valores, dtype=float)
+    inferior = np.asarray(inferior, dtype=float)
+    superior = np.asarray(superior, dtype=float)
+
+    largura = superior - inferior
+    conhecido = np.where(np.isnan(inferior), superior, inferior)
+    folga = np.where(np.isfinite(largura), largura, np.abs(conhecido)) * margem
+
+    codigos = np.full(valores.shape, SEM_SINAL, dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        codigos[~np.isnan(valores) & ~(np.isnan(inferior) & np.isnan(superior))] = 0
+        codigos[valores < inferior] = 1
+        codigos[valores > superior] = 2
+        codigos[(folga > 0) & (valores < inferior - folga)] = 3
+        codigos[(folga > 0) & (valores > superior + folga)] = 4
+    return codigos
+
+
+def avaliar(linhas: list[tuple[str | None, Faixa | None]]) -> list[str | None]:
+    """Sinal de cada (valor digitado, faixa); sem faixa ou sem número, None."""
+    valores = np.full(len(linhas), np.nan)
+    inferior = np.full(len(linhas), np.nan)
+    superior = np.full(len(linhas), np.nan)
+    for posicao, (valor, faixa) in enumerate(linhas):
+        obtido = numero(valor)
+        if obtido is not None and faixa is not None:
+            valores[posicao] = obtido
+            inferior[posicao], superior[posicao] = faixa
+    return [SINAIS[codigo] if codigo != SEM_SINAL else None for codigo in sinalizar(valores, inferior, superior)]
+
+
+def pior(sinais) -> str | None:
+    return max(sinais, key=GRAVIDADE.__getitem__, default=None)
+
+
+class SinaisDia(NamedTuple):
+    referencias: dict[int, str | None]
+    # Sinal mais grave das referências de cada exame
+    exames: dict[int, str | None]
+
+
+def avaliar_dia(dia: date, exames: QuerySet | None = None) -> SinaisDia:
+    """
+    Sinais de todas as referências numéricas dos exames de `dia` (ou de `exames`),
+    em três consultas e uma passada vetorizada. A idade do paciente é a do dia.
+    """
+    if exames is None:
+        exames = Exame.objects.filter(data_cadastro__date=dia, padrao=False)
+
+    pacientes: dict[int, tuple[str | None, float | None]] = {}
+    for pk, sexo, nascimento in (
+        exames.order_by("pk", "r_exame__pk")
+        .values_list("pk", "r_exame__paciente__sexo", "r_exame__paciente__data_nascimento")
+    ):
+        # O orçamento mais antigo do exame, como nos laudos
+        pacientes.setdefault(pk, (sexo, idade(nascimento, dia)))
+
+    referencias = list(
+        ReferenciaExame.objects.filter(exame__in=exames.values("pk"), esperado=False)
+        .order_by("pk")
+        .values_list("pk", "exame_id", "valor_obtido", "limite_inferior", "limite_superior", "fator")
+    )
+    fatores: dict[int, list[tuple]] = {}
+    for referencia_id, *campos in (
+        FatoresReferencia.objects.filter(referencia_exame__exame__in=exames.values("pk"),
+                                         referencia_exame__fator=True, referencia_exame__esperado=False)
+        .order_by("pk")
+        .values_list("referencia_exame_id", "nome_fator", "idade", "limite_inferior", "limite_superior")
+    ):
+        fatores.setdefault(referencia_id, []).append(tuple(campos))
+
+    indice = indice_fatores()
+    linhas = []
+    for pk, exame_id, valor, inferior, superior, com_fator in referencias:
+        if com_fator:
+            sexo, idade_paciente = pacientes.get(exame_id, (None, None))
+            faixa = indice.resolvedor(tuple(fatores.get(pk, ()))).faixa(sexo, idade_paciente)
+        else:
+            faixa = compilar(inferior, superior)
+        linhas.append((valor, faixa))
+
+    sinais = {}
+    por_exame: dict[int, list[str | None]] = {pk: [] for pk in pacientes}
+    for (pk, exame_id, *_), sinal in zip(referencias, avaliar(linhas)):
+        sinais[pk] = sinal
+        por_exame.setdefault(exame_id, []).append(sinal)
+    return SinaisDia(sinais, {pk: pior(lista) for pk, lista in por_exame.items()})
@@ -0,0 +1,55 @@
+"""
+Exames do dia separados pelos grupos de laudo (`GrupoExame`).
+
+Os grupos guardam exames do catálogo; cada exame do dia chega aos grupos pelo
+exame do catálogo de onde foi clonado (`Exame.catalogo`), numa única consulta,
+independente de quantos grupos ou exames existem. Clones ainda não vinculados (ver
+`catalogo.vincular_clones`) chegam pelo nome, como antes do vínculo, com uma consulta
+a mais. Um exame entra em todos os grupos do exame de catálogo dele; os que não estão
+em nenhum ficam em `SEM_GRUPO`.
+"""
+
+from django.db.models import QuerySet
+
+from apps.exame.models import GrupoExame
+
+SEM_GRUPO = "Sem Grupo"
+
+
+def _grupos_por_nome(nomes: set[str]) -> dict[str, list[tuple[int, str]]]:
+    ligacoes = (
+        GrupoExame.exames.through.objects
+        .filter(exame__padrao=True, exame__nome__in=nomes)
+        .order_by("grupoexame_id")
+        .values_list("exame__nome", "grupoexame_id", "grupoexame__nome")
+    )
+    por_nome: dict[str, list[tuple[int, str]]] = {}
+    for nome, grupo_pk, grupo in ligacoes:
+        if (grupo_pk, grupo) not in por_nome.setdefault(nome, []):
+            por_nome[nome].append((grupo_pk, grupo))
+    return por_nome
+
+
+def agrupar(exames: QuerySet) -> dict[str, list[int]]:
+    """{nome do grupo: ids dos exames}, na ordem de cadastro dos grupos e dos exames."""
+    linhas = list(
+        exames.order_by("pk")
+        .values_list("pk", "nome", "catalogo_id", "catalogo__grupos__pk", "catalogo__grupos__nome")
+    )
+    sem_vinculo = {nome for _, nome, catalogo_id, _, _ in linhas if catalogo_id is None}
+    por_nome = _grupos_por_nome(sem_vinculo) if sem_vinculo else {}
+
+    grupos: dict[int, tuple[str, list[int]]] = {}
+    sem_grupo = []
+    for pk, nome, catalogo_id, grupo_pk, grupo in linhas:
+        do_exame = [(grupo_pk, grupo)] if catalogo_id is not None else por_nome.get(nome, [])
+        if not do_exame or do_exame[0][0] is None:
+            sem_grupo.append(pk)
+        for grupo_pk, grupo in do_exame:
+            if grupo_pk is not None:
+                grupos.setdefault(grupo_pk, (grupo, []))[1].append(pk)
+
+    agrupados = {grupo: ids for _, (grupo, ids) in sorted(grupos.items())}
+    if sem_grupo:
+        agrupados[SEM_GRUPO] = sem_grupo
+    return agrupados
@@ -0,0 +1,99 @@
+"""
+Imagens usadas nos PDFs (logo do laboratório e assinatura do biomédico).
+
+As imagens são lidas do storage local, decodificadas e reduzidas uma única vez para
+a resolução de impressão e mantidas num LRU em memória de `ImageReader`, indexado
+pelo hash do arquivo. A geração de PDF nunca acessa a rede: se o arquivo não existe
+localmente, a imagem simplesmente não é encontrada.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.contrib.staticfiles import finders
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+DPI_IMPRESSAO = 200
+TAMANHO_CACHE = 64
+
+# Logo usado quando não há tenant ou o tenant não enviou um logo
+LOGO_PADRAO = "img/gens.png"
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _ler_arquivo(campo) -> bytes | None:
+    if not campo:
+        return None
+    try:
+        with campo.open("rb") as arquivo:
+            return arquivo.read()
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def _ler_estatico(caminho: str) -> bytes | None:
+    encontrado = finders.find(caminho)
+    if not encontrado:
+        return None
+    with open(encontrado, "rb") as arquivo:
+        return arquivo.read()
+
+
+def _decodificar(conteudo: bytes, largura_px: int, altura_px: int) -> ImageReader:
+    imagem = Image.open(BytesIO(conteudo))
+    imagem.load()
+    if imagem.mode not in ("RGB", "RGBA", "L"):
+        imagem = imagem.convert("RGBA")
+    imagem.thumbnail((largura_px, altura_px), Image.LANCZOS)
+    return ImageReader(imagem)
+
+
+def imagem_reader(conteudo: bytes | None, largura: float, altura: float) -> ImageReader | None:
+    """
+    `ImageReader` pronto para ser desenhado em `largura` x `altura` pontos.
+
+    O resultado fica em cache pelo hash do conteúdo e pelo tamanho pedido, então o
+    mesmo arquivo é decodificado uma única vez por processo.
+    """
+    if not conteudo:
+        return None
+
+    largura_px = max(1, round(largura * DPI_IMPRESSAO / 72))
+    altura_px = max(1, round(altura * DPI_IMPRESSAO / 72))
+    chave = (hashlib.sha1(conteudo).hexdigest(), largura_px, altura_px)
+
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+
+    reader = _decodificar(conteudo, largura_px, altura_px)
+    with _cache_lock:
+        _cache[chave] = reader
+        _cache.move_to_end(chave)
+        while len(_cache) > TAMANHO_CACHE:
+            _cache.popitem(last=False)
+    return reader
+
+
+def logo(tenant=None, largura: float = 140, altura: float = 80) -> ImageReader | None:
+    """Logo do tenant (`Tenant.logo`) ou, na falta dele, o logo estático padrão."""
+    conteudo = _ler_arquivo(getattr(tenant, "logo", None)) or _ler_estatico(LOGO_PADRAO)
+    return imagem_reader(conteudo, largura, altura)
+
+
+def assinatura(usuario, largura: float = 120, altura: float = 100) -> ImageReader | None:
+    """Assinatura digitalizada do usuário (`Usuario.assinatura`)."""
+    if usuario is None:
+        return None
+    return imagem_reader(_ler_arquivo(usuario.assinatura), largura, altura)
+
+
+def limpar_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
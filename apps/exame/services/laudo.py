@@ -0,0 +1,246 @@
+"""
+Camada estática do laudo: moldura e cabeçalho com os dados do laboratório.
+
+O cabeçalho é igual em todos os laudos de um tenant, então textos e linhas são
+medidos e posicionados uma única vez e guardados em memória. Em cada PDF ele vira
+um form XObject (gravado uma vez por documento e reutilizado em todas as páginas);
+a view só escreve os campos do paciente e do exame por cima.
+
+O cache é versionado por `Tenant.updated_at`: qualquer alteração no cadastro do
+tenant (nome, telefone, logo, settings) gera um novo cabeçalho na próxima chamada.
+"""
+
+import threading
+from typing import NamedTuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from apps.exame.services import imagens
+
+CM = 28.35  # 1 cm em pontos, mesmo valor usado em apps/exame/relatorio.py
+
+CINZA_CLARO = (0.8, 0.8, 0.8)
+VERDE = (0, 0.5, 0)
+VERDE_CLARO = (0, 0.7, 0.3)
+PRETO = (0, 0, 0)
+
+# Dados usados quando não há tenant na requisição (instalação de laboratório único)
+DADOS_CLINICA_PADRAO = {
+    "nome": "Gen's Diagnóstica",
+    "subtitulo": "Laboratório de análises clínicas",
+    "endereco": "Rua Fortunato Silva, Nº164, Pedra Branca/CE",
+    "telefone": "(88) 9 9995 0037 / 3515 1822",
+    "site": "gensdiagnostica.com.br",
+}
+
+
+class GeometriaLaudo(NamedTuple):
+    """Pontos de referência do laudo, nos mesmos nomes usados pelas views."""
+
+    ponto1: tuple[float, float]
+    ponto2: tuple[float, float]
+    ponto3: tuple[float, float]
+    ponto4: tuple[float, float]
+    altura: float  # linha inferior do bloco do cabeçalho
+    altura1: float  # linha inferior do bloco do paciente
+    linha: float  # divisória entre logo e dados da clínica
+    linha_vertical: float  # divisória entre dados da clínica e número/emissão
+
+
+def _calcular_geometria(largura_cm: float = 19, altura_cm: float = 27) -> GeometriaLaudo:
+    largura_pagina, altura_pagina = A4
+    margem_esquerda = (largura_pagina - largura_cm * CM) / 2
+    margem_superior = (altura_pagina - altura_cm * CM) / 2
+
+    ponto1 = (margem_esquerda, margem_superior)
+    ponto2 = (margem_esquerda + largura_cm * CM, margem_superior)
+    ponto3 = (ponto2[0], margem_superior + altura_cm * CM)
+    ponto4 = (margem_esquerda, ponto3[1])
+
+    return GeometriaLaudo(
+        ponto1=ponto1,
+        ponto2=ponto2,
+        ponto3=ponto3,
+        ponto4=ponto4,
+        altura=ponto3[1] - 3 * CM,
+        altura1=ponto3[1] - 156,
+        linha=ponto1[0] + 5 * CM,
+        linha_vertical=ponto1[0] + 14 * CM,
+    )
+
+
+GEOMETRIA = _calcular_geometria()
+
+
+# ----------------------------------------------------------------------
+# Dados do laboratório
+# ----------------------------------------------------------------------
+
+
+def dados_clinica(tenant=None) -> dict[str, str]:
+    """
+    Textos do cabeçalho. Para um tenant, vêm de `name`, `phone` e das chaves
+    `subtitulo`, `endereco` e `site` de `Tenant.settings`.
+    """
+    if tenant is None:
+        return dict(DADOS_CLINICA_PADRAO)
+
+    configuracoes = tenant.settings or {}
+    return {
+        "nome": tenant.name,
+        "subtitulo": configuracoes.get("subtitulo", DADOS_CLINICA_PADRAO["subtitulo"]),
+        "endereco": configuracoes.get("endereco", ""),
+        "telefone": tenant.phone,
+        "site": configuracoes.get("site", ""),
+    }
+
+
+# ----------------------------------------------------------------------
+# Compilação e cache
+# ----------------------------------------------------------------------
+
+
+class Texto(NamedTuple):
+    x: float
+    y: float
+    texto: str
+    fonte: str
+    tamanho: float
+    cor: tuple[float, float, float]
+
+
+class CamadaEstatica(NamedTuple):
+    """Linhas e textos já posicionados; nada é medido na hora de desenhar."""
+
+    linhas: tuple[tuple[float, float, float, float], ...]
+    textos: tuple[Texto, ...]
+    imagens: tuple[tuple[ImageReader, float, float, float, float], ...] = ()
+
+
+def _texto_centralizado(texto, centro, y, fonte, tamanho, cor, tamanho_medida=None) -> Texto:
+    # `tamanho_medida` reproduz o alinhamento original, que media alguns textos
+    # com a fonte anterior do canvas em vez da fonte usada para escrever.
+    largura = stringWidth(texto, fonte, tamanho_medida or tamanho)
+    return Texto((centro - largura) / 2, y, texto, fonte, tamanho, cor)
+
+
+def _linhas_moldura(geometria: GeometriaLaudo) -> list[tuple[float, float, float, float]]:
+    ponto1, ponto2, ponto3, ponto4 = geometria.ponto1, geometria.ponto2, geometria.ponto3, geometria.ponto4
+    return [(*ponto1, *ponto2), (*ponto2, *ponto3), (*ponto3, *ponto4), (*ponto4, *ponto1)]
+
+
+def compilar_moldura(geometria: GeometriaLaudo = GEOMETRIA) -> CamadaEstatica:
+    """Borda da página, repetida em todas as páginas do laudo."""
+    return CamadaEstatica(linhas=tuple(_linhas_moldura(geometria)), textos=())
+
+
+def compilar_cabecalho(
+    dados: dict[str, str],
+    logo: ImageReader | None = None,
+    geometria: GeometriaLaudo = GEOMETRIA,
+) -> CamadaEstatica:
+    """Posiciona moldura, divisórias, logo e dados do laboratório de uma vez."""
+    ponto3, ponto4 = geometria.ponto3, geometria.ponto4
+    altura, altura1 = geometria.altura, geometria.altura1
+    linha, linha_vertical = geometria.linha, geometria.linha_vertical
+    meio_bloco = altura + 1.5 * CM
+
+    linhas = _linhas_moldura(geometria) + [
+        # Linhas horizontais do cabeçalho e do bloco do paciente
+        (ponto3[0], altura, ponto4[0], altura),
+        (ponto3[0], altura1, ponto4[0], altura1),
+        # Divisórias verticais do cabeçalho
+        (linha, ponto3[1], linha, altura),
+        (linha_vertical, ponto3[1], linha_vertical, altura),
+        (geometria.ponto2[0], meio_bloco, linha_vertical, meio_bloco),
+    ]
+
+    textos = [
+        _texto_centralizado(dados["nome"], linha - 40 + linha_vertical, altura + 2.25 * CM,
+                            "Helvetica-Bold", 18, VERDE, tamanho_medida=14),
+        _texto_centralizado(dados["subtitulo"], linha + linha_vertical, meio_bloco + 10,
+                            "Helvetica", 9, VERDE_CLARO),
+    ]
+    if dados["endereco"]:
+        textos.append(_texto_centralizado(dados["endereco"], linha - 16 + linha_vertical, meio_bloco - 3,
+                                          "Helvetica", 10, PRETO, tamanho_medida=9))
+    if dados["telefone"]:
+        textos.append(_texto_centralizado(f"Tel: {dados['telefone']}", linha - 5 + linha_vertical,
+                                          meio_bloco - 18, "Helvetica", 10, PRETO))
+    if dados["site"]:
+        textos.append(_texto_centralizado(dados["site"], linha - 5 + linha_vertical, meio_bloco - 33,
+                                          "Helvetica", 10, PRETO))
+
+    # Logo entre a borda superior e a linha de 3cm, à esquerda da primeira divisória
+    imagens = [(logo, geometria.ponto1[0] + 1, altura + 1, 140, 80)] if logo else []
+
+    return CamadaEstatica(linhas=tuple(linhas), textos=tuple(textos), imagens=tuple(imagens))
+
+
+_cabecalhos: dict = {}
+_cabecalhos_lock = threading.Lock()
+
+
+def cabecalho_do_tenant(tenant=None) -> CamadaEstatica:
+    """Cabeçalho compilado do tenant, montado só quando a versão muda."""
+    chave = getattr(tenant, "pk", None)
+    versao = getattr(tenant, "updated_at", None)
+
+    with _cabecalhos_lock:
+        em_cache = _cabecalhos.get(chave)
+        if em_cache and em_cache[0] == versao:
+            return em_cache[1]
+
+    cabecalho = compilar_cabecalho(dados_clinica(tenant), logo=imagens.logo(tenant))
+    with _cabecalhos_lock:
+        _cabecalhos[chave] = (versao, cabecalho)
+    return cabecalho
+
+
+def invalidar_cabecalho(tenant=None) -> None:
+    with _cabecalhos_lock:
+        _cabecalhos.pop(getattr(tenant, "pk", None), None)
+
+
+# ----------------------------------------------------------------------
+# Uso no canvas
+# ----------------------------------------------------------------------
+
+
+def _desenhar_form(c, nome: str, camada: CamadaEstatica) -> None:
+    # O form é gravado uma vez no PDF; as demais páginas só o referenciam
+    if not c.hasForm(nome):
+        c.beginForm(nome)
+        c.setStrokeColorRGB(*CINZA_CLARO)
+        c.setLineWidth(2)
+        c.lines(camada.linhas)
+        for texto in camada.textos:
+            c.setFont(texto.fonte, texto.tamanho)
+            c.setFillColorRGB(*texto.cor)
+            c.drawString(texto.x, texto.y, texto.texto)
+        for imagem, x, y, largura, altura in camada.imagens:
+            c.drawImage(imagem, x, y, width=largura, height=altura)
+        c.endForm()
+    c.doForm(nome)
+
+
+def desenhar_cabecalho(c, tenant=None) -> GeometriaLaudo:
+    """
+    Desenha o cabeçalho do tenant na página atual e retorna a geometria do laudo.
+
+    Uso:
+        ponto1, ponto2, ponto3, ponto4, altura, altura1, linha, linha_vertical = desenhar_cabecalho(c, tenant)
+    """
+    _desenhar_form(c, "laudo_cabecalho", cabecalho_do_tenant(tenant))
+    return GEOMETRIA
+
+
+def desenhar_pagina(c) -> GeometriaLaudo:
+    """Desenha só a moldura (páginas de continuação) e retorna a geometria do laudo."""
+    _desenhar_form(c, "laudo_moldura", _MOLDURA)
+    return GEOMETRIA
+
+
+_MOLDURA = compilar_moldura()
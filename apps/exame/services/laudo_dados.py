@@ -0,0 +1,145 @@
+"""
+Carregamento dos dados dos laudos.
+
+Busca exames, paciente, referências, fatores e valores esperados com um número fixo
+de consultas (5, independente de quantos exames ou referências existem) e devolve uma
+árvore de tuplas imutáveis. O desenho do PDF só lê essa árvore e não toca o banco.
+"""
+
+from datetime import datetime
+from typing import NamedTuple
+
+from django.db.models import Prefetch
+from django.http import Http404
+from django.utils import timezone
+
+from apps.atendimento.models import OrcamentoExames
+from apps.core.models import Usuario
+from apps.exame.models import Exame, FatoresReferencia, ReferenciaExame, ValorEsperado
+from apps.exame.services import faixas
+
+
+class FatorLaudo(NamedTuple):
+    nome_fator: str | None
+    idade: str | None
+    limite_inferior: str | None
+    limite_superior: str | None
+
+
+class EsperadoLaudo(NamedTuple):
+    tipo_valor: str
+    valor_esperado: str
+    esperado_obtido: str | None
+
+
+class ReferenciaLaudo(NamedTuple):
+    nome_referencia: str
+    valor_obtido: str | None
+    limite_inferior: str | None
+    limite_superior: str | None
+    fator: bool
+    esperado: bool
+    fatores: tuple[FatorLaudo, ...]
+    esperados: tuple[EsperadoLaudo, ...]
+    # Sinal do resultado numérico (ver services/faixas.py)
+    sinal: str | None = None
+    # Posição em `fatores` do fator que vale para o paciente (sexo e idade)
+    fator_aplicado: int | None = None
+
+
+class PacienteLaudo(NamedTuple):
+    nome: str
+    cpf: str | None
+    data_nascimento: str | None
+    sexo: str | None
+
+    def __str__(self):
+        return self.nome
+
+
+class ExameLaudo(NamedTuple):
+    pk: int
+    nome: str
+    codigo: str
+    material: str
+    metodo: str
+    comentario: str | None
+    data_alterado: datetime
+    paciente: PacienteLaudo | None
+    bio_medico: Usuario | None
+    referencias: tuple[ReferenciaLaudo, ...]
+
+
+def carregar_exames_laudo(exames_ids: list[int]) -> list[ExameLaudo]:
+    """
+    Exames de `exames_ids` na mesma ordem (ids repetidos se repetem no resultado).
+    Levanta Http404 se algum exame não existir.
+    """
+    exames = Exame.objects.filter(pk__in=set(exames_ids)).select_related("bio_medico").prefetch_related(
+        # O orçamento mais antigo do exame, como em `exame.r_exame.first()`
+        Prefetch(
+            "r_exame",
+            queryset=OrcamentoExames.objects.select_related("paciente").only(
+                "pk", "paciente__nome", "paciente__cpf", "paciente__data_nascimento", "paciente__sexo",
+            ).order_by("pk"),
+        ),
+        Prefetch(
+            "referencias",
+            queryset=ReferenciaExame.objects.order_by("pk").prefetch_related(
+                Prefetch("fatores", queryset=FatoresReferencia.objects.order_by("pk")),
+                Prefetch("padrao", queryset=ValorEsperado.objects.order_by("pk")),
+            ),
+        ),
+    )
+    arvore = {exame.pk: _montar_exame(exame) for exame in exames}
+
+    for pk in exames_ids:
+        if pk not in arvore:
+            raise Http404("Nenhum Exame corresponde à busca.")
+    return [arvore[pk] for pk in exames_ids]
+
+
+def _montar_exame(exame: Exame) -> ExameLaudo:
+    orcamentos = exame.r_exame.all()
+    paciente = orcamentos[0].paciente if orcamentos else None
+    referencias = exame.referencias.all()
+    sexo = paciente.sexo if paciente else None
+    idade = faixas.idade(paciente.data_nascimento, timezone.localdate(exame.data_cadastro)) if paciente else None
+    indice = faixas.indice_fatores()
+    aplicados = [faixas.fator_aplicado(referencia, sexo, idade, indice) for referencia in referencias]
+    sinais = faixas.avaliar([
+        (referencia.valor_obtido, faixas.faixa_da_referencia(referencia, sexo, idade, indice))
+        for referencia in referencias
+    ])
+    return ExameLaudo(
+        pk=exame.pk,
+        nome=exame.nome,
+        codigo=exame.codigo,
+        material=exame.material,
+        metodo=exame.metodo,
+        comentario=exame.comentario,
+        data_alterado=exame.data_alterado,
+        paciente=PacienteLaudo(paciente.nome, paciente.cpf, paciente.data_nascimento, paciente.sexo) if paciente else None,
+        bio_medico=exame.bio_medico,
+        referencias=tuple(
+            ReferenciaLaudo(
+                nome_referencia=referencia.nome_referencia,
+                valor_obtido=referencia.valor_obtido,
+                limite_inferior=referencia.limite_inferior,
+                limite_superior=referencia.limite_superior,
+                fator=referencia.fator,
+                esperado=referencia.esperado,
+                fatores=tuple(
+                    FatorLaudo(fator.nome_fator, fator.idade, fator.limite_inferior, fator.limite_superior)
+                    for fator in referencia.fatores.all()
+                ),
+                esperados=tuple(
+                    EsperadoLaudo(esperado.tipo_valor, esperado.valor_esperado, esperado.esperado_obtido)
+                    for esperado in referencia.padrao.all()
+                ),
+                sinal=sinal,
+                fator_aplicado=aplicado,
+            )
+            for referencia, sinal, aplicado in zip(referencias, sinais, aplicados)
+        ),
+    )
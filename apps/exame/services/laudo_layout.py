@@ -0,0 +1,245 @@
+"""
+Layout declarativo do laudo.
+
+Cada tipo de exame tem um modelo (`ModeloLaudo`) que diz como as referências são
+agrupadas em seções; o conteúdo é montado como flowables do Platypus, que cuida da
+quebra de páginas. Exames sem modelo próprio usam `MODELO_PADRAO`, então cadastrar
+um exame novo não exige código — só exames com seções especiais precisam de uma
+entrada em `MODELOS_LAUDO` (ou em `settings.LAUDO_MODELOS`, com a mesma estrutura).
+
+Os modelos são compilados (estilos, larguras de coluna, fatias) uma vez por tipo de
+exame e ficam em cache; por laudo só são criadas as linhas das tabelas.
+"""
+
+from functools import lru_cache, partial
+from typing import NamedTuple
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import (
+    BaseDocTemplate,
+    Flowable,
+    Frame,
+    KeepTogether,
+    NextPageTemplate,
+    PageTemplate,
+    Paragraph,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+from apps.exame.relatorio import escrever_texto
+from apps.exame.services import faixas, imagens
+from apps.exame.services.laudo import GEOMETRIA, desenhar_cabecalho, desenhar_pagina
+from apps.exame.services.laudo_dados import ExameLaudo, ReferenciaLaudo
+
+
+class AssinaturaNaoEncontrada(Exception):
+    def __init__(self, exame):
+        super().__init__(f"Assinatura do biomédico não encontrada para o exame {exame.codigo}.")
+        self.exame = exame
+
+
+# ----------------------------------------------------------------------
+# Modelos
+# ----------------------------------------------------------------------
+
+
+class Secao(NamedTuple):
+    """Fatia das referências do exame (na ordem de cadastro) exibida sob um título."""
+
+    titulo: str = ""
+    inicio: int = 0
+    fim: int | None = None
+
+
+class ModeloLaudo(NamedTuple):
+    secoes: tuple[Secao, ...] = (Secao("REFERÊNCIAS"),)
+    colunas: tuple[str, str, str] = ("REFERÊNCIA", "RESULTADO", "VALORES DE REFERÊNCIA")
+    larguras: tuple[float, float, float] = (195, 105, 228)
+
+
+MODELO_PADRAO = ModeloLaudo()
+
+MODELOS_LAUDO = {
+    "HEMOGRAMA COMPLETO": ModeloLaudo(
+        secoes=(
+            Secao("ERITROGRAMA", 0, 8),
+            Secao("LEUCOGRAMA", 8, 20),
+            Secao("PLAQUETAS E OUTROS", 20),
+        ),
+    ),
+}
+
+
+class ModeloCompilado(NamedTuple):
+    secoes: tuple[tuple[str, slice], ...]
+    cabecalho_tabela: tuple[str, ...]
+    larguras: tuple[float, ...]
+    estilo_tabela: TableStyle
+    estilo_celula: ParagraphStyle
+    estilo_titulo: ParagraphStyle
+
+
+ESTILO_TEXTO = ParagraphStyle("laudo_texto", fontName="Helvetica", fontSize=8, leading=10)
+ESTILO_EXAME = ParagraphStyle("laudo_exame", fontName="Helvetica-Bold", fontSize=10, leading=14)
+ESTILO_OBSERVACAO = ParagraphStyle("laudo_observacao", fontName="Courier", fontSize=7, leading=10)
+
+
+@lru_cache(maxsize=None)
+def modelo_compilado(nome_exame: str) -> ModeloCompilado:
+    modelos = {**MODELOS_LAUDO, **getattr(settings, "LAUDO_MODELOS", {})}
+    modelo = modelos.get(nome_exame, MODELO_PADRAO)
+
+    return ModeloCompilado(
+        secoes=tuple((secao.titulo, slice(secao.inicio, secao.fim)) for secao in modelo.secoes),
+        cabecalho_tabela=modelo.colunas,
+        larguras=modelo.larguras,
+        estilo_tabela=TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 8),
+            ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+            ("GRID", (0, 0), (-1, -1), 0.5, (0.8, 0.8, 0.8)),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ]),
+        estilo_celula=ESTILO_TEXTO,
+        estilo_titulo=ParagraphStyle("laudo_secao", parent=ESTILO_TEXTO, fontName="Helvetica-Bold", fontSize=9,
+                                     leading=12, spaceBefore=6),
+    )
+
+
+# ----------------------------------------------------------------------
+# Conteúdo
+# ----------------------------------------------------------------------
+
+
+# Resultados fora da faixa saem em negrito com a marca do sinal
+MARCAS_SINAL = {
+    faixas.BAIXO: "(baixo)",
+    faixas.ALTO: "(alto)",
+    faixas.CRITICO_BAIXO: "(crítico)",
+    faixas.CRITICO_ALTO: "(crítico)",
+}
+
+
+def _texto(valor) -> str:
+    return escape("" if valor is None else str(valor))
+
+
+def _linha_referencia(referencia: ReferenciaLaudo) -> tuple[str, str, str]:
+    """Resultado e faixa de referência de uma linha, conforme fatores/valores esperados."""
+    resultado = [_texto(referencia.valor_obtido)] if referencia.valor_obtido else []
+    if resultado and referencia.sinal in MARCAS_SINAL:
+        resultado = [f"<b>{resultado[0]}</b> {MARCAS_SINAL[referencia.sinal]}"]
+    faixas = []
+
+    if referencia.fator:
+        for posicao, fator in enumerate(referencia.fatores):
+            texto = (f"{_texto(fator.nome_fator or fator.idade)}: {_texto(fator.limite_inferior)} a "
+                     f"{_texto(fator.limite_superior)}")
+            # O fator do sexo e da idade do paciente sai em negrito
+            faixas.append(f"<b>{texto}</b>" if posicao == referencia.fator_aplicado else texto)
+    if referencia.esperado:
+        resultado += [_texto(esperado.esperado_obtido) for esperado in referencia.esperados if esperado.esperado_obtido]
+        faixas += [f"{_texto(esperado.tipo_valor)}: {_texto(esperado.valor_esperado)}"
+                   for esperado in referencia.esperados]
+    if not referencia.fator and not referencia.esperado:
+        faixas.append(f"{_texto(referencia.limite_inferior)} a {_texto(referencia.limite_superior)}")
+
+    return _texto(referencia.nome_referencia), " / ".join(resultado), "<br/>".join(faixas)
+
+
+def _tabela(modelo: ModeloCompilado, referencias) -> Table:
+    celula = modelo.estilo_celula
+    linhas = [modelo.cabecalho_tabela]
+    for referencia in referencias:
+        linhas.append([Paragraph(texto, celula) for texto in _linha_referencia(referencia)])
+    return Table(linhas, colWidths=modelo.larguras, style=modelo.estilo_tabela, repeatRows=1)
+
+
+class _Assinatura(Flowable):
+    def __init__(self, imagem: ImageReader, largura=120, altura=100):
+        super().__init__()
+        self.imagem, self.largura, self.altura = imagem, largura, altura
+
+    def wrap(self, largura_disponivel, altura_disponivel):
+        self._largura_disponivel = largura_disponivel
+        return largura_disponivel, self.altura
+
+    def draw(self):
+        x = (self._largura_disponivel - self.largura) / 2
+        self.canv.drawImage(self.imagem, x, 0, width=self.largura, height=self.altura, mask="auto")
+
+
+def conteudo_exame(exame: ExameLaudo) -> list[Flowable]:
+    modelo = modelo_compilado(exame.nome)
+    conteudo = [Paragraph(_texto(exame.nome), ESTILO_EXAME)]
+
+    for titulo, fatia in modelo.secoes:
+        referencias = exame.referencias[fatia]
+        if not referencias:
+            continue
+        tabela = _tabela(modelo, referencias)
+        conteudo.append(KeepTogether([Paragraph(_texto(titulo), modelo.estilo_titulo), tabela]) if titulo else tabela)
+
+    conteudo.append(Spacer(0, 8))
+    conteudo.append(Paragraph("Observações: " + _texto(exame.comentario), ESTILO_OBSERVACAO))
+
+    assinatura = imagens.assinatura(exame.bio_medico)
+    if assinatura is None:
+        raise AssinaturaNaoEncontrada(exame)
+    conteudo.append(Spacer(0, 12))
+    conteudo.append(_Assinatura(assinatura))
+    return conteudo
+
+
+# ----------------------------------------------------------------------
+# Páginas
+# ----------------------------------------------------------------------
+
+
+def _primeira_pagina(c, doc, exame: ExameLaudo, tenant):
+    ponto1, _, _, _, altura, altura1, _, linha_vertical = desenhar_cabecalho(c, tenant)
+    paciente = exame.paciente
+
+    escrever_texto(c, texto=f"Nº {exame.codigo}", x=linha_vertical + 5, y=altura + 57, font_size=11)
+    escrever_texto(c, texto=f"Emissão: {exame.data_alterado.strftime('%d/%m/%Y')}",
+                   x=linha_vertical + 5, y=altura + 18, font_size=11)
+
+    escrever_texto(c, texto=f"Nome: {paciente or ''}", x=ponto1[0] + 5, y=altura1 + 55)
+    escrever_texto(c, texto=f"CPF: {(paciente and paciente.cpf) or 'Não cadastrado'}", x=ponto1[0] + 5, y=altura1 + 35)
+    escrever_texto(c, texto=f"Material: {exame.material}", x=ponto1[0] + 5, y=altura1 + 15, font_size=8)
+    escrever_texto(c, texto=f"Data de Nascimento: {(paciente and paciente.data_nascimento) or ''}",
+                   x=ponto1[0] + 370, y=altura1 + 55)
+    escrever_texto(c, texto=f"Número do exame: {exame.codigo}", x=ponto1[0] + 370, y=altura1 + 35)
+    escrever_texto(c, texto=f"Método: {exame.metodo[:23]}", x=ponto1[0] + 370, y=altura1 + 15, font_size=8)
+
+
+def _demais_paginas(c, doc, exame: ExameLaudo):
+    ponto1, _, ponto3, _ = desenhar_pagina(c)[:4]
+    titulo = " - ".join(filter(None, [str(exame.paciente or ""), exame.nome, f"Nº {exame.codigo}"]))
+    escrever_texto(c, texto=titulo, font="Helvetica-Bold",
+                   x=ponto1[0] + 5, y=ponto3[1] - 15, font_size=9, color=(0, 0.5, 0))
+
+
+def _frame(topo: float, nome: str) -> Frame:
+    ponto1, ponto2 = GEOMETRIA.ponto1, GEOMETRIA.ponto2
+    return Frame(ponto1[0], ponto1[1], ponto2[0] - ponto1[0], topo - ponto1[1],
+                 leftPadding=5, rightPadding=5, topPadding=6, bottomPadding=6, id=nome)
+
+
+def renderizar_laudo(saida, exame: ExameLaudo, tenant=None) -> None:
+    """Escreve em `saida` o laudo completo de um exame, quebrando páginas quando necessário."""
+    documento = BaseDocTemplate(saida, pagesize=A4, title=exame.nome)
+    documento.addPageTemplates([
+        PageTemplate(id="primeira", frames=[_frame(GEOMETRIA.altura1, "primeira")],
+                     onPage=partial(_primeira_pagina, exame=exame, tenant=tenant)),
+        PageTemplate(id="demais", frames=[_frame(GEOMETRIA.ponto3[1] - 20, "demais")],
+                     onPage=partial(_demais_paginas, exame=exame)),
+    ])
+    documento.build([NextPageTemplate("demais"), *conteudo_exame(exame)])
@@ -0,0 +1,457 @@
+"""
+Desenho dos laudos em PDF.
+
+As funções escrevem o PDF em `saida` (qualquer objeto com `write`) e não dependem
+da requisição, então podem rodar fora do worker web — ver apps/exame/tasks.py.
+"""
+
+import textwrap
+
+from django.shortcuts import get_object_or_404
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+from apps.atendimento.models import OrcamentoExames
+from apps.exame.models import Exame
+from apps.exame.relatorio import adicionar_linha_paralela, escrever_texto
+from apps.exame.services.laudo import desenhar_cabecalho, desenhar_pagina
+from apps.exame.services.laudo_dados import carregar_exames_laudo
+from apps.exame.services.laudo_layout import renderizar_laudo
+from apps.platform.middleware import get_current_tenant
+
+
+def renderizar_laudo_medico(saida, pk):
+    renderizar_laudo(saida, carregar_exames_laudo([pk])[0], get_current_tenant())
+
+
+def renderizar_laudo_tabelas(saida, pk):
+    exame = get_object_or_404(Exame, pk=pk)
+    atendimento = OrcamentoExames.objects.filter(exame=exame).first()
+
+    c = canvas.Canvas(saida, pagesize=A4)
+
+    ponto1, ponto2, ponto3, ponto4, altura, altura1, linha, linha_vertical = desenhar_cabecalho(
+        c, get_current_tenant())
+
+    escrever_texto(c, texto=f'Nº {exame.codigo}',
+                   x=(linha_vertical + 5),
+                   y=(altura + 57), font_size=11,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Emissão: {exame.data_alterado.strftime("%d/%m/%Y")}',
+                   x=linha_vertical + 5,
+                   y=(altura + 18), font_size=11,
+                   color=(0, 0, 0))
+
+
+
+
+
+
+    # Escrever o nome 'CPF'
+    cpf_1 = 'Não cadastrado'
+    if atendimento.paciente.cpf:
+        cpf_1 = atendimento.paciente.cpf
+
+    escrever_texto(c, texto=cpf_1,
+                   x=ponto1[0] + 5,
+                   y=(altura1 + 35), font_size=10,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Data de Nascimento: {atendimento.paciente.data_nascimento}',
+                   x=ponto1[0] + 5,
+                   y=(altura1 + 15), font_size=10,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Sexo: {atendimento.paciente.sexo}',
+                   x=ponto1[0] + 370,
+                   y=(altura1 + 55), font_size=10,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Nome: {atendimento.paciente}',
+                   x=ponto1[0] + 5,
+                   y=(altura1 + 55), font_size=10,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Data do exame: {exame.data_cadastro.strftime("%d/%m/%Y")}',
+                   x=ponto1[0] + 370,
+                   y=(altura1 + 35), font_size=10,
+                   color=(0, 0, 0))
+
+    escrever_texto(c, texto=f'Número do exame: {exame.codigo}',
+                   x=ponto1[0] + 370,
+                   y=(altura1 + 15), font_size=10,
+                   color=(0, 0, 0))
+
+
+    data_referencia = None
+    data_referencia_fator = None
+    data_referencia_esperado = None
+    referencias = exame.referencias.all()
+    for ref in referencias:
+        if ref.fator is False and ref.esperado is False:
+            data_referencia = [
+                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+            ]
+        elif ref.fator is True and ref.esperado is False:
+            data_referencia_fator = [
+                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+            ]
+        elif ref.fator is False and ref.esperado is True:
+            data_referencia_esperado = [
+                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+            ]
+
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),  # Cor de fundo para o cabeçalho
+        ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),  # Cor do texto para o cabeçalho
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),  # Alinhamento central para todas as células
+        ('GRID', (0, 0), (-1, -1), 1, (0.8, 0.8, 0.8)),  # Bordas da tabela
+    ])
+
+    largura_disponivel, _ = A4
+
+    for referencia in referencias:
+        if referencia.fator is False and referencia.esperado is False:
+            ref = [referencia.nome_referencia, referencia.valor_obtido,
+                   f'{referencia.limite_inferior} a {referencia.limite_superior}']
+            data_referencia.append(ref)
+        elif referencia.fator is True and referencia.esperado is False:
+            fator_ref = referencia.fatores.all()
+            fator_nome1 = ''
+            fator10 = ''
+            fator100 = ''
+            for fator in fator_ref:
+                if fator.nome_fator is None:
+                    fator_nome1 = f'{fator.idade}'
+                else:
+                    fator_nome1 = f'{fator.nome_fator}'
+
+                fator10 = fator10 + f' {fator_nome1} || '
+                fator100 = fator100 + f'{fator.limite_inferior} a {fator.limite_superior}  || '
+
+            fator100 = fator100[:-3]
+            fator10 = fator10[:-3]
+
+            linhas1 = textwrap.wrap(fator10, width=50)
+            for linha in linhas1:
+                fator0 = ['', '', f'{linha}']
+                data_referencia_fator.append(fator0)
+
+            linhas10 = textwrap.wrap(fator100, width=50)
+
+            numero_linha = 1
+            for linha in linhas10:
+                if numero_linha == 1:
+                    fator1 = [referencia.nome_referencia, referencia.valor_obtido, f'{linha}']
+                else:
+                    fator1 = ['', '', f'{linha}']
+
+                data_referencia_fator.append(fator1)
+                numero_linha += 1
+
+            esperado1 = ['', '', '']
+            data_referencia_fator.append(esperado1)
+
+        elif referencia.fator is False and referencia.esperado is True:
+            ref_esperado = referencia.padrao.all()
+            numero_1 = 1
+            esperado1 = ''
+            for esperado in ref_esperado:
+                if numero_1 == 1:
+                    esperado1 = [referencia.nome_referencia, referencia.valor_obtido,
+                                 f'{esperado.tipo_valor}: {esperado.valor_esperado}']
+                else:
+                    esperado1 = ['', '',
+                                 f'{esperado.tipo_valor}: {esperado.valor_esperado}']
+                data_referencia_esperado.append(esperado1)
+                numero_1 += 1
+            if numero_1 > 2:
+                esperado1 = ['', '', '']
+                data_referencia_esperado.append(esperado1)
+        else:
+            fator_ref = referencia.fatores.all()
+
+    observacao = 0
+    tabela_referencia_altura = 0
+
+    if data_referencia != None:
+        larguras_colunas = [212, 100, 225]
+        t = Table(data_referencia, colWidths=larguras_colunas)
+        largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
+        t.setStyle(style)
+        largura_tabela = sum(t._argW)
+        posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
+        tabela_referencia_altura = 20 + altura_tabela
+        observacao += tabela_referencia_altura
+        posicao_vertical_tabela = altura1 - tabela_referencia_altura
+        t.wrapOn(c, largura_tabela, 100)
+        t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
+
+    tabela_referencia_altura_ref = 0
+
+    if data_referencia_fator != None:
+        if altura1 - (observacao + (len(data_referencia_fator) * 20)) <= 130:
+            c.showPage()
+            ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+            altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=0)
+            larguras_colunas_ref = [212, 100, 225]  # total 537
+            tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
+            largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
+            tr.setStyle(style)
+            largura_tabela_ref = sum(tr._argW)
+            posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
+            tabela_referencia_altura_ref = altura_tabela_ref
+            observacao = tabela_referencia_altura_ref
+            posicao_vertical_tabela_ref = altura1 - tabela_referencia_altura_ref
+            tr.wrapOn(c, largura_tabela_ref, 100)
+            tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
+        else:
+            larguras_colunas_ref = [212, 100, 225]  # total 537
+            tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
+            largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
+            tr.setStyle(style)
+            largura_tabela_ref = sum(tr._argW)
+            posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
+            tabela_referencia_altura_ref = observacao + altura_tabela_ref + 20
+            observacao = tabela_referencia_altura_ref
+            posicao_vertical_tabela_ref = altura1 - tabela_referencia_altura_ref
+            tr.wrapOn(c, largura_tabela_ref, 100)
+            tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
+
+    tabela_referencia_altura_esp = 0
+    if data_referencia_esperado != None:
+
+        if altura1 - (observacao + (len(data_referencia_esperado) * 20)) <= 130:
+            c.showPage()
+            ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+            altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=0)
+
+            larguras_colunas_esperado = [212, 100, 225]  # total 537
+            te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
+            largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
+            te.setStyle(style)
+            largura_tabela_esp = sum(te._argW)
+            posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
+            tabela_referencia_altura_esp = altura_tabela_esp
+            observacao = tabela_referencia_altura_esp
+            posicao_vertical_tabela_esp = altura1 - tabela_referencia_altura_esp
+            te.wrapOn(c, largura_tabela_esp, 100)
+            te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
+
+        else:
+            larguras_colunas_esperado = [212, 100, 225]  # total 537
+            te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
+            largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
+            te.setStyle(style)
+            largura_tabela_esp = sum(te._argW)
+            posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
+            tabela_referencia_altura_esp = observacao + altura_tabela_esp + 20
+            observacao = tabela_referencia_altura_esp
+            posicao_vertical_tabela_esp = altura1 - tabela_referencia_altura_esp
+            te.wrapOn(c, largura_tabela_esp, 100)
+            te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
+    c.save()
+
+
+def renderizar_laudo_grupo(saida, exames_ids_lista):
+    c = canvas.Canvas(saida, pagesize=A4)
+    ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+
+    base = 27 * 28.35
+    observacao = base
+    for exame in carregar_exames_laudo(exames_ids_lista):
+        #observacao = observacao - 20
+        altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=(base - (observacao - 20)))
+        escrever_texto(c, texto=f'{exame.paciente} - {exame.nome} - N° {exame.codigo}',
+                       font="Helvetica-Bold",
+                       x=ponto1[0] + 5,
+                       y=(altura1 + 5), font_size=10,
+                       color=(0, 0.5, 0))
+
+        data_referencia = None
+        data_referencia_fator = None
+        data_referencia_esperado = None
+        referencias = exame.referencias
+        for ref in referencias:
+            if ref.fator is False and ref.esperado is False:
+                data_referencia = [
+                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+                ]
+            elif ref.fator is True and ref.esperado is False:
+                data_referencia_fator = [
+                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+                ]
+            elif ref.fator is False and ref.esperado is True:
+                data_referencia_esperado = [
+                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
+                ]
+
+        style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),  # Cor de fundo para o cabeçalho
+            ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),  # Cor do texto para o cabeçalho
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),  # Alinhamento central para todas as células
+            ('GRID', (0, 0), (-1, -1), 1, (0.8, 0.8, 0.8)),  # Bordas da tabela
+        ])
+
+        largura_disponivel, _ = A4
+
+        for referencia in referencias:
+            if referencia.fator is False and referencia.esperado is False:
+                ref = [referencia.nome_referencia, referencia.valor_obtido,
+                       f'{referencia.limite_inferior} a {referencia.limite_superior}']
+                data_referencia.append(ref)
+            elif referencia.fator is True and referencia.esperado is False:
+                fator_ref = referencia.fatores
+                fator_nome1 = ''
+                fator10 = ''
+                fator100 = ''
+                for fator in fator_ref:
+                    if fator.nome_fator is None:
+                        fator_nome1 = f'{fator.idade}'
+                    else:
+                        fator_nome1 = f'{fator.nome_fator}'
+
+                    fator10 = fator10 + f' {fator_nome1} || '
+                    fator100 = fator100 + f'{fator.limite_inferior} a {fator.limite_superior}  || '
+
+                fator100 = fator100[:-3]
+                fator10 = fator10[:-3]
+
+                linhas1 = textwrap.wrap(fator10, width=50)
+                for linha in linhas1:
+                    fator0 = ['', '', f'{linha}']
+                    data_referencia_fator.append(fator0)
+
+                linhas10 = textwrap.wrap(fator100, width=50)
+
+                numero_linha = 1
+                for linha in linhas10:
+                    if numero_linha == 1:
+                        fator1 = [referencia.nome_referencia, referencia.valor_obtido, f'{linha}']
+                    else:
+                        fator1 = ['', '', f'{linha}']
+
+                    data_referencia_fator.append(fator1)
+                    numero_linha += 1
+
+                esperado1 = ['', '', '']
+                data_referencia_fator.append(esperado1)
+
+            elif referencia.fator is False and referencia.esperado is True:
+                ref_esperado = referencia.esperados
+                numero_1 = 1
+                esperado1 = ''
+                for esperado in ref_esperado:
+                    if numero_1 == 1:
+                        esperado1 = [referencia.nome_referencia, referencia.valor_obtido,
+                                     f'{esperado.tipo_valor}: {esperado.valor_esperado}']
+                    else:
+                        esperado1 = ['', '',
+                                     f'{esperado.tipo_valor}: {esperado.valor_esperado}']
+                    data_referencia_esperado.append(esperado1)
+                    numero_1 += 1
+                if numero_1 > 2:
+                    esperado1 = ['', '', '']
+                    data_referencia_esperado.append(esperado1)
+            else:
+                fator_ref = referencia.fatores
+
+
+        tabela_referencia_altura = 0
+
+        if data_referencia != None:
+            if observacao - (len(data_referencia) * 20) <= 5:
+                c.showPage()
+                observacao = 27 * 28.35
+                ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+                larguras_colunas = [212, 100, 225]
+                t = Table(data_referencia, colWidths=larguras_colunas)
+                largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
+                t.setStyle(style)
+                largura_tabela = sum(t._argW)
+                posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
+                tabela_referencia_altura = altura_tabela
+                posicao_vertical_tabela = observacao - tabela_referencia_altura
+                t.wrapOn(c, largura_tabela, 100)
+                t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
+                observacao = observacao - tabela_referencia_altura
+            else:
+                larguras_colunas = [212, 100, 225]
+                t = Table(data_referencia, colWidths=larguras_colunas)
+                largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
+                t.setStyle(style)
+                largura_tabela = sum(t._argW)
+                posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
+                tabela_referencia_altura = altura_tabela
+                posicao_vertical_tabela = observacao - tabela_referencia_altura
+                t.wrapOn(c, largura_tabela, 100)
+                t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
+                observacao = observacao - tabela_referencia_altura
+
+        tabela_referencia_altura_ref = 0
+
+        if data_referencia_fator != None:
+            if observacao - (len(data_referencia_fator) * 20) <= 5:
+                c.showPage()
+                observacao = 27 * 28.35
+                ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+                larguras_colunas_ref = [212, 100, 225]  # total 537
+                tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
+                largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
+                tr.setStyle(style)
+                largura_tabela_ref = sum(tr._argW)
+                posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
+                tabela_referencia_altura_ref = altura_tabela_ref
+                posicao_vertical_tabela_ref = observacao - tabela_referencia_altura_ref
+                tr.wrapOn(c, largura_tabela_ref, 100)
+                tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
+                observacao = observacao - tabela_referencia_altura_ref
+
+            else:
+                larguras_colunas_ref = [212, 100, 225]  # total 537
+                tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
+                largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
+                tr.setStyle(style)
+                largura_tabela_ref = sum(tr._argW)
+                posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
+                tabela_referencia_altura_ref = altura_tabela_ref
+                posicao_vertical_tabela_ref = observacao - tabela_referencia_altura_ref
+                tr.wrapOn(c, largura_tabela_ref, 100)
+                tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
+                observacao = observacao - tabela_referencia_altura_ref
+
+        tabela_referencia_altura_esp = 0
+        if data_referencia_esperado != None:
+            if observacao - (len(data_referencia_esperado) * 20) <= 5:
+                c.showPage()
+                observacao = 27 * 28.35
+                ponto1, ponto2, ponto3, ponto4 = desenhar_pagina(c)[:4]
+                larguras_colunas_esperado = [212, 100, 225]  # total 537
+                te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
+                largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
+                te.setStyle(style)
+                largura_tabela_esp = sum(te._argW)
+                posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
+                tabela_referencia_altura_esp = altura_tabela_esp
+                posicao_vertical_tabela_esp = observacao - tabela_referencia_altura_esp
+                te.wrapOn(c, largura_tabela_esp, 100)
+                te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
+                observacao = observacao - tabela_referencia_altura_esp
+            else:
+                larguras_colunas_esperado = [212, 100, 225]  # total 537
+                te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
+                largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
+                te.setStyle(style)
+                largura_tabela_esp = sum(te._argW)
+                posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
+                tabela_referencia_altura_esp = altura_tabela_esp
+                posicao_vertical_tabela_esp = observacao - tabela_referencia_altura_esp
+                te.wrapOn(c, largura_tabela_esp, 100)
+                te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
+                observacao = observacao - tabela_referencia_altura_esp
+
+        observacao = observacao - 40
+
+    c.save()
@@ -0,0 +1,91 @@
+"""
+Preço cobrado dos exames de atendimento.
+
+Os planos (`Plano`) ligados aos exames do catálogo formam a tabela de preços. Um
+exame clonado para um atendimento não ganha planos próprios: guarda só o nome e o
+preço do plano escolhido em `Exame.plano_cobrado`/`Exame.preco_cobrado` (ver
+`Exame.cobrar`), e é isso que os totais dos orçamentos somam.
+
+Antes disso cada clone recebia cópias dos planos selecionados. `consolidar` passa
+essas cópias para os campos do clone e apaga as cópias, em lotes. Enquanto um clone
+antigo não foi consolidado, `preco_cobrado` e `plano_cobrado` leem o primeiro plano
+dele, como os totais faziam antes: totais, comprovantes e telas do orçamento não
+dependem de o comando já ter rodado.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from apps.agenda.models import Plano
+from apps.exame.models import Exame
+
+LOTE_PADRAO = 2000
+
+
+def _primeiro_plano(exame: str, campo: str) -> Subquery:
+    return Subquery(
+        Exame.planos.through.objects.filter(exame_id=OuterRef(f"{exame}pk"))
+        .order_by("plano_id").values(f"plano__{campo}")[:1]
+    )
+
+
+def preco_cobrado(exame: str = "") -> Coalesce:
+    """
+    Expressão do preço cobrado do exame em `exame` (caminho até o exame, com "__" no
+    fim; vazio para o próprio exame): `Exame.preco_cobrado` ou, nos clones ainda não
+    consolidados, o preço do primeiro plano (menor id).
+    """
+    return Coalesce(F(f"{exame}preco_cobrado"), _primeiro_plano(exame, "preco"))
+
+
+def plano_cobrado(exame: str = "") -> Coalesce:
+    """Nome do plano cobrado, com o mesmo critério de `preco_cobrado`."""
+    return Coalesce(NullIf(F(f"{exame}plano_cobrado"), Value("")), _primeiro_plano(exame, "plano"))
+
+
+def com_cobranca(exames: QuerySet) -> QuerySet:
+    """`exames` com `preco` e `plano` cobrados anotados, para comprovantes e telas do orçamento."""
+    return exames.annotate(preco=preco_cobrado(), plano=plano_cobrado())
+
+
+def consolidar(lote: int = LOTE_PADRAO) -> tuple[int, int]:
+    """
+    Copia o primeiro plano (menor id, o mesmo que os totais usavam) de cada clone com
+    planos próprios para `plano_cobrado`/`preco_cobrado` e apaga os planos copiados,
+    em lotes de `lote` clones por transação (pode ser interrompido e rodado de novo).
+    Os totais dos orçamentos não mudam. Retorna (clones, planos apagados).
+    """
+    clones = planos_apagados = 0
+    ultimo = 0
+    while True:
+        pks = list(
+            Exame.objects.filter(pk__gt=ultimo, padrao=False, planos__isnull=False)
+            .order_by("pk").values_list("pk", flat=True).distinct()[:lote]
+        )
+        if not pks:
+            return clones, planos_apagados
+        ultimo = pks[-1]
+
+        ligacoes = Exame.planos.through.objects.filter(exame_id__in=pks)
+        primeiros: dict[int, tuple[str, Decimal]] = {}
+        copias = set()
+        for exame_id, plano_id, nome, preco in (
+            ligacoes.order_by("exame_id", "plano_id").values_list("exame_id", "plano_id", "plano__plano", "plano__preco")
+        ):
+            primeiros.setdefault(exame_id, (nome, preco))
+            copias.add(plano_id)
+
+        exames = [
+            Exame(pk=pk, plano_cobrado=nome, preco_cobrado=preco)
+            for pk, (nome, preco) in primeiros.items()
+        ]
+        with transaction.atomic():
+            Exame.objects.bulk_update(exames, ["plano_cobrado", "preco_cobrado"])
+            ligacoes.delete()
+            # Um plano ainda ligado a um exame do catálogo não é cópia, fica
+            apagados, _ = Plano.objects.filter(pk__in=copias).exclude(planos_list__isnull=False).delete()
+        clones += len(exames)
+        planos_apagados += apagados
@@ -0,0 +1,174 @@
+"""
+Lançamento dos resultados de um exame e sinais de resultado fora da referência.
+
+Todos os valores do exame (referências, fatores e valores esperados) chegam num
+único payload:
+
+    {
+        "referencias": [{"id": 10, "valor_obtido": "13,5"}, ...],
+        "fatores": [{"id": 20, "fator_obtido": "..."}, ...],
+        "esperados": [{"id": 30, "esperado_obtido": "Negativo"}, ...]
+    }
+
+O payload inteiro é validado antes de gravar (ids de outro exame, tipos e tamanhos)
+e gravado com um `bulk_update` por tabela numa única transação. A resposta traz os
+sinais recalculados: os de services/faixas.py para valores numéricos (nas referências
+com fator, a faixa do sexo e da idade do paciente) e NORMAL/ALTERADO para valores
+esperados.
+"""
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.atendimento.models import OrcamentoExames
+from apps.exame.models import Exame, FatoresReferencia, ReferenciaExame, ValorEsperado
+from apps.exame.services import faixas
+from apps.exame.services.catalogo import normalizar
+
+NORMAL = faixas.NORMAL
+ALTERADO = "ALTERADO"
+
+TAMANHO_VALOR = 80
+
+
+class ResultadosInvalidos(ValueError):
+    """Payload recusado; `erros` tem as mensagens por item (ex.: "referencias[2]")."""
+
+    def __init__(self, erros: dict[str, list[str]]):
+        super().__init__("Resultados inválidos.")
+        self.erros = erros
+
+
+# ----------------------------------------------------------------------
+# Sinais
+# ----------------------------------------------------------------------
+
+
+def sinal_esperado(obtido: str | None, esperado: str | None) -> str | None:
+    """NORMAL quando o valor obtido é o esperado (sem diferenciar acento e caixa)."""
+    if not (obtido or "").strip():
+        return None
+    return NORMAL if normalizar(obtido) == normalizar(esperado or "") else ALTERADO
+
+
+def referencias(exame: Exame) -> list[ReferenciaExame]:
+    """Referências do exame com fatores e valores esperados, em três consultas."""
+    return list(
+        exame.referencias.order_by("pk").prefetch_related(
+            Prefetch("fatores", queryset=FatoresReferencia.objects.order_by("pk")),
+            Prefetch("padrao", queryset=ValorEsperado.objects.order_by("pk")),
+        )
+    )
+
+
+def paciente(exame: Exame) -> tuple[str | None, float | None]:
+    """Sexo e idade (na data do exame) do paciente do orçamento mais antigo do exame."""
+    linha = (
+        OrcamentoExames.objects.filter(exame=exame).order_by("pk")
+        .values_list("paciente__sexo", "paciente__data_nascimento").first()
+    )
+    if linha is None:
+        return None, None
+    dia = timezone.localdate(exame.data_cadastro) if exame.data_cadastro else timezone.localdate()
+    return linha[0], faixas.idade(linha[1], dia)
+
+
+def sinalizar(exame: Exame, lista: list[ReferenciaExame]) -> list[ReferenciaExame]:
+    """Preenche `.sinal` nas referências e nos valores esperados (já carregados) da lista."""
+    sexo, idade = paciente(exame)
+    indice = faixas.indice_fatores()
+    sinais = faixas.avaliar([
+        (referencia.valor_obtido, faixas.faixa_da_referencia(referencia, sexo, idade, indice))
+        for referencia in lista
+    ])
+    for referencia, sinal in zip(lista, sinais):
+        referencia.sinal = sinal
+        for esperado in referencia.padrao.all():
+            esperado.sinal = sinal_esperado(esperado.esperado_obtido, esperado.valor_esperado)
+    return lista
+
+
+def para_json(exame: Exame, lista: list[ReferenciaExame]) -> dict:
+    return {
+        "exame": exame.pk,
+        "referencias": [
+            {"id": referencia.pk, "valor_obtido": referencia.valor_obtido, "sinal": referencia.sinal}
+            for referencia in lista
+        ],
+        "esperados": [
+            {"id": esperado.pk, "referencia": referencia.pk, "esperado_obtido": esperado.esperado_obtido,
+             "sinal": esperado.sinal}
+            for referencia in lista
+            for esperado in referencia.padrao.all()
+        ],
+    }
+
+
+def sinais(exame: Exame) -> dict:
+    """Valores e sinais atuais do exame, no formato devolvido por `salvar`."""
+    return para_json(exame, sinalizar(exame, referencias(exame)))
+
+
+# ----------------------------------------------------------------------
+# Lançamento
+# ----------------------------------------------------------------------
+
+
+def _valores(dados: dict, chave: str, campo: str, permitidos: dict, erros: dict) -> dict:
+    """Valida `dados[chave]` e devolve {objeto: novo valor}; problemas vão para `erros`."""
+    itens = dados.get(chave, [])
+    if not isinstance(itens, list):
+        erros[chave] = ["Envie uma lista."]
+        return {}
+
+    valores = {}
+    for posicao, item in enumerate(itens):
+        rotulo = f"{chave}[{posicao}]"
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int) or isinstance(item.get("id"), bool):
+            erros[rotulo] = ["Informe o id (número inteiro)."]
+            continue
+        objeto = permitidos.get(item["id"])
+        valor = item.get(campo)
+        if objeto is None:
+            erros[rotulo] = ["Item não pertence a este exame."]
+        elif objeto in valores:
+            erros[rotulo] = ["Item repetido."]
+        elif valor is not None and not isinstance(valor, str):
+            erros[rotulo] = [f"`{campo}` deve ser texto."]
+        elif valor is not None and len(valor.strip()) > TAMANHO_VALOR:
+            erros[rotulo] = [f"`{campo}` tem mais de {TAMANHO_VALOR} caracteres."]
+        else:
+            valores[objeto] = valor.strip() if valor is not None else None
+    return valores
+
+
+def salvar(exame: Exame, dados: dict) -> dict:
+    """
+    Valida e grava todos os resultados do payload numa transação. Levanta
+    `ResultadosInvalidos` sem gravar nada se algum item for inválido.
+    """
+    if not isinstance(dados, dict):
+        raise ResultadosInvalidos({"__all__": ["Envie um objeto JSON."]})
+
+    lista = referencias(exame)
+    fatores = {fator.pk: fator for referencia in lista for fator in referencia.fatores.all()}
+    esperados = {esperado.pk: esperado for referencia in lista for esperado in referencia.padrao.all()}
+
+    erros: dict[str, list[str]] = {}
+    novos = [
+        (ReferenciaExame, "valor_obtido", _valores(dados, "referencias", "valor_obtido",
+                                                   {referencia.pk: referencia for referencia in lista}, erros)),
+        (FatoresReferencia, "fator_obtido", _valores(dados, "fatores", "fator_obtido", fatores, erros)),
+        (ValorEsperado, "esperado_obtido", _valores(dados, "esperados", "esperado_obtido", esperados, erros)),
+    ]
+    if erros:
+        raise ResultadosInvalidos(erros)
+
+    with transaction.atomic():
+        for modelo, campo, valores in novos:
+            alterados = [objeto for objeto, valor in valores.items() if getattr(objeto, campo) != valor]
+            for objeto in alterados:
+                setattr(objeto, campo, valores[objeto])
+            modelo.objects.bulk_update(alterados, [campo])
+    return para_json(exame, sinalizar(exame, lista))
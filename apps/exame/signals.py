@@ -0,0 +1,19 @@
+"""
+Invalida o índice de busca do catálogo quando um exame do catálogo é gravado ou
+removido. Os clones de atendimento (padrao=False) não mexem no índice; a contagem
+de uso deles é atualizada pelo TTL do índice (ver services/catalogo.py).
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.exame.models import Exame
+from apps.exame.services import catalogo
+
+
+@receiver(post_save, sender=Exame)
+@receiver(post_delete, sender=Exame)
+def catalogo_alterado(sender, instance, **kwargs):
+    if instance.padrao:
+        transaction.on_commit(catalogo.invalidar)
@@ -0,0 +1,98 @@
+"""
+Geração de laudos fora da requisição.
+
+Um pool local de threads faz o papel do worker Celery: a view enfileira o laudo e
+responde na hora; o PDF é desenhado em segundo plano e gravado como artefato (ver
+apps/exame/services/artefatos.py). Cada thread usa a própria conexão com o banco.
+
+Quando o projeto passar a usar Celery, `enfileirar_laudo` vira um `.delay()` de uma
+`shared_task` que chama `gerar_laudo` — a view e os artefatos não mudam.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from apps.exame.services import artefatos
+from apps.exame.services.laudo_pdf import (
+    renderizar_laudo_grupo,
+    renderizar_laudo_medico,
+    renderizar_laudo_tabelas,
+)
+from apps.platform.middleware import get_current_tenant, set_current_tenant
+
+RENDERIZADORES = {
+    "medico": lambda saida, exames_ids: renderizar_laudo_medico(saida, exames_ids[0]),
+    "tabelas": lambda saida, exames_ids: renderizar_laudo_tabelas(saida, exames_ids[0]),
+    "grupo": renderizar_laudo_grupo,
+}
+
+_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, "LAUDO_WORKERS", 2),
+    thread_name_prefix="laudo",
+)
+_em_andamento: dict[str, Future] = {}
+_em_andamento_lock = threading.Lock()
+
+
+def gerar_laudo(tipo: str, exames_ids: list[int], chave: str, tenant=None) -> str:
+    """Desenha o laudo e grava o artefato. Retorna o caminho no storage."""
+    if artefatos.existe(chave):
+        return artefatos.caminho(chave)
+
+    tenant_anterior = get_current_tenant()
+    set_current_tenant(tenant)
+    close_old_connections()
+    try:
+        saida = BytesIO()
+        RENDERIZADORES[tipo](saida, exames_ids)
+        return artefatos.gravar(chave, saida.getvalue())
+    finally:
+        set_current_tenant(tenant_anterior)
+        connections.close_all()
+
+
+def enfileirar_laudo(tipo: str, exames_ids: list[int], chave: str, tenant=None) -> Future:
+    """
+    Agenda a geração do laudo `chave`. Pedidos repetidos para a mesma chave enquanto
+    ela está sendo gerada recebem o mesmo `Future`.
+    """
+    with _em_andamento_lock:
+        futuro = _em_andamento.get(chave)
+        if futuro is not None and not (futuro.done() and futuro.exception()):
+            return futuro
+        futuro = _pool.submit(gerar_laudo, tipo, list(exames_ids), chave, tenant)
+        _em_andamento[chave] = futuro
+
+    futuro.add_done_callback(lambda f: _descartar_concluido(chave, f))
+    return futuro
+
+
+def _descartar_concluido(chave: str, futuro: Future) -> None:
+    # Com sucesso o artefato já está no storage; erros ficam para a consulta de status
+    if futuro.exception() is None:
+        with _em_andamento_lock:
+            if _em_andamento.get(chave) is futuro:
+                del _em_andamento[chave]
+
+
+def status_laudo(chave: str) -> tuple[str, str | None]:
+    """
+    Situação do laudo: ("pronto", None), ("gerando", None), ("erro", mensagem)
+    ou ("desconhecido", None) se o laudo nunca foi enfileirado neste processo.
+    """
+    if artefatos.existe(chave):
+        return "pronto", None
+
+    with _em_andamento_lock:
+        futuro = _em_andamento.get(chave)
+    if futuro is None:
+        return "desconhecido", None
+    if not futuro.done():
+        return "gerando", None
+    if futuro.exception() is not None:
+        return "erro", str(futuro.exception())
+    return "pronto", None
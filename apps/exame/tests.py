@@ -1,3 +1,387 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from reportlab.pdfgen import canvas
+
+from apps.agenda.models import Plano
+from apps.atendimento.models import OrcamentoExames
+from apps.core.models import Usuario
+from apps.exame.models import Exame, FatoresReferencia, GrupoExame, ReferenciaExame, ValorEsperado
+from apps.exame.services import artefatos, catalogo, etiqueta, faixas, grupos, imagens, laudo_layout, resultados
+from apps.exame.services.laudo_dados import ExameLaudo, carregar_exames_laudo
+from apps.platform.middleware import set_current_tenant
+from apps.platform.models import Tenant
+
+
+def _cliente(usuario=None):
+    cliente = Client(HTTP_HOST='localhost')
+    if usuario is not None:
+        cliente.force_login(usuario.usuario)
+    return cliente
+
+
+def _usuario(nome, **campos):
+    login = get_user_model().objects.create_user(nome.lower(), f'{nome.lower()}@exemplo.com', 'x')
+    return Usuario.objects.create(nome=nome, sexo='F', usuario=login, **campos)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), LAUDO_ARTEFATOS_DIR=tempfile.mkdtemp())
+class AcessoLaudoTest(TestCase):
+
+    def setUp(self):
+        self.paciente = _usuario('Paciente', paciente=True)
+        self.outro_paciente = _usuario('Outro', paciente=True)
+        self.funcionario = _usuario('Funcionario', funcionario=True)
+        self.exame = Exame.objects.create(nome='GLICOSE', material='Sangue', metodo='Enzimático')
+        orcamento = OrcamentoExames.objects.create(paciente=self.paciente, valor_total=0)
+        orcamento.exame.add(self.exame)
+        # Laudo já gerado: as views servem o arquivo sem enfileirar a geração
+        self.chave = artefatos.chave_laudo('tabelas', [self.exame.pk])
+        artefatos.gravar(self.chave, b'%PDF-1.4')
+        self.parametros = {'tipo': 'tabelas', 'exames': str(self.exame.pk), 'nome': 'laudo.pdf'}
+
+    def test_anonimo_vai_para_o_login(self):
+        for url in (reverse('exame:preencher_pdf', args=[self.exame.pk]),
+                    reverse('exame:laudo_status', args=[self.chave]),
+                    reverse('exame:laudo_download', args=[self.chave])):
+            resposta = _cliente().get(url, self.parametros)
+            self.assertEqual(resposta.status_code, 302, url)
+            self.assertIn('login', resposta['Location'])
+
+    def test_funcionario_e_dono_baixam_o_laudo(self):
+        for usuario in (self.funcionario, self.paciente):
+            resposta = _cliente(usuario).get(reverse('exame:laudo_download', args=[self.chave]), self.parametros)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(b''.join(resposta.streaming_content), b'%PDF-1.4')
+
+    def test_outro_paciente_nao_acessa(self):
+        cliente = _cliente(self.outro_paciente)
+        self.assertEqual(cliente.get(reverse('exame:preencher_pdf', args=[self.exame.pk])).status_code, 403)
+        self.assertEqual(cliente.get(reverse('exame:laudo_status', args=[self.chave]), self.parametros).status_code, 403)
+        self.assertEqual(cliente.get(reverse('exame:laudo_download', args=[self.chave]), self.parametros).status_code,
+                         403)
+
+    def test_chave_de_outros_exames_nao_baixa(self):
+        outro = Exame.objects.create(nome='UREIA', material='Sangue', metodo='Enzimático')
+        parametros = {**self.parametros, 'exames': str(outro.pk)}
+        resposta = _cliente(self.funcionario).get(reverse('exame:laudo_download', args=[self.chave]), parametros)
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_exame_inexistente_e_404(self):
+        cliente = _cliente(self.funcionario)
+        self.assertEqual(cliente.get(reverse('exame:laudo_pdf'), {'exames': '999999'}).status_code, 404)
+        self.assertEqual(cliente.get(reverse('exame:laudo_pdf'),
+                                     {'exames': f'{self.exame.pk},999999'}).status_code, 404)
+
+
+class CarregarExamesLaudoTest(TestCase):
+
+    def setUp(self):
+        self.paciente = Usuario.objects.create(nome='Paciente', sexo='F', data_nascimento='01/01/1990')
+        self.exames = [self._exame(f'EXAME {numero}') for numero in range(4)]
+        # O índice dos fatores é montado uma vez por versão do catálogo, fora da contagem
+        faixas.indice_fatores()
+
+    def _exame(self, nome):
+        exame = Exame.objects.create(nome=nome, material='Sangue', metodo='Automatizado')
+        for numero in range(3):
+            ReferenciaExame.objects.create(exame=exame, nome_referencia=f'Simples {numero}', limite_inferior='1',
+                                           limite_superior='5', valor_obtido='3')
+        com_fator = ReferenciaExame.objects.create(exame=exame, nome_referencia='Fator', fator=True, valor_obtido='13')
+        FatoresReferencia.objects.create(referencia_exame=com_fator, nome_fator='Homem', idade='Adulto',
+                                         limite_inferior='13,5', limite_superior='17,5')
+        FatoresReferencia.objects.create(referencia_exame=com_fator, nome_fator='Mulher', idade='Adulto',
+                                         limite_inferior='12', limite_superior='15,5')
+        esperado = ReferenciaExame.objects.create(exame=exame, nome_referencia='Esperado', esperado=True)
+        ValorEsperado.objects.create(referencia=esperado, tipo_valor='Aspecto', valor_esperado='Límpido',
+                                     esperado_obtido='Turvo')
+        orcamento = OrcamentoExames.objects.create(paciente=self.paciente, valor_total=0)
+        orcamento.exame.add(exame)
+        return exame
+
+    def test_numero_fixo_de_consultas(self):
+        for exames in (self.exames[:1], self.exames):
+            with self.assertNumQueries(5):
+                laudos = carregar_exames_laudo([exame.pk for exame in exames])
+            self.assertEqual(len(laudos), len(exames))
+
+    def test_arvore_do_laudo(self):
+        primeiro, segundo = self.exames[:2]
+        laudos = carregar_exames_laudo([segundo.pk, primeiro.pk, segundo.pk])
+
+        self.assertEqual([laudo.pk for laudo in laudos], [segundo.pk, primeiro.pk, segundo.pk])
+        referencias = laudos[1].referencias
+        self.assertEqual([referencia.nome_referencia for referencia in referencias],
+                         ['Simples 0', 'Simples 1', 'Simples 2', 'Fator', 'Esperado'])
+        self.assertEqual(laudos[1].paciente.nome, 'Paciente')
+        fator = referencias[3]
+        self.assertEqual(fator.fator_aplicado, 1)
+        self.assertEqual(fator.sinal, faixas.NORMAL)
+        self.assertEqual(referencias[4].esperados[0].esperado_obtido, 'Turvo')
+
+
+class ResultadosTest(TestCase):
+
+    def setUp(self):
+        paciente = Usuario.objects.create(nome='Paciente', sexo='F', data_nascimento='01/01/1990')
+        self.exame = Exame.objects.create(nome='HEMOGRAMA', material='Sangue', metodo='Automatizado')
+        self.simples = ReferenciaExame.objects.create(exame=self.exame, nome_referencia='Simples',
+                                                      limite_inferior='1', limite_superior='5', valor_obtido='3')
+        self.com_fator = ReferenciaExame.objects.create(exame=self.exame, nome_referencia='Fator', fator=True)
+        self.fator = FatoresReferencia.objects.create(referencia_exame=self.com_fator, nome_fator='Mulher',
+                                                      idade='Adulto', limite_inferior='12', limite_superior='15,5')
+        com_esperado = ReferenciaExame.objects.create(exame=self.exame, nome_referencia='Aspecto', esperado=True)
+        self.esperado = ValorEsperado.objects.create(referencia=com_esperado, tipo_valor='Aspecto',
+                                                     valor_esperado='Límpido')
+        orcamento = OrcamentoExames.objects.create(paciente=paciente, valor_total=0)
+        orcamento.exame.add(self.exame)
+
+        outro = Exame.objects.create(nome='UREIA', material='Sangue', metodo='Enzimático')
+        self.de_outro = ReferenciaExame.objects.create(exame=outro, nome_referencia='Ureia', valor_obtido='20')
+
+    def valores(self):
+        return sorted(ReferenciaExame.objects.values_list('pk', 'valor_obtido'))
+
+    def test_item_de_outro_exame_e_400_sem_gravar(self):
+        antes = self.valores()
+        dados = {'referencias': [{'id': self.simples.pk, 'valor_obtido': '4'},
+                                 {'id': self.de_outro.pk, 'valor_obtido': '99'}]}
+
+        resposta = _cliente(_usuario('Funcionario', funcionario=True)).post(
+            reverse('exame:resultados_exame', args=[self.exame.pk]), dados, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json(), {'erros': {'referencias[1]': ['Item não pertence a este exame.']}})
+        self.assertEqual(self.valores(), antes)
+
+    def test_item_repetido_e_valor_que_nao_e_texto(self):
+        antes = self.valores()
+        dados = {
+            'referencias': [{'id': self.simples.pk, 'valor_obtido': '4'}, {'id': self.simples.pk, 'valor_obtido': '5'}],
+            'esperados': [{'id': self.esperado.pk, 'esperado_obtido': 7}],
+        }
+        with self.assertRaises(resultados.ResultadosInvalidos) as erro:
+            resultados.salvar(self.exame, dados)
+        self.assertEqual(erro.exception.erros, {
+            'referencias[1]': ['Item repetido.'],
+            'esperados[0]': ['`esperado_obtido` deve ser texto.'],
+        })
+        self.assertEqual(self.valores(), antes)
+
+    def test_salvar_devolve_os_sinais_recalculados(self):
+        resposta = resultados.salvar(self.exame, {
+            'referencias': [{'id': self.simples.pk, 'valor_obtido': ' 6 '}, {'id': self.com_fator.pk, 'valor_obtido': '13'}],
+            'fatores': [{'id': self.fator.pk, 'fator_obtido': 'Mulher'}],
+            'esperados': [{'id': self.esperado.pk, 'esperado_obtido': 'limpido'}],
+        })
+
+        self.assertEqual([(item['id'], item['valor_obtido'], item['sinal']) for item in resposta['referencias']], [
+            (self.simples.pk, '6', faixas.ALTO), (self.com_fator.pk, '13', faixas.NORMAL),
+            (self.esperado.referencia_id, None, None),
+        ])
+        self.assertEqual([(item['id'], item['sinal']) for item in resposta['esperados']],
+                         [(self.esperado.pk, resultados.NORMAL)])
+        self.simples.refresh_from_db()
+        self.fator.refresh_from_db()
+        self.assertEqual((self.simples.valor_obtido, self.fator.fator_obtido), ('6', 'Mulher'))
+
+
+class NumeroFaixaTest(SimpleTestCase):
+
+    def test_formatos_digitados(self):
+        for texto, esperado in (('1.200', 1200.0), ('150.000', 150000.0), ('4.5', 4.5), ('1.234,5', 1234.5),
+                                ('3,5', 3.5), ('1.200.000', 1200000.0), ('0.125', 0.125)):
+            self.assertEqual(faixas.numero(texto), esperado, texto)
+        self.assertEqual(faixas.limite('1.200 mg/dL'), 1200.0)
+
+    def test_milhar_nos_limites_e_no_resultado(self):
+        faixa = faixas.compilar('150.000', '450.000')
+        self.assertEqual(faixas.avaliar([('250000', faixa), ('250.000', faixa), ('100.000', faixa)]),
+                         [faixas.NORMAL, faixas.NORMAL, faixas.BAIXO])
+
+
+class ClonesSemVinculoTest(TestCase):
+
+    def setUp(self):
+        self.catalogo = Exame.objects.create(nome='GLICOSE', material='Sangue', metodo='Enzimático', padrao=True)
+        self.plano = Plano.objects.create(plano='Particular', preco=Decimal('25.00'))
+        self.catalogo.planos.add(self.plano)
+        self.vinculado = Exame.objects.create(nome='GLICOSE', material='Sangue', metodo='Enzimático',
+                                              catalogo=self.catalogo)
+        # Clone gravado antes de `Exame.catalogo`
+        self.legado = Exame.objects.create(nome='GLICOSE', material='Sangue', metodo='Enzimático')
+        self.avulso = Exame.objects.create(nome='SEM CATALOGO', material='Sangue', metodo='Enzimático')
+
+    def test_agrupar_usa_o_nome_dos_clones_sem_vinculo(self):
+        bioquimica = GrupoExame.objects.create(nome='Bioquímica')
+        rotina = GrupoExame.objects.create(nome='Rotina')
+        bioquimica.exames.add(self.catalogo)
+        rotina.exames.add(self.catalogo)
+        exames = Exame.objects.filter(padrao=False)
+
+        with self.assertNumQueries(2):
+            agrupados = grupos.agrupar(exames)
+        clones = [self.vinculado.pk, self.legado.pk]
+        self.assertEqual(agrupados, {'Bioquímica': clones, 'Rotina': clones, grupos.SEM_GRUPO: [self.avulso.pk]})
+
+    def test_trocar_plano_do_clone_sem_vinculo(self):
+        orcamento = OrcamentoExames.objects.create(paciente=_usuario('Paciente', paciente=True), valor_total=0)
+        orcamento.exame.add(self.legado)
+        cliente = _cliente(_usuario('Funcionario', funcionario=True))
+        url = reverse('exame:exame_atendimento_update', args=[self.legado.pk])
+
+        self.assertEqual(cliente.get(url).context['exame'], self.catalogo)
+        self.assertEqual(cliente.post(url, {'plano_selecionado': self.plano.pk}).status_code, 302)
+        self.legado.refresh_from_db()
+        self.assertEqual((self.legado.catalogo, self.legado.preco_cobrado), (self.catalogo, Decimal('25.00')))
+
+
+class FatoresReferenciaTest(SimpleTestCase):
+
+    FATORES = (
+        ('Homens', '', '13,5', '17,5'),
+        ('Mulheres', '', '12', '15,5'),
+        ('Crianças', '0 a 12 anos', '11', '14'),
+    )
+
+    def test_fator_le_sexo_e_idade(self):
+        infinito = float('inf')
+        for nome, idade, esperado in (
+            ('Homens', '', ('M', 0.0, infinito)),
+            ('Mulher adulta', None, ('F', 0.0, infinito)),
+            ('Mulheres', 'Adultos', ('F', 18.0, infinito)),
+            ('Crianças', '0 a 12 anos', (None, 0.0, 13.0)),
+            ('Crianças', '', (None, 0.0, 12.0)),
+            ('Homens', 'acima de 60 anos', ('M', 60.0, infinito)),
+            ('Adultos', '> 18', (None, 18.0, infinito)),
+            ('Recém-nascido', '', (None, 0.0, 28 / 365.25)),
+            ('Lactentes', '1 a 6 meses', (None, 1 / 12, 7 * (1 / 12))),
+            ('Todos', 'até 2 anos', (None, 0.0, 3.0)),
+        ):
+            self.assertEqual(faixas.fator(nome, idade), esperado, (nome, idade))
+
+    def test_faixa_etaria_vale_antes_do_sexo(self):
+        resolvedor = faixas.resolvedor(self.FATORES)
+        homem, mulher, crianca = (faixas.Faixa(13.5, 17.5), faixas.Faixa(12.0, 15.5), faixas.Faixa(11.0, 14.0))
+        for sexo, idade, esperado in (
+            ('M', 5, crianca), ('F', 5, crianca), (None, 5, crianca),
+            ('M', 12.9, crianca), ('M', 13, homem), ('F', 30, mulher), (None, 30, None),
+            ('M', None, homem), ('F', None, mulher), (None, None, None), ('X', 5, crianca),
+        ):
+            self.assertEqual(resolvedor.faixa(sexo, idade), esperado, (sexo, idade))
+
+    def test_mesma_faixa_etaria_prefere_o_mesmo_sexo(self):
+        resolvedor = faixas.resolvedor((
+            ('Adultos', '', '10', '20'),
+            ('Homens', 'Adultos', '13', '17'),
+        ))
+        self.assertEqual(resolvedor.faixa('M', 40), faixas.Faixa(13.0, 17.0))
+        self.assertEqual(resolvedor.faixa('F', 40), faixas.Faixa(10.0, 20.0))
+
+
+class VersaoCatalogoTest(TestCase):
+
+    def test_alteracao_em_um_tenant_vale_para_todos(self):
+        tenant = Tenant.objects.create(name='Lab', slug='lab', cnpj='01', responsible_name='Resp',
+                                       email='lab@exemplo.com')
+        self.addCleanup(set_current_tenant, None)
+        self.assertEqual(catalogo.buscar('hemo'), [])
+
+        set_current_tenant(tenant)
+        with self.captureOnCommitCallbacks(execute=True):
+            Exame.objects.create(nome='HEMOGRAMA', material='Sangue', metodo='Automatizado', padrao=True)
+        set_current_tenant(None)
+
+        self.assertEqual([exame.nome for exame in catalogo.buscar('hemo')], ['HEMOGRAMA'])
+
+    def test_versao_volta_do_banco_quando_sai_do_cache(self):
+        catalogo.invalidar()
+        versao = catalogo.versao()
+        cache.clear()
+        self.assertEqual(catalogo.versao(), versao)
+        catalogo.invalidar()
+        self.assertEqual(catalogo.versao(), versao + 1)
+
+
+class CabecalhoLaudoTest(SimpleTestCase):
+
+    def test_exame_sem_paciente_deixa_os_campos_em_branco(self):
+        exame = ExameLaudo(pk=1, nome='GLICOSE', codigo='123', material='Sangue', metodo='Enzimático',
+                           comentario=None, data_alterado=timezone.now(), paciente=None, bio_medico=None,
+                           referencias=())
+        saida = io.BytesIO()
+        pdf = canvas.Canvas(saida, pageCompression=0)
+        laudo_layout._primeira_pagina(pdf, None, exame, None)
+        laudo_layout._demais_paginas(pdf, None, exame)
+        pdf.save()
+
+        textos = [linha for linha in saida.getvalue().splitlines() if linha.endswith(b'Tj T* ET')]
+        self.assertTrue(any(b'(Nome: )' in linha for linha in textos))
+        self.assertTrue(any(b'(Data de Nascimento: )' in linha for linha in textos))
+        self.assertTrue(any(b'(GLICOSE - N\\272 123)' in linha for linha in textos))
+        self.assertFalse([linha for linha in textos if b'None' in linha])
+
+
+class LogoPadraoTest(SimpleTestCase):
+
+    def test_logo_padrao_existe_nos_estaticos(self):
+        self.assertTrue(imagens._ler_estatico(imagens.LOGO_PADRAO))
+        self.assertIsNotNone(imagens.logo())
+
+
+class PastaSpoolTest(TestCase):
+
+    @override_settings(ETIQUETA_SPOOL_DIR=None)
+    def test_padrao_fora_da_midia(self):
+        pasta = etiqueta.pasta_spool()
+        self.assertEqual(pasta, (Path(settings.BASE_DIR) / 'spool' / 'etiquetas').resolve())
+        self.assertNotIn(Path(settings.MEDIA_ROOT).resolve(), pasta.parents)
+
+    def test_recusa_pasta_dentro_da_midia(self):
+        midia = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=midia, ETIQUETA_SPOOL_DIR=Path(midia) / 'spool'):
+            with self.assertRaises(ImproperlyConfigured):
+                etiqueta.pasta_spool()
+
+
+class ArtefatosLaudoTest(TestCase):
+
+    @override_settings(LAUDO_ARTEFATOS_DIR=None)
+    def test_padrao_fora_da_midia(self):
+        pasta = artefatos.pasta()
+        self.assertEqual(pasta, (Path(settings.BASE_DIR) / 'privado' / 'laudos').resolve())
+        self.assertNotIn(Path(settings.MEDIA_ROOT).resolve(), pasta.parents)
+
+    def test_recusa_pasta_dentro_da_midia(self):
+        midia = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=midia, LAUDO_ARTEFATOS_DIR=Path(midia) / 'laudos'):
+            with self.assertRaises(ImproperlyConfigured):
+                artefatos.gravar('ab' * 32, b'%PDF-1.4')
+
+    def test_limpar_apaga_os_sem_uso_e_os_publicos_antigos(self):
+        midia, privado = tempfile.mkdtemp(), tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=midia, LAUDO_ARTEFATOS_DIR=privado):
+            antigo, recente = 'aa' * 32, 'bb' * 32
+            artefatos.gravar(antigo, b'%PDF-1.4')
+            artefatos.gravar(recente, b'%PDF-1.4')
+            self.assertFalse(any(Path(midia).iterdir()))
+            dias_atras = time.time() - 40 * 86400
+            os.utime(Path(privado) / artefatos.caminho(antigo), (dias_atras, dias_atras))
+            publico = Path(midia) / 'laudos' / 'cc'
+            publico.mkdir(parents=True)
+            (publico / f"{'cc' * 32}.pdf").write_bytes(b'%PDF-1.4')
+
+            self.assertEqual(artefatos.limpar(30), 2)
+            self.assertFalse(artefatos.existe(antigo))
+            self.assertTrue(artefatos.existe(recente))
+            self.assertFalse((Path(midia) / 'laudos').exists())
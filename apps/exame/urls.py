@@ -31,19 +31,26 @@ urlpatterns = [
     path('<int:pk>/pdf/', views.criar_laudo_medico, name='pdf'),
     path('preencher/<int:pk>/folha/', views.preencher_laudo_medico, name='preencher_pdf'),
     path('preencher/grupo/folha/', views.preencher_laudo, name='laudo_pdf'),
+    path('laudo/<str:chave>/status/', views.laudo_status, name='laudo_status'),
+    path('laudo/<str:chave>/baixar/', views.baixar_laudo, name='laudo_download'),
 
     # area medica #
     path('exame/<int:pk>/finalizar/', views.finalizar_exame, name='finalizar_exame'),
     path('area/restrita/<int:pk>/realizar/', views.ExameDetailView.as_view(), name='exame_medico_ver'),
     path('referencia/<int:pk>/salvar/', views.salvar_referencia, name='salvar_referencia'),
+    path('area/restrita/<int:pk>/resultados/', views.resultados_exame, name='resultados_exame'),
 
     path('terceirizado/area/restrita/<int:pk>/anexar/', views.ExameTerceirizado.as_view(), name='exame_medico_anexar'),
     path('pesquisar/', views.BuscarExame.as_view(), name='pesquisar_exame'),
     path('terceirizado/pesquisar/', views.BuscarExameterceirizado.as_view(), name='pesquisar_exame_terceirizado'),
     path('buscar/exame/', views.buscar_exame, name='buscar_exame'),
     path('terceirizado/buscar/exame/', views.buscar_exame_terceirizado, name='buscar_exame_terceirizado'),
+    path('codigo/<str:codigo>/leitura/', views.leitura_codigo, name='leitura_codigo'),
     path('imprimir/etiqueta/<int:pk>/', views.etiqueta_exame, name='etiqueta_exame'),
     path('etiquetas/impressas', views.etiquetas_de_exame, name='etiquetas'),
+    path('<str:data>/etiquetas/impressora/', views.etiquetas_dia, name='etiquetas_dia'),
+    path('<str:data>/etiquetas/folha/', views.folha_etiquetas, name='folha_etiquetas'),
+    path('orcamento/<int:pk>/etiquetas/folha/', views.folha_etiquetas, name='folha_etiquetas_orcamento'),
     #grupo
     path('add/grupo/', views.GrupoCreate.as_view(), name='add_grupo'),
     path('data/grupo/<str:data>/', views.ExamesGrupoData.as_view(), name='grupo_data'),
@@ -1,31 +1,31 @@
 import json
-import textwrap
-from io import BytesIO
-from urllib.parse import unquote
+from datetime import date
+from urllib.parse import unquote, urlencode
 
-import requests
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy, reverse
+from django.views.decorators.http import require_http_methods
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView, TemplateView
 from reportlab.lib.colors import Color
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
 from ..agenda.models import Plano
 from ..atendimento.models import OrcamentoExames
 from ..core.models import Usuario
-from ..exame.exame_create import objeto_exame
+from ..exame.exame_create import clonar_exames
 from ..exame.forms import *
 from ..exame.models import Exame, ReferenciaExame, FatoresReferencia, ValorEsperado, GrupoExame
-from ..exame.relatorio import desenhar_retangulo, adicionar_linha_paralela, adicionar_linha_vertical, escrever_texto, \
-    escrever_dados_clinica, escrever_exame_info, configurar_margens
+from ..exame.services import artefatos, catalogo, etiqueta, faixas, grupos, resultados, codigo as busca_codigo
+from ..exame.tasks import RENDERIZADORES, enfileirar_laudo, status_laudo
+from ..platform.middleware import get_current_tenant
 
 
 class ExameAdd(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -68,10 +68,8 @@ class ExameAtendimentoADD(LoginRequiredMixin, SuccessMessageMixin,  CreateView):
 
             print(f'Numeros: {numeros}')
 
-            for numero in exames_selecionados_ids:
-                id = int(numero)
-                obj_exame = objeto_exame(pk=id, sequencia=numeros)
-                orcamento.exame.add(obj_exame)
+            exames_clonados = clonar_exames(pks=exames_selecionados_ids, sequencia=numeros)
+            orcamento.exame.add(*exames_clonados)
             orcamento.valor_total = orcamento.calcular_total()
             orcamento.save()
 
@@ -101,6 +99,12 @@ class ExamesListaData(LoginRequiredMixin, ListView):
     def get_context_data(self, *, object_list=None, **kwargs):
         contexto = super().get_context_data(**kwargs)
         data = self.kwargs['data']
+        # Sinal mais grave dos resultados já lançados, para destacar a linha do exame
+        exames = list(contexto['exames'])
+        sinais = faixas.avaliar_dia(date.fromisoformat(data), self.object_list).exames
+        for exame in exames:
+            exame.sinal = sinais.get(exame.pk)
+        contexto['exames'] = contexto['object_list'] = exames
         contexto['terceirizados'] = Exame.objects.filter(data_cadastro__date=data, status_exame='AGUARDANDO', padrao=False, terceirizado=True)
         return contexto
 
@@ -131,35 +135,7 @@ class ExamesGrupoData(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         contexto = super().get_context_data(**kwargs)
-        exames = self.get_queryset()
-        grupos = GrupoExame.objects.all()
-
-        grupos_exames = {}  # Dicionário para armazenar {grupo: ids_dos_exames}
-
-        for grupo in grupos:
-            exames_do_grupo = grupo.exames.all()
-            exames_ids = [exame.id for exame in exames if exame.nome in exames_do_grupo.values_list('nome', flat=True)]
-
-            if exames_ids:
-                grupos_exames[grupo.nome] = exames_ids  # Apenas os IDs dos exames
-
-        exames_sem_grupo = []
-        for exame in exames:
-            # Verifica se o nome do exame não pertence a nenhum grupo
-            pertence_a_grupo = False
-            for grupo in grupos:
-                exames_do_grupo = grupo.exames.all()
-                if exame.nome in exames_do_grupo.values_list('nome', flat=True):
-                    pertence_a_grupo = True
-                    break
-            if not pertence_a_grupo:
-                exames_sem_grupo.append(exame.id)
-
-        # Adiciona os exames sem grupo ao dicionário
-        if exames_sem_grupo:
-            grupos_exames['Sem Grupo'] = exames_sem_grupo
-
-        contexto['grupos'] = grupos_exames  # Passa apenas os IDs para o template
+        contexto['grupos'] = grupos.agrupar(self.get_queryset())  # Apenas os IDs para o template
         return contexto
 
 
@@ -209,33 +185,28 @@ class ExameAtendimentoUp(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
         orcamento = OrcamentoExames.objects.filter(exame=exame).first()
         return reverse_lazy('atendimento:orcamento_update', kwargs={'pk': orcamento.pk})
 
+    def get_queryset(self):
+        return Exame.objects.select_related('catalogo')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        exame = self.get_object()
+        exame = self.object
         orcamento = OrcamentoExames.objects.filter(exame=exame).first()
-        exame1 = ''
-        exames = Exame.objects.filter(ativo=True, padrao=True)
-        for exam in exames:
-            if exam.nome == exame.nome:
-                exame1 = exam
+        catalogo_exame = catalogo.do_clone(exame)
 
-        context['exame'] = exame1
+        context['exame'] = catalogo_exame if catalogo_exame and catalogo_exame.ativo else ''
         context['orcamento'] = orcamento
         return context
 
     def form_valid(self, form):
         exame = form.save(commit=False)
         plano_selecionado_id = self.request.POST.get('plano_selecionado')
-        plano = Plano.objects.get(pk=plano_selecionado_id)
-        plano_create = Plano.objects.create(
-            plano=plano.plano,
-            preco=plano.preco,
-            habilitado=True
-        )
-        plano1 = exame.planos.first()
-        plano1.delete()
-
-        exame.planos.add(plano_create)
+        # Clones anteriores ao vínculo casam pelo nome e ficam vinculados a partir daqui
+        exame.catalogo = catalogo.do_clone(exame)
+        if exame.catalogo is None:
+            raise Http404('Exame sem exame de catálogo correspondente.')
+        exame.cobrar(get_object_or_404(Plano, pk=plano_selecionado_id, planos_list=exame.catalogo))
+        exame.save()
         orcamento = OrcamentoExames.objects.filter(exame=exame).first()
         orcamento.valor_total = orcamento.calcular_total()
         orcamento.save()
@@ -277,12 +248,6 @@ class ExameAtendimentoDel(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
     def form_valid(self, form):
         exame = self.get_object()
         orcamento = OrcamentoExames.objects.filter(exame=exame).first()
-        try:
-            plano = exame.planos.first()
-            plano.delete()
-        except:
-            print('Erro ao excluir plano associado ao exame.')
-
         response = super().form_valid(form)
 
         orcamento.valor_total = orcamento.calcular_total()
@@ -569,34 +534,55 @@ class ExameDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Passando as referências diretamente para o template
-        context['referencias'] = self.object.referencias.all()
+        # Referências com fatores, valores esperados e o sinal de cada resultado
+        context['referencias'] = resultados.sinalizar(self.object, resultados.referencias(self.object))
         context['orcamento'] = OrcamentoExames.objects.filter(exame=self.object).first()
         return context
 
 
 def salvar_referencia(request, pk):
-    referencia = get_object_or_404(ReferenciaExame, pk=pk)
+    referencia = get_object_or_404(ReferenciaExame.objects.select_related('exame'), pk=pk)
 
     if request.method == "POST":
-        # Salvar valor direto na ReferenciaExame
+        # Formulário sem JavaScript: o valor da referência e os valores esperados dela
+        dados = {'esperados': [
+            {'id': int(nome[len('esperado_'):]), 'esperado_obtido': valor}
+            for nome, valor in request.POST.items()
+            if nome.startswith('esperado_') and nome[len('esperado_'):].isdigit()
+        ]}
         valor = request.POST.get('valor_obtido')
-        print(f'Valor:{valor}')
         if valor is not None:
-            referencia.valor_obtido = valor
-            referencia.save()
-
-        # Salvar valores esperados (padrao)
-        for esperado in referencia.padrao.all():
-            novo_valor = request.POST.get(f"esperado_{esperado.id}")
-            if novo_valor is not None:
-                esperado.esperado_obtido = novo_valor
-                esperado.save()
+            dados['referencias'] = [{'id': referencia.pk, 'valor_obtido': valor}]
+        try:
+            resultados.salvar(referencia.exame, dados)
+        except resultados.ResultadosInvalidos:
+            messages.error(request, 'Não foi possível salvar os valores informados.')
 
     url = reverse('exame:exame_medico_ver', args=[referencia.exame.id])
     return HttpResponseRedirect(f"{url}#referencia{referencia.id}")
 
 
+@login_required
+@require_http_methods(['GET', 'POST'])
+def resultados_exame(request, pk):
+    """
+    Resultados do exame em JSON. O POST grava todos os valores de uma vez (ver
+    services/resultados.py) e devolve os sinais recalculados.
+    """
+    exame = get_object_or_404(Exame, pk=pk)
+    if request.method == 'GET':
+        return JsonResponse(resultados.sinais(exame))
+
+    try:
+        dados = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'erros': {'__all__': ['JSON inválido.']}}, status=400)
+    try:
+        return JsonResponse(resultados.salvar(exame, dados))
+    except resultados.ResultadosInvalidos as erro:
+        return JsonResponse({'erros': erro.erros}, status=400)
+
+
 class ExameTerceirizado(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     model = Exame
     form_class = ExameMedicTerceirizado
@@ -612,1275 +598,126 @@ class ExameTerceirizado(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
         return context
 
 
-def criar_laudo_medico(request, pk):
-    exame = get_object_or_404(Exame, pk=pk)
-
-    if exame.nome == "HEMOGRAMA COMPLETO":
-        atendimento = OrcamentoExames.objects.filter(exame=exame).first()
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{atendimento.paciente}.pdf"'
-
-        c = canvas.Canvas(response, pagesize=A4)
-
-        ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-
-
-        #linhas paralelas
-        altura = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=85.05)
-        altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=156)
-
-        #linhas verticais
-        linha = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=141.75)
-        linha_vertical = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=14 * 28.35)
-
-        # Desenhar a linha horizontal paralela à linha de 3cm e entre as linhas verticais de 14cm e 5cm
-        largura_linha_horizontal_15cm = ponto1[0] + 1 * 28.35  # Largura da linha a 15cm da linha vertical à esquerda em pontos
-        c.setStrokeColorRGB(0.8, 0.8, 0.8)  # Cinza claro
-        c.line(ponto2[0], altura + 1.5 * 28.35, linha_vertical,
-               altura + 1.5 * 28.35)
-
-
-        # Escrever o texto "Nome Gen's Diagnóstica" em negrito e cor verde
-        texto = "Gen's Diagnóstica"
-        largura_texto = c.stringWidth(texto, "Helvetica-Bold", 14)  # Obter a largura do texto em pontos
-
-        escrever_texto(c, texto=texto,
-                       x=((linha - 40 + linha_vertical - largura_texto) / 2),
-                       y=(altura + 2.25 * 28.35), font="Helvetica-Bold", font_size=18,
-                       color=(0, 0.5, 0))
-
-        c.setFont("Helvetica", 9)
-        texto_laboratorio = "Laboratório de análises clínicas"
-        largura_texto_laboratorio = c.stringWidth(texto_laboratorio)  # Obter a largura do texto em pontos
-
-        escrever_texto(c, texto=texto_laboratorio,
-                       x=((linha + linha_vertical - largura_texto_laboratorio) / 2),
-                       y=(altura + 1.5 * 28.35 + 10), font_size=9,
-                       color=(0, 0.7, 0.3))
-
-        endereco = "Rua Fortunato Silva, Nº164, Pedra Branca/CE"
-        largura_endereco = c.stringWidth(endereco)
-
-        escrever_texto(c, texto=endereco,
-                       x=((linha - 16 + linha_vertical - largura_endereco) / 2),
-                       y=(altura + 1.5 * 28.35 - 3), font_size=10,
-                       color=(0, 0, 0))
-
-        telefone = "Tel: (88) 9 9995 0037 / 3515 1822"
-        largura_telefone = c.stringWidth(telefone)
-
-        escrever_texto(c, texto=telefone,
-                       x=((linha - 5 + linha_vertical - largura_telefone) / 2),
-                       y=(altura + 1.5 * 28.35 - 18), font_size=10,
-                       color=(0, 0, 0))
-
-        site = "gensdiagnostica.com.br"
-        largura_site = c.stringWidth(site)
-
-        escrever_texto(c, texto=site,
-                       x=((linha - 5 + linha_vertical - largura_site) / 2),
-                       y=(altura + 1.5 * 28.35 - 33), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Nº {exame.codigo}',
-                       x=(linha_vertical + 5),
-                       y=(altura + 57), font_size=11,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Emissão: {exame.data_alterado.strftime("%d/%m/%Y")}',
-                       x=linha_vertical + 5,
-                       y=(altura + 18), font_size=11,
-                       color=(0, 0, 0))
-
-
-
-        # Escrever o nome 'CPF'
-        cpf_1 = 'Não cadastrado'
-        if atendimento.paciente.cpf:
-            cpf_1 = atendimento.paciente.cpf
-
-        escrever_texto(c,texto=f'CPF: {cpf_1}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 35), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Material: {exame.material}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 15), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Data de Nascimento: {atendimento.paciente.data_nascimento}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 55), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Nome: {atendimento.paciente}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 55), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Número do exame: {exame.codigo}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 35), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Método: {exame.metodo}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 15), font_size=10,
-                       color=(0, 0, 0))
-
-        # Adicionar a imagem entre as linhas horizontais superior e de 3cm
-        imagem = "https://gensdiagnostica.com.br/static/img/gens.png"  # Caminho para a imagem
-        largura_imagem = 140  # Largura da imagem em pontos
-        altura_imagem = 80  # Altura da imagem em pontos
-        c.drawImage(imagem, ponto1[0] + 1, altura + 1, width=largura_imagem, height=altura_imagem)
-
-        distancia = altura1
-
-        escrever_texto(c, texto=f'{exame.nome}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 - 15), font_size=10,
-                       color=(0, 0, 0))
-
-        distancia -= 15
-
-        referencias = exame.referencias.all()
-        serie_vermelha = referencias[:8]
-        leucocitos = referencias[8:9]
-        serie_branca = referencias[9:20]
-        outros = referencias[20:]
-
-        escrever_texto(c, texto=f'ERITROGRAMA',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 20), font_size=9,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'VALORES DE REFERÊNCIA',
-                       x=ponto1[0] + 270,
-                       y=(distancia - 20), font_size=9,
-                       color=(0, 0, 0))
-
-        distancia -= 20
-
-        # Calcula o maior tamanho entre os nomes de referência
-        maior_tamanho = max(len(ref.nome_referencia) for ref in serie_vermelha)
-
-        for referencia_vermelha in serie_vermelha:
-            if not referencia_vermelha.fator and not referencia_vermelha.esperado:
-                nome = referencia_vermelha.nome_referencia
-                fator = referencia_vermelha.valor_obtido
-                max_min = f'{referencia_vermelha.limite_inferior} a {referencia_vermelha.limite_superior}'
-                # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + fator
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font= "Courier")
-
-                escrever_texto(c, texto=max_min,
-                               x=ponto1[0] + 270,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font= "Courier")
-
-                distancia -= 13
-
-            elif referencia_vermelha.fator and not referencia_vermelha.esperado:
-                nome = referencia_vermelha.nome_referencia
-                fator = referencia_vermelha.valor_obtido
-
-                fatores = referencia_vermelha.fatores.all()
-                max_min = ''
-                for fat in fatores:
-                    max_min += f'{fat.nome_fator}: {fat.limite_inferior} a {fat.limite_superior} | '
-                # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + fator
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=max_min[:-2],
-                               x=ponto1[0] + 270,
-                               y=(distancia - 13), font_size=7,
-                               color=(0, 0, 0), font="Courier")
-
-                distancia -= 13
-
-
-        escrever_texto(c, texto=f'Observações: ',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 13), font_size=7,
-                       color=(0, 0, 0), font="Courier")
-
-        distancia -= 25
-
-        escrever_texto(c, texto=f'{leucocitos[0].nome_referencia} totais.: {leucocitos[0].valor_obtido}',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 13), font_size=8,
-                       color=(0, 0, 0), font="Courier")
-
-        escrever_texto(c, texto=f'{leucocitos[0].limite_inferior} a {leucocitos[0].limite_superior}',
-                       x=ponto1[0] + 270,
-                       y=(distancia - 13), font_size=7,
-                       color=(0, 0, 0), font="Courier")
-
-        distancia -= 25
-
-        escrever_texto(c, texto=f'',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 15), font_size=9,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'VALORES DE REFERÊNCIA',
-                       x=ponto1[0] + 270,
-                       y=(distancia - 15), font_size=9,
-                       color=(0, 0, 0))
-
-        distancia -= 18
-
-        # Calcula o maior tamanho entre os nomes de referência
-        maior_tamanho = max(len(ref.nome_referencia) for ref in serie_branca)
-        maior_tamanho_fator = 0
-        for referencia in serie_branca:
-            for fator in referencia.fatores.all():
-                if len(fator.nome_fator) > maior_tamanho_fator:
-                    maior_tamanho_fator = len(fator.nome_fator)
-
-        for referencia_branca in serie_branca:
-            nome = referencia_branca.nome_referencia
-            esperados_ref1 = 270
-            esperados_valor = ''
-            if not referencia_branca.fator and referencia_branca.esperado:
-                esperados = referencia_branca.padrao.all()
-                for espere in esperados:
-                    escrever_texto(c, texto=f'{espere.tipo_valor}: {espere.valor_esperado}',
-                                   x=ponto1[0] + esperados_ref1,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-                    esperados_valor += f'{espere.esperado_obtido}             '
-                    esperados_ref1 += 110
-            # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + esperados_valor[:-5]
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-            elif referencia_branca.fator and referencia_branca.esperado:
-                fatores = referencia_branca.fatores.all()
-                esperados = referencia_branca.padrao.all()
-                esperados_ref = ''
-                for espere in esperados:
-                    esperados_ref += f'{espere.tipo_valor}: {espere.valor_esperado}'
-                    esperados_valor += f'{espere.esperado_obtido}'
-
-                max_min = ''
-                for fat in fatores:
-                    max_min += f'{fat.nome_fator}: {fat.limite_inferior} a {fat.limite_superior}'
-            # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + referencia_branca.valor_obtido
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=esperados_valor,
-                               x=ponto1[0] + 150,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-
-                escrever_texto(c, texto=f'{max_min}',
-                               x=ponto1[0] + 270,
-                               y=(distancia - 13), font_size=7,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=f'{esperados_ref}',
-                               x=ponto1[0] +380,
-                               y=(distancia - 13), font_size=7,
-                               color=(0, 0, 0), font="Courier")
-
-            distancia -= 13
-
-        escrever_texto(c, texto=f'Observações: ',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 13), font_size=7,
-                       color=(0, 0, 0), font="Courier")
-
-        distancia -= 30
-
-        maior_tamanho = max(len(ref.nome_referencia) for ref in outros)
-        for outro in outros:
-            nome = outro.nome_referencia
-            # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-            nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + outro.valor_obtido
-
-            escrever_texto(c, texto=nome_formatado,
-                           x=ponto1[0] + 5,
-                           y=(distancia - 13), font_size=8,
-                           color=(0, 0, 0), font="Courier")
-
-            escrever_texto(c, texto=f'{outro.limite_inferior} a {outro.limite_superior}',
-                           x=ponto1[0] + 270,
-                           y=(distancia - 13), font_size=7,
-                           color=(0, 0, 0), font="Courier")
-
-            distancia -= 13
-
-        distancia -= 10
-
-        escrever_texto(c, texto=f'Observações:',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 15), font_size=7,
-                       color=(0, 0, 0), font="Courier")
-
-        distancia -= 15
-
-        comentario = exame.comentario or ''
-        max_largura = 500
-        largura_caractere = 4.2  # aproximação para Courier 7pt
-        max_caracteres = int(max_largura / largura_caractere)
-
-        linhas = textwrap.wrap(f'{comentario}', width=max_caracteres)
-
-        for linha in linhas:
-            escrever_texto(c, texto=linha,
-                           x=ponto1[0] + 10,
-                           y=(distancia - 15), font_size=7,
-                           color=(0, 0, 0), font="Courier")
-            distancia -= 10
-
-
-
-        imagem_url = request.build_absolute_uri(exame.bio_medico.assinatura.url)
-
-        # Baixar a imagem
-        response_imagem = requests.get(imagem_url)
-        if response_imagem.status_code == 200:
-            imagem_bytes = response_imagem.content
-            imagem_reader = ImageReader(BytesIO(imagem_bytes))
-
-            largura_imagem = 120
-            altura_imagem = 100
-
-            # Calcular posição da assinatura
-            y_assinatura = ponto4[0] + 10
-            x_assinatura = ponto4[0] + ((ponto3[0] - ponto4[0]) - largura_imagem) / 2
-
-            # Inserir imagem no PDF
-            c.drawImage(imagem_reader, x_assinatura, y_assinatura, width=largura_imagem, height=altura_imagem, mask='auto')
-        else:
-            return HttpResponse('Erro ao baixar a imagem', status=500)
-
-    else:
-        atendimento = OrcamentoExames.objects.filter(exame=exame).first()
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{atendimento.paciente}.pdf"'
-
-        c = canvas.Canvas(response, pagesize=A4)
-
-        ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-
-        # linhas paralelas
-        altura = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=85.05)
-        altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=156)
-
-        # linhas verticais
-        linha = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=141.75)
-        linha_vertical = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=14 * 28.35)
-
-        # Desenhar a linha horizontal paralela à linha de 3cm e entre as linhas verticais de 14cm e 5cm
-        largura_linha_horizontal_15cm = ponto1[
-                                            0] + 1 * 28.35  # Largura da linha a 15cm da linha vertical à esquerda em pontos
-        c.setStrokeColorRGB(0.8, 0.8, 0.8)  # Cinza claro
-        c.line(ponto2[0], altura + 1.5 * 28.35, linha_vertical,
-               altura + 1.5 * 28.35)
-
-        # Escrever o texto "Nome Gen's Diagnóstica" em negrito e cor verde
-        texto = "Gen's Diagnóstica"
-        largura_texto = c.stringWidth(texto, "Helvetica-Bold", 14)  # Obter a largura do texto em pontos
-
-        escrever_texto(c, texto=texto,
-                       x=((linha - 40 + linha_vertical - largura_texto) / 2),
-                       y=(altura + 2.25 * 28.35), font="Helvetica-Bold", font_size=18,
-                       color=(0, 0.5, 0))
-
-        c.setFont("Helvetica", 9)
-        texto_laboratorio = "Laboratório de análises clínicas"
-        largura_texto_laboratorio = c.stringWidth(texto_laboratorio)  # Obter a largura do texto em pontos
-
-        escrever_texto(c, texto=texto_laboratorio,
-                       x=((linha + linha_vertical - largura_texto_laboratorio) / 2),
-                       y=(altura + 1.5 * 28.35 + 10), font_size=9,
-                       color=(0, 0.7, 0.3))
-
-        endereco = "Rua Fortunato Silva, Nº164, Pedra Branca/CE"
-        largura_endereco = c.stringWidth(endereco)
-
-        escrever_texto(c, texto=endereco,
-                       x=((linha - 16 + linha_vertical - largura_endereco) / 2),
-                       y=(altura + 1.5 * 28.35 - 3), font_size=10,
-                       color=(0, 0, 0))
-
-        telefone = "Tel: (88) 9 9995 0037 / 3515 1822"
-        largura_telefone = c.stringWidth(telefone)
-
-        escrever_texto(c, texto=telefone,
-                       x=((linha - 5 + linha_vertical - largura_telefone) / 2),
-                       y=(altura + 1.5 * 28.35 - 18), font_size=10,
-                       color=(0, 0, 0))
-
-        site = "gensdiagnostica.com.br"
-        largura_site = c.stringWidth(site)
-
-        escrever_texto(c, texto=site,
-                       x=((linha - 5 + linha_vertical - largura_site) / 2),
-                       y=(altura + 1.5 * 28.35 - 33), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Nº {exame.codigo}',
-                       x=(linha_vertical + 5),
-                       y=(altura + 57), font_size=11,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Emissão: {exame.data_alterado.strftime("%d/%m/%Y")}',
-                       x=linha_vertical + 5,
-                       y=(altura + 18), font_size=11,
-                       color=(0, 0, 0))
-
-        # Escrever o nome 'CPF'
-        cpf_1 = 'Não cadastrado'
-        if atendimento.paciente.cpf:
-            cpf_1 = atendimento.paciente.cpf
-
-        escrever_texto(c, texto=f'CPF: {cpf_1}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 35), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Material: {exame.material}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 15), font_size=8,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Data de Nascimento: {atendimento.paciente.data_nascimento}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 55), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Nome: {atendimento.paciente}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 55), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Número do exame: {exame.codigo}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 35), font_size=10,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'Método: {exame.metodo[:23]}',
-                       x=ponto1[0] + 370,
-                       y=(altura1 + 15), font_size=8,
-                       color=(0, 0, 0))
-
-        # Adicionar a imagem entre as linhas horizontais superior e de 3cm
-        imagem = "https://gensdiagnostica.com.br/static/img/gens.png"  # Caminho para a imagem
-        largura_imagem = 140  # Largura da imagem em pontos
-        altura_imagem = 80  # Altura da imagem em pontos
-        c.drawImage(imagem, ponto1[0] + 1, altura + 1, width=largura_imagem, height=altura_imagem)
-
-        distancia = altura1
-
-        escrever_texto(c, texto=f'{exame.nome}',
-                       x=ponto1[0] + 5,
-                       y=(altura1 - 15), font_size=10,
-                       color=(0, 0, 0))
-
-        distancia -= 15
-
-        referencias = exame.referencias.all()
-        # Calcula o maior tamanho entre os nomes de referência
-        try:
-            maior_tamanho = max(len(ref.nome_referencia) for ref in referencias)
-            maior_tamanho = 29
-        except:
-            referencias1 = ReferenciaExame.objects.filter(exame=exame).first()
-
-
-        escrever_texto(c, texto=f'REFERENCIAS',
-                       x=ponto1[0] + 5,
-                       y=(distancia - 20), font_size=9,
-                       color=(0, 0, 0))
-
-        escrever_texto(c, texto=f'VALORES DE REFERÊNCIA',
-                       x=ponto1[0] + 270,
-                       y=(distancia - 20), font_size=9,
-                       color=(0, 0, 0))
-
-        distancia -= 20
-
-        for referencia in referencias:
-            if not referencia.fator and not referencia.esperado:
-                nome = referencia.nome_referencia[:29]
-                fator = referencia.valor_obtido
-                max_min = f'{referencia.limite_inferior} a {referencia.limite_superior}'
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + fator
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=max_min,
-                               x=ponto1[0] + 270,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-                distancia -= 13
-
-            elif referencia.fator and not referencia.esperado:
-                nome = referencia.nome_referencia[:29]
-                fator = referencia.valor_obtido
-
-                fatores = referencia.fatores.all()
-                max_min = ''
-                for fat in fatores:
-                    max_min += f'{fat.nome_fator}: {fat.limite_inferior} a {fat.limite_superior} | '
-                # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + fator
-                if len(max_min) < 60:
-                    escrever_texto(c, texto=nome_formatado,
-                                   x=ponto1[0] + 5,
-                                   y=(distancia - 13), font_size=8,
-                                   color=(0, 0, 0), font="Courier")
-
-                    escrever_texto(c, texto=max_min[:-2],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                elif len(max_min) > 60 and len(max_min) <= 120:
-                    escrever_texto(c, texto=max_min[:61],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                    escrever_texto(c, texto=nome_formatado,
-                                   x=ponto1[0] + 5,
-                                   y=(distancia - 13), font_size=8,
-                                   color=(0, 0, 0), font="Courier")
-
-                    distancia -= 13
-
-                    escrever_texto(c, texto=max_min[61:-2],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-
-                elif len(max_min) > 120:
-                    escrever_texto(c, texto=max_min[:61],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                    escrever_texto(c, texto=nome_formatado,
-                                   x=ponto1[0] + 5,
-                                   y=(distancia - 13), font_size=8,
-                                   color=(0, 0, 0), font="Courier")
-
-                    distancia -= 13
-
-                    escrever_texto(c, texto=max_min[61:121],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                    distancia -= 13
-
-                    escrever_texto(c, texto=max_min[121:-2],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                distancia -= 13
-
-            elif not referencia.fator and referencia.esperado:
-                nome = referencia.nome_referencia[:29]
-
-                val_esp = referencia.padrao.all()
-                ref_esp = ''
-                esp_val = ''
-                val = 160
-
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': '
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-
-                for esperado in val_esp:
-                    ref_esp += f'{esperado.tipo_valor}: {esperado.valor_esperado}'
-
-                    escrever_texto(c, texto=esperado.esperado_obtido,
-                                   x=ponto1[0] + val,
-                                   y=(distancia - 13), font_size=8,
-                                   color=(0, 0, 0), font="Courier")
-
-                    val += 50
-
-                # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-
-                if len(ref_esp) <= 60:
-                    escrever_texto(c, texto=ref_esp,
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-
-                elif len(ref_esp) > 60 and len(ref_esp) <= 120:
-                    escrever_texto(c, texto=ref_esp[:61],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                    distancia -= 13
-
-                    escrever_texto(c, texto=ref_esp[61:120],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                elif len(ref_esp) > 120:
-                    escrever_texto(c, texto=ref_esp[:61],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-                    distancia -= 13
 
-                    escrever_texto(c, texto=ref_esp[61:120],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
 
-                    distancia -= 13
-
-                    escrever_texto(c, texto=ref_esp[121:],
-                                   x=ponto1[0] + 270,
-                                   y=(distancia - 13), font_size=7,
-                                   color=(0, 0, 0), font="Courier")
-
-            elif referencia.fator and referencia.esperado:
-                fatores = referencia.fatores.all()
-                esperados = referencia.padrao.all()
-                nome = referencia.nome_referencia[:29]
-                esperados_ref = ''
-                esperados_valor = ''
-                for espere in esperados:
-                    esperados_ref += f'{espere.tipo_valor}: {espere.valor_esperado}'
-                    esperados_valor += f'{espere.esperado_obtido}'
-
-                max_min = ''
-                for fat in fatores:
-                    max_min += f'{fat.nome_fator}: {fat.limite_inferior} a {fat.limite_superior}'
-            # Preenche com pontos até o maior tamanho e adiciona os dois-pontos
-                nome_formatado = nome.ljust(maior_tamanho, '.') + ': ' + referencia.valor_obtido
-
-                escrever_texto(c, texto=nome_formatado,
-                               x=ponto1[0] + 5,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=esperados_valor,
-                               x=ponto1[0] + 150,
-                               y=(distancia - 13), font_size=8,
-                               color=(0, 0, 0), font="Courier")
-
-
-                escrever_texto(c, texto=f'{max_min}',
-                               x=ponto1[0] + 270,
-                               y=(distancia - 13), font_size=7,
-                               color=(0, 0, 0), font="Courier")
-
-                escrever_texto(c, texto=f'{esperados_ref}',
-                               x=ponto1[0] +380,
-                               y=(distancia - 13), font_size=7,
-                               color=(0, 0, 0), font="Courier")
-
-            distancia -= 13
-
-    distancia -= 10
-
-    escrever_texto(c, texto=f'Observações:',
-                   x=ponto1[0] + 5,
-                   y=(distancia - 15), font_size=7,
-                   color=(0, 0, 0), font="Courier")
-
-    distancia -= 15
-
-    comentario = exame.comentario or ''
-    max_largura = 500
-    largura_caractere = 4.2  # aproximação para Courier 7pt
-    max_caracteres = int(max_largura / largura_caractere)
-
-    linhas = textwrap.wrap(f'{comentario}', width=max_caracteres)
-
-    for linha in linhas:
-        escrever_texto(c, texto=linha,
-                       x=ponto1[0] + 10,
-                       y=(distancia - 15), font_size=7,
-                       color=(0, 0, 0), font="Courier")
-        distancia -= 10
-
-    imagem_url = request.build_absolute_uri(exame.bio_medico.assinatura.url)
-
-    # Baixar a imagem
-    response_imagem = requests.get(imagem_url)
-    if response_imagem.status_code == 200:
-        imagem_bytes = response_imagem.content
-        imagem_reader = ImageReader(BytesIO(imagem_bytes))
-
-        largura_imagem = 120
-        altura_imagem = 100
-
-        # Calcular posição da assinatura
-        y_assinatura = ponto4[0] + 10
-        x_assinatura = ponto4[0] + ((ponto3[0] - ponto4[0]) - largura_imagem) / 2
-
-        # Inserir imagem no PDF
-        c.drawImage(imagem_reader, x_assinatura, y_assinatura, width=largura_imagem, height=altura_imagem,
-                    mask='auto')
-    else:
-        return HttpResponse('Erro ao baixar a imagem', status=500)
-
-    c.save()
-    return response
+@login_required
+def criar_laudo_medico(request, pk):
+    exame = get_object_or_404(Exame, pk=pk)
+    atendimento = OrcamentoExames.objects.filter(exame=exame).first()
+    return _laudo_em_segundo_plano(request, 'medico', [exame.pk], f'{atendimento.paciente}.pdf')
 
 
+@login_required
 def preencher_laudo_medico(request, pk):
     exame = get_object_or_404(Exame, pk=pk)
     atendimento = OrcamentoExames.objects.filter(exame=exame).first()
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{atendimento.paciente}.pdf"'
-
-    c = canvas.Canvas(response, pagesize=A4)
-
-    ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-
-
-    #linhas paralelas
-    altura = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=85.05)
-    altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=156)
-
-    #linhas verticais
-    linha = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=141.75)
-    linha_vertical = adicionar_linha_vertical(c, ponto1, ponto3, altura=85.05, largura_intervalo=14 * 28.35)
-
-    # Desenhar a linha horizontal paralela à linha de 3cm e entre as linhas verticais de 14cm e 5cm
-    largura_linha_horizontal_15cm = ponto1[0] + 1 * 28.35  # Largura da linha a 15cm da linha vertical à esquerda em pontos
-    c.setStrokeColorRGB(0.8, 0.8, 0.8)  # Cinza claro
-    c.line(ponto2[0], altura + 1.5 * 28.35, linha_vertical,
-           altura + 1.5 * 28.35)
-
-
-    # Escrever o texto "Nome Gen's Diagnóstica" em negrito e cor verde
-    texto = "Gen's Diagnóstica"
-    largura_texto = c.stringWidth(texto, "Helvetica-Bold", 14)  # Obter a largura do texto em pontos
-
-    escrever_texto(c, texto=texto,
-                   x=((linha - 40 + linha_vertical - largura_texto) / 2),
-                   y=(altura + 2.25 * 28.35), font="Helvetica-Bold", font_size=18,
-                   color=(0, 0.5, 0))
-
-    c.setFont("Helvetica", 9)
-    texto_laboratorio = "Laboratório de análises clínicas"
-    largura_texto_laboratorio = c.stringWidth(texto_laboratorio)  # Obter a largura do texto em pontos
-
-    escrever_texto(c, texto=texto_laboratorio,
-                   x=((linha + linha_vertical - largura_texto_laboratorio) / 2),
-                   y=(altura + 1.5 * 28.35 + 10), font_size=9,
-                   color=(0, 0.7, 0.3))
-
-    endereco = "Rua Fortunato Silva, Nº164, Pedra Branca/CE"
-    largura_endereco = c.stringWidth(endereco)
-
-    escrever_texto(c, texto=endereco,
-                   x=((linha - 16 + linha_vertical - largura_endereco) / 2),
-                   y=(altura + 1.5 * 28.35 - 3), font_size=10,
-                   color=(0, 0, 0))
-
-    telefone = "Tel: (88) 9 9995 0037 / 3515 1822"
-    largura_telefone = c.stringWidth(telefone)
-
-    escrever_texto(c, texto=telefone,
-                   x=((linha - 5 + linha_vertical - largura_telefone) / 2),
-                   y=(altura + 1.5 * 28.35 - 18), font_size=10,
-                   color=(0, 0, 0))
-
-    site = "gensdiagnostica.com.br"
-    largura_site = c.stringWidth(site)
-
-    escrever_texto(c, texto=site,
-                   x=((linha - 5 + linha_vertical - largura_site) / 2),
-                   y=(altura + 1.5 * 28.35 - 33), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Nº {exame.codigo}',
-                   x=(linha_vertical + 5),
-                   y=(altura + 57), font_size=11,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Emissão: {exame.data_alterado.strftime("%d/%m/%Y")}',
-                   x=linha_vertical + 5,
-                   y=(altura + 18), font_size=11,
-                   color=(0, 0, 0))
-
-
-
-
-
-
-    # Escrever o nome 'CPF'
-    cpf_1 = 'Não cadastrado'
-    if atendimento.paciente.cpf:
-        cpf_1 = atendimento.paciente.cpf
-
-    escrever_texto(c, texto=cpf_1,
-                   x=ponto1[0] + 5,
-                   y=(altura1 + 35), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Data de Nascimento: {atendimento.paciente.data_nascimento}',
-                   x=ponto1[0] + 5,
-                   y=(altura1 + 15), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Sexo: {atendimento.paciente.sexo}',
-                   x=ponto1[0] + 370,
-                   y=(altura1 + 55), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Nome: {atendimento.paciente}',
-                   x=ponto1[0] + 5,
-                   y=(altura1 + 55), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Data do exame: {exame.data_cadastro.strftime("%d/%m/%Y")}',
-                   x=ponto1[0] + 370,
-                   y=(altura1 + 35), font_size=10,
-                   color=(0, 0, 0))
-
-    escrever_texto(c, texto=f'Número do exame: {exame.codigo}',
-                   x=ponto1[0] + 370,
-                   y=(altura1 + 15), font_size=10,
-                   color=(0, 0, 0))
-
-    # Adicionar a imagem entre as linhas horizontais superior e de 3cm
-    imagem = "https://gensdiagnostica.com.br/static/img/gens.png"  # Caminho para a imagem
-    largura_imagem = 140  # Largura da imagem em pontos
-    altura_imagem = 80  # Altura da imagem em pontos
-    c.drawImage(imagem, ponto1[0] + 1, altura + 1, width=largura_imagem, height=altura_imagem)
-
-    data_referencia = None
-    data_referencia_fator = None
-    data_referencia_esperado = None
-    referencias = exame.referencias.all()
-    for ref in referencias:
-        if ref.fator is False and ref.esperado is False:
-            data_referencia = [
-                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-            ]
-        elif ref.fator is True and ref.esperado is False:
-            data_referencia_fator = [
-                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-            ]
-        elif ref.fator is False and ref.esperado is True:
-            data_referencia_esperado = [
-                ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-            ]
-
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),  # Cor de fundo para o cabeçalho
-        ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),  # Cor do texto para o cabeçalho
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),  # Alinhamento central para todas as células
-        ('GRID', (0, 0), (-1, -1), 1, (0.8, 0.8, 0.8)),  # Bordas da tabela
-    ])
-
-    largura_disponivel, _ = A4
-
-    for referencia in referencias:
-        if referencia.fator is False and referencia.esperado is False:
-            ref = [referencia.nome_referencia, referencia.valor_obtido,
-                   f'{referencia.limite_inferior} a {referencia.limite_superior}']
-            data_referencia.append(ref)
-        elif referencia.fator is True and referencia.esperado is False:
-            fator_ref = referencia.fatores.all()
-            fator_nome1 = ''
-            fator10 = ''
-            fator100 = ''
-            for fator in fator_ref:
-                if fator.nome_fator is None:
-                    fator_nome1 = f'{fator.idade}'
-                else:
-                    fator_nome1 = f'{fator.nome_fator}'
-
-                fator10 = fator10 + f' {fator_nome1} || '
-                fator100 = fator100 + f'{fator.limite_inferior} a {fator.limite_superior}  || '
-
-            fator100 = fator100[:-3]
-            fator10 = fator10[:-3]
-
-            linhas1 = textwrap.wrap(fator10, width=50)
-            for linha in linhas1:
-                fator0 = ['', '', f'{linha}']
-                data_referencia_fator.append(fator0)
-
-            linhas10 = textwrap.wrap(fator100, width=50)
-
-            numero_linha = 1
-            for linha in linhas10:
-                if numero_linha == 1:
-                    fator1 = [referencia.nome_referencia, referencia.valor_obtido, f'{linha}']
-                else:
-                    fator1 = ['', '', f'{linha}']
-
-                data_referencia_fator.append(fator1)
-                numero_linha += 1
-
-            esperado1 = ['', '', '']
-            data_referencia_fator.append(esperado1)
-
-        elif referencia.fator is False and referencia.esperado is True:
-            ref_esperado = referencia.padrao.all()
-            numero_1 = 1
-            esperado1 = ''
-            for esperado in ref_esperado:
-                if numero_1 == 1:
-                    esperado1 = [referencia.nome_referencia, referencia.valor_obtido,
-                                 f'{esperado.tipo_valor}: {esperado.valor_esperado}']
-                else:
-                    esperado1 = ['', '',
-                                 f'{esperado.tipo_valor}: {esperado.valor_esperado}']
-                data_referencia_esperado.append(esperado1)
-                numero_1 += 1
-            if numero_1 > 2:
-                esperado1 = ['', '', '']
-                data_referencia_esperado.append(esperado1)
-        else:
-            fator_ref = referencia.fatores.all()
-
-    observacao = 0
-    tabela_referencia_altura = 0
-
-    if data_referencia != None:
-        larguras_colunas = [212, 100, 225]
-        t = Table(data_referencia, colWidths=larguras_colunas)
-        largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
-        t.setStyle(style)
-        largura_tabela = sum(t._argW)
-        posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
-        tabela_referencia_altura = 20 + altura_tabela
-        observacao += tabela_referencia_altura
-        posicao_vertical_tabela = altura1 - tabela_referencia_altura
-        t.wrapOn(c, largura_tabela, 100)
-        t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
-        print(f'Observação: {observacao}')
-
-    tabela_referencia_altura_ref = 0
-
-    if data_referencia_fator != None:
-        if altura1 - (observacao + (len(data_referencia_fator) * 20)) <= 130:
-            c.showPage()
-            ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-            altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=0)
-            larguras_colunas_ref = [212, 100, 225]  # total 537
-            tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
-            largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
-            tr.setStyle(style)
-            largura_tabela_ref = sum(tr._argW)
-            posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
-            tabela_referencia_altura_ref = altura_tabela_ref
-            observacao = tabela_referencia_altura_ref
-            posicao_vertical_tabela_ref = altura1 - tabela_referencia_altura_ref
-            tr.wrapOn(c, largura_tabela_ref, 100)
-            tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
-            print(f'Observação DRF IF: {observacao}')
-            print(f'DRF IF: {tabela_referencia_altura_ref}')
-        else:
-            larguras_colunas_ref = [212, 100, 225]  # total 537
-            tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
-            largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
-            tr.setStyle(style)
-            largura_tabela_ref = sum(tr._argW)
-            posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
-            tabela_referencia_altura_ref = observacao + altura_tabela_ref + 20
-            observacao = tabela_referencia_altura_ref
-            posicao_vertical_tabela_ref = altura1 - tabela_referencia_altura_ref
-            tr.wrapOn(c, largura_tabela_ref, 100)
-            tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
-            print(f'Observação DRF: {observacao}')
-
-    tabela_referencia_altura_esp = 0
-    if data_referencia_esperado != None:
-
-        if altura1 - (observacao + (len(data_referencia_esperado) * 20)) <= 130:
-            c.showPage()
-            ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-            altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=0)
-
-            larguras_colunas_esperado = [212, 100, 225]  # total 537
-            te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
-            largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
-            te.setStyle(style)
-            largura_tabela_esp = sum(te._argW)
-            posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
-            tabela_referencia_altura_esp = altura_tabela_esp
-            observacao = tabela_referencia_altura_esp
-            posicao_vertical_tabela_esp = altura1 - tabela_referencia_altura_esp
-            te.wrapOn(c, largura_tabela_esp, 100)
-            te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
-            print(f'Observação DRE IF: {observacao}')
-
-        else:
-            larguras_colunas_esperado = [212, 100, 225]  # total 537
-            te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
-            largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
-            te.setStyle(style)
-            largura_tabela_esp = sum(te._argW)
-            posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
-            tabela_referencia_altura_esp = observacao + altura_tabela_esp + 20
-            observacao = tabela_referencia_altura_esp
-            posicao_vertical_tabela_esp = altura1 - tabela_referencia_altura_esp
-            te.wrapOn(c, largura_tabela_esp, 100)
-            te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
-            print(f'Observação DRE: {observacao}')
-    c.save()
-
-    return response
+    return _laudo_em_segundo_plano(request, 'tabelas', [exame.pk], f'{atendimento.paciente}.pdf')
 
 
+@login_required
 def preencher_laudo(request):
     exames_ids = request.GET.get('exames', '')
     grupo_id = request.GET.get('grupo', '')
     grupo_id = unquote(grupo_id)
     exames_ids_lista = [int(id) for id in exames_ids.split(',') if id.isdigit()]
+    if not exames_ids_lista:
+        raise Http404('Nenhum exame informado.')
+    return _laudo_em_segundo_plano(request, 'grupo', exames_ids_lista, f'{grupo_id}.pdf')
+
+
+def _verificar_acesso_exames(usuario, exames_ids):
+    """
+    Levanta Http404 se algum exame não existe e PermissionDenied se o usuário não pode
+    ver algum deles: a equipe (funcionário, adm, biomédico) vê todos, o paciente só os
+    exames dos próprios orçamentos.
+    """
+    ids = set(exames_ids)
+    if Exame.objects.filter(pk__in=ids).count() != len(ids):
+        raise Http404('Nenhum Exame corresponde à busca.')
+    if usuario.is_superuser:
+        return
+    cadastro = getattr(usuario, 'usuario', None)
+    if cadastro is not None and (cadastro.funcionario or cadastro.adm or cadastro.doutor):
+        return
+    proprios = OrcamentoExames.exame.through.objects.filter(
+        exame_id__in=ids, orcamentoexames__paciente=cadastro).values('exame_id').distinct().count()
+    if cadastro is None or proprios != len(ids):
+        raise PermissionDenied
+
+
+def _parametros_laudo(request):
+    """Tipo, exames e nome do arquivo do laudo na query string das telas de status e download."""
+    tipo = request.GET.get('tipo', '')
+    exames_ids = [int(id) for id in request.GET.get('exames', '').split(',') if id.isdigit()]
+    if tipo not in RENDERIZADORES or not exames_ids:
+        raise Http404('Laudo não encontrado.')
+    _verificar_acesso_exames(request.user, exames_ids)
+    return tipo, exames_ids, request.GET.get('nome') or 'laudo.pdf'
+
+
+def _url_laudo(nome_url, chave, tipo, exames_ids, nome_arquivo):
+    parametros = urlencode({'tipo': tipo, 'exames': ','.join(map(str, exames_ids)), 'nome': nome_arquivo})
+    return f"{reverse(nome_url, args=[chave])}?{parametros}"
+
+
+def _laudo_em_segundo_plano(request, tipo, exames_ids, nome_arquivo):
+    """Serve o PDF já gerado ou enfileira a geração e redireciona para o status."""
+    _verificar_acesso_exames(request.user, exames_ids)
+    tenant = get_current_tenant()
+    chave = artefatos.chave_laudo(tipo, exames_ids, tenant)
+    if artefatos.existe(chave):
+        return _arquivo_laudo(chave, nome_arquivo)
+
+    enfileirar_laudo(tipo, exames_ids, chave, tenant)
+    return redirect(_url_laudo('exame:laudo_status', chave, tipo, exames_ids, nome_arquivo))
+
+
+def _arquivo_laudo(chave, nome_arquivo):
+    return FileResponse(artefatos.abrir(chave), as_attachment=True, filename=nome_arquivo,
+                        content_type='application/pdf')
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{grupo_id}.pdf"'
-
-    c = canvas.Canvas(response, pagesize=A4)
-    ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
 
-    base = 27 * 28.35
-    observacao = base
-    print(f'Observação Init: {observacao}')
-    for id in exames_ids_lista:
-        exame = get_object_or_404(Exame, pk=id)
-        atendimento = exame.r_exame.first()
-        #observacao = observacao - 20
-        altura1 = adicionar_linha_paralela(c, ponto3, ponto4, intervalo=(base - (observacao - 20)))
-        escrever_texto(c, texto=f'{atendimento.paciente} - {exame} - N° {exame.codigo}',
-                       font="Helvetica-Bold",
-                       x=ponto1[0] + 5,
-                       y=(altura1 + 5), font_size=10,
-                       color=(0, 0.5, 0))
-
-        data_referencia = None
-        data_referencia_fator = None
-        data_referencia_esperado = None
-        referencias = exame.referencias.all()
-        for ref in referencias:
-            if ref.fator is False and ref.esperado is False:
-                data_referencia = [
-                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-                ]
-            elif ref.fator is True and ref.esperado is False:
-                data_referencia_fator = [
-                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-                ]
-            elif ref.fator is False and ref.esperado is True:
-                data_referencia_esperado = [
-                    ['REFERÊNCIA', 'V. ENCONTRADO', 'VALORES DE REFERÊNCIA'],
-                ]
-
-        style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),  # Cor de fundo para o cabeçalho
-            ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),  # Cor do texto para o cabeçalho
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),  # Alinhamento central para todas as células
-            ('GRID', (0, 0), (-1, -1), 1, (0.8, 0.8, 0.8)),  # Bordas da tabela
-        ])
-
-        largura_disponivel, _ = A4
-
-        for referencia in referencias:
-            if referencia.fator is False and referencia.esperado is False:
-                ref = [referencia.nome_referencia, referencia.valor_obtido,
-                       f'{referencia.limite_inferior} a {referencia.limite_superior}']
-                data_referencia.append(ref)
-            elif referencia.fator is True and referencia.esperado is False:
-                fator_ref = referencia.fatores.all()
-                fator_nome1 = ''
-                fator10 = ''
-                fator100 = ''
-                for fator in fator_ref:
-                    if fator.nome_fator is None:
-                        fator_nome1 = f'{fator.idade}'
-                    else:
-                        fator_nome1 = f'{fator.nome_fator}'
-
-                    fator10 = fator10 + f' {fator_nome1} || '
-                    fator100 = fator100 + f'{fator.limite_inferior} a {fator.limite_superior}  || '
-
-                fator100 = fator100[:-3]
-                fator10 = fator10[:-3]
-
-                linhas1 = textwrap.wrap(fator10, width=50)
-                for linha in linhas1:
-                    fator0 = ['', '', f'{linha}']
-                    data_referencia_fator.append(fator0)
-
-                linhas10 = textwrap.wrap(fator100, width=50)
-
-                numero_linha = 1
-                for linha in linhas10:
-                    if numero_linha == 1:
-                        fator1 = [referencia.nome_referencia, referencia.valor_obtido, f'{linha}']
-                    else:
-                        fator1 = ['', '', f'{linha}']
-
-                    data_referencia_fator.append(fator1)
-                    numero_linha += 1
-
-                esperado1 = ['', '', '']
-                data_referencia_fator.append(esperado1)
-
-            elif referencia.fator is False and referencia.esperado is True:
-                ref_esperado = referencia.padrao.all()
-                numero_1 = 1
-                esperado1 = ''
-                for esperado in ref_esperado:
-                    if numero_1 == 1:
-                        esperado1 = [referencia.nome_referencia, referencia.valor_obtido,
-                                     f'{esperado.tipo_valor}: {esperado.valor_esperado}']
-                    else:
-                        esperado1 = ['', '',
-                                     f'{esperado.tipo_valor}: {esperado.valor_esperado}']
-                    data_referencia_esperado.append(esperado1)
-                    numero_1 += 1
-                if numero_1 > 2:
-                    esperado1 = ['', '', '']
-                    data_referencia_esperado.append(esperado1)
-            else:
-                fator_ref = referencia.fatores.all()
-
-
-        tabela_referencia_altura = 0
-
-        if data_referencia != None:
-            print(f'Observação1: {observacao}')
-            if observacao - (len(data_referencia) * 20) <= 5:
-                c.showPage()
-                observacao = 27 * 28.35
-                ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-                larguras_colunas = [212, 100, 225]
-                t = Table(data_referencia, colWidths=larguras_colunas)
-                largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
-                t.setStyle(style)
-                largura_tabela = sum(t._argW)
-                posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
-                tabela_referencia_altura = altura_tabela
-                posicao_vertical_tabela = observacao - tabela_referencia_altura
-                t.wrapOn(c, largura_tabela, 100)
-                t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
-                observacao = observacao - tabela_referencia_altura
-            else:
-                larguras_colunas = [212, 100, 225]
-                t = Table(data_referencia, colWidths=larguras_colunas)
-                largura_tabela, altura_tabela = t.wrapOn(None, largura_disponivel, 0)
-                t.setStyle(style)
-                largura_tabela = sum(t._argW)
-                posicao_horizontal_tabela = ponto1[0] + (((19 * 28.35) - largura_tabela) / 2)
-                tabela_referencia_altura = altura_tabela
-                posicao_vertical_tabela = observacao - tabela_referencia_altura
-                t.wrapOn(c, largura_tabela, 100)
-                t.drawOn(c, posicao_horizontal_tabela, posicao_vertical_tabela)
-                observacao = observacao - tabela_referencia_altura
-
-        tabela_referencia_altura_ref = 0
-
-        if data_referencia_fator != None:
-            if observacao - (len(data_referencia_fator) * 20) <= 5:
-                c.showPage()
-                observacao = 27 * 28.35
-                ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-                larguras_colunas_ref = [212, 100, 225]  # total 537
-                tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
-                largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
-                tr.setStyle(style)
-                largura_tabela_ref = sum(tr._argW)
-                posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
-                tabela_referencia_altura_ref = altura_tabela_ref
-                posicao_vertical_tabela_ref = observacao - tabela_referencia_altura_ref
-                tr.wrapOn(c, largura_tabela_ref, 100)
-                tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
-                observacao = observacao - tabela_referencia_altura_ref
-
-            else:
-                larguras_colunas_ref = [212, 100, 225]  # total 537
-                tr = Table(data_referencia_fator, colWidths=larguras_colunas_ref)
-                largura_tabela_ref, altura_tabela_ref = tr.wrapOn(None, largura_disponivel, 0)
-                tr.setStyle(style)
-                largura_tabela_ref = sum(tr._argW)
-                posicao_horizontal_tabela_ref = ponto1[0] + (((19 * 28.35) - largura_tabela_ref) / 2)
-                tabela_referencia_altura_ref = altura_tabela_ref
-                posicao_vertical_tabela_ref = observacao - tabela_referencia_altura_ref
-                tr.wrapOn(c, largura_tabela_ref, 100)
-                tr.drawOn(c, posicao_horizontal_tabela_ref, posicao_vertical_tabela_ref)
-                observacao = observacao - tabela_referencia_altura_ref
-
-        tabela_referencia_altura_esp = 0
-        if data_referencia_esperado != None:
-            if observacao - (len(data_referencia_esperado) * 20) <= 5:
-                c.showPage()
-                observacao = 27 * 28.35
-                ponto1, ponto2, ponto3, ponto4 = desenhar_retangulo(c=c)
-                larguras_colunas_esperado = [212, 100, 225]  # total 537
-                te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
-                largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
-                te.setStyle(style)
-                largura_tabela_esp = sum(te._argW)
-                posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
-                tabela_referencia_altura_esp = altura_tabela_esp
-                posicao_vertical_tabela_esp = observacao - tabela_referencia_altura_esp
-                te.wrapOn(c, largura_tabela_esp, 100)
-                te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
-                observacao = observacao - tabela_referencia_altura_esp
-            else:
-                larguras_colunas_esperado = [212, 100, 225]  # total 537
-                te = Table(data_referencia_esperado, colWidths=larguras_colunas_esperado)
-                largura_tabela_esp, altura_tabela_esp = te.wrapOn(None, largura_disponivel, 0)
-                te.setStyle(style)
-                largura_tabela_esp = sum(te._argW)
-                posicao_horizontal_tabela_esp = ponto1[0] + (((19 * 28.35) - largura_tabela_esp) / 2)
-                tabela_referencia_altura_esp = altura_tabela_esp
-                posicao_vertical_tabela_esp = observacao - tabela_referencia_altura_esp
-                te.wrapOn(c, largura_tabela_esp, 100)
-                te.drawOn(c, posicao_horizontal_tabela_esp, posicao_vertical_tabela_esp)
-                observacao = observacao - tabela_referencia_altura_esp
-
-        observacao = observacao - 40
+@login_required
+def laudo_status(request, chave):
+    """
+    Acompanha um laudo enfileirado. Com `?formato=json` responde o status para
+    polling; no navegador redireciona para o download assim que o PDF fica pronto.
+
+    A chave só vale junto com os exames da query string (que o usuário precisa poder
+    ver): se os dados mudaram, o status passa para a chave atual.
+    """
+    tipo, exames_ids, nome_arquivo = _parametros_laudo(request)
+    tenant = get_current_tenant()
+    chave_atual = artefatos.chave_laudo(tipo, exames_ids, tenant)
+    if chave_atual != chave:
+        return redirect(f"{reverse('exame:laudo_status', args=[chave_atual])}?{request.GET.urlencode()}")
+
+    status, erro = status_laudo(chave)
+    if status == 'desconhecido':
+        # Enfileirado por outro processo ou perdido num restart: gera de novo
+        enfileirar_laudo(tipo, exames_ids, chave, tenant)
+        status = 'gerando'
+
+    url_download = _url_laudo('exame:laudo_download', chave, tipo, exames_ids, nome_arquivo)
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'status': status, 'erro': erro, 'url': url_download if status == 'pronto' else None})
+
+    if status == 'pronto':
+        return redirect(url_download)
+    if status == 'erro':
+        return HttpResponse(erro, status=500)
+
+    resposta = HttpResponse('Gerando o laudo, aguarde...', status=202)
+    resposta['Refresh'] = f"1; url={_url_laudo('exame:laudo_status', chave, tipo, exames_ids, nome_arquivo)}"
+    return resposta
 
-    c.save()
 
-    return response
+@login_required
+def baixar_laudo(request, chave):
+    tipo, exames_ids, nome_arquivo = _parametros_laudo(request)
+    if chave != artefatos.chave_laudo(tipo, exames_ids, get_current_tenant()) or not artefatos.existe(chave):
+        raise Http404('Laudo não encontrado.')
+    return _arquivo_laudo(chave, nome_arquivo)
 
 
 # def criar_laudo_medico1(request, pk):
@@ -1946,7 +783,7 @@ def preencher_laudo(request):
 #     if response_imagem.status_code == 200:
 #         imagem_bytes = response_imagem.content
 #     else:
-#         return HttpResponse('Erro ao baixar a imagem', status=500)
+#         return HttpResponse('Assinatura do biomédico não encontrada', status=500)
 #
 #     imagem_reader = ImageReader(BytesIO(imagem_bytes))
 #     largura_imagem = 160
@@ -2294,52 +1131,32 @@ class BuscarExameterceirizado(LoginRequiredMixin, TemplateView):
     template_name = 'exame/buscar_exame_terceirizado.html'
 
 
-def buscar_exame(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Exame.objects.filter(codigo__icontains=nomes, terceirizado=False)
+def _busca_codigo_ajax(request, terceirizado):
+    if request.POST.get('ajax_request') != 'true':
+        return JsonResponse({})
 
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for exame in query_se:
-                item = {
-                    'pk': exame.pk,
-                    'codigo': exame.codigo,
-                    'nome': exame.nome,
-                }
+    exames = busca_codigo.buscar(request.POST.get('nomes', ''), terceirizado=terceirizado)
+    return JsonResponse({'data': exames or 'Nenhum exame encontrado'})
 
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum exame encontrado'
 
-        return JsonResponse({'data': res})
-    return JsonResponse({})
+def buscar_exame(request):
+    return _busca_codigo_ajax(request, terceirizado=False)
 
 
 def buscar_exame_terceirizado(request):
-    if request.POST.get('ajax_request') == 'true':
-        res = None
-        nomes = request.POST.get('nomes')
-        query_se = Exame.objects.filter(codigo__icontains=nomes, terceirizado=True)
+    return _busca_codigo_ajax(request, terceirizado=True)
 
-        if len(query_se) > 0 and len(nomes) > 0:
-            data = []
-            for exame in query_se:
-                item = {
-                    'pk': exame.pk,
-                    'codigo': exame.codigo,
-                    'nome': exame.nome,
-                }
 
-                data.append(item)
-            res = data
-        else:
-            res = 'Nenhum exame encontrado'
+@login_required
+def leitura_codigo(request, codigo):
+    """Exame lido pelo código de barras, com orçamento, paciente e a tela de trabalho dele."""
+    encontrado = busca_codigo.leitura(codigo)
+    if encontrado is None:
+        return JsonResponse({'erro': 'Nenhum exame encontrado'}, status=404)
 
-        return JsonResponse({'data': res})
-    return JsonResponse({})
+    exame = encontrado['exame']
+    tela = 'exame:exame_medico_anexar' if exame['terceirizado'] else 'exame:exame_medico_ver'
+    return JsonResponse({**encontrado, 'url': reverse(tela, kwargs={'pk': exame['pk']})})
 
 
 def etiqueta_exame(request, pk):
@@ -2418,6 +1235,51 @@ def etiquetas_de_exame(request):
     c.save()
     return response
 
+@login_required
+def etiquetas_dia(request, data):
+    """Etiquetas do dia em ZPL ou ESC/POS (?formato=zpl|escpos), para download ou para o spool."""
+    formato = etiqueta.FORMATOS.get(request.GET.get('formato', 'zpl'))
+    if formato is None:
+        raise Http404('Formato de etiqueta desconhecido.')
+
+    etiquetas = etiqueta.etiquetas_do_dia(data)
+    if request.method == 'POST':
+        etiqueta.enviar_para_spool(formato.gerar(etiquetas), formato.extensao)
+        messages.success(request, f'{len(etiquetas)} etiqueta(s) enviada(s) para a impressora.')
+        return redirect('exame:exame_etiquetas', data=data)
+
+    response = StreamingHttpResponse(formato.gerar(etiquetas), content_type=formato.content_type)
+    response['Content-Disposition'] = f'attachment; filename="etiquetas_{data}.{formato.extensao}"'
+    return response
+
+@login_required
+def folha_etiquetas(request, data=None, pk=None):
+    """
+    Todas as etiquetas de um dia ou de um orçamento numa folha N-up, agrupadas por paciente.
+    ?folha= escolhe o estoque (ver etiqueta.FOLHAS), ?inicio= pula posições já usadas
+    e ?formato=zpl gera uma etiqueta ZPL por página para rolos com várias colunas.
+    """
+    folha = etiqueta.obter_folha(request.GET.get('folha', 'a4356'))
+    if folha is None:
+        raise Http404('Folha de etiquetas desconhecida.')
+    inicio = request.GET.get('inicio', '0')
+    inicio = int(inicio) if inicio.isdigit() else 0
+    agrupar = request.GET.get('agrupar', '1') != '0'
+
+    etiquetas = etiqueta.etiquetas_do_orcamento(pk) if pk else etiqueta.etiquetas_do_dia(data)
+    nome = f'etiquetas_{pk or data}'
+
+    if request.GET.get('formato') == 'zpl':
+        response = StreamingHttpResponse(etiqueta.folha_zpl(etiquetas, folha, inicio, agrupar),
+                                         content_type=etiqueta.FORMATOS['zpl'].content_type)
+        response['Content-Disposition'] = f'attachment; filename="{nome}.zpl"'
+        return response
+
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{nome}.pdf"'
+    etiqueta.folha_pdf(response, etiquetas, folha, inicio, agrupar)
+    return response
+
 #### GRUPOS DE EXAMES ####
 
 
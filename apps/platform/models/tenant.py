@@ -96,7 +96,8 @@ class Tenant(models.Model):
             "2fa_obrigatorio (bool), "
             "email_remetente (str), "
             "municipio_codigo_ibge (str), "
-            "meses_para_anonimizacao (int)."
+            "meses_para_anonimizacao (int), "
+            "subtitulo, endereco e site (str, usados no cabeçalho do laudo)."
         ),
     )
 
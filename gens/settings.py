@@ -82,6 +82,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Banco de teste em arquivo: os testes de concorrência usam várias conexões,
+        # e o SQLite em memória compartilhada recusa a trava em vez de esperar por ela
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+
+# Precisa ser compartilhado entre os processos do servidor: a versão do catálogo
+# (apps/exame/services/catalogo.py) e as métricas do painel (apps/core/services/painel.py)
+# são invalidadas por ele. O LocMemCache padrão é de cada processo e deixaria os outros
+# workers desatualizados; em vários servidores, troque por Redis ou Memcached.
+# Acima de MAX_ENTRIES (300) o FileBasedCache descarta chaves, e nada depende de uma
+# chave continuar lá: a versão do catálogo é relida do banco e o painel é recalculado.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -190,3 +209,22 @@ TENANT_EXEMPT_HOSTS = {
     'localhost',
     '127.0.0.1',
 }
+
+# ---------------------------------------------------------------------------
+# Impressão de etiquetas
+# ---------------------------------------------------------------------------
+
+# Fila de impressão local (apps/exame/services/etiqueta.py). Fica fora de MEDIA_ROOT:
+# os arquivos têm nomes de pacientes e MEDIA_ROOT é servida como mídia
+ETIQUETA_SPOOL_DIR = BASE_DIR / 'spool'
+
+# ---------------------------------------------------------------------------
+# Laudos gerados
+# ---------------------------------------------------------------------------
+
+# PDFs dos laudos já desenhados (apps/exame/services/artefatos.py). Fora de MEDIA_ROOT:
+# têm resultados de pacientes e só podem sair pela view de download, depois da
+# verificação de acesso. `manage.py limpar_laudos` (agendar diariamente) apaga os que
+# não foram usados em LAUDO_ARTEFATOS_DIAS dias; eles são desenhados de novo se pedidos.
+LAUDO_ARTEFATOS_DIR = BASE_DIR / 'privado' / 'laudos'
+LAUDO_ARTEFATOS_DIAS = 30
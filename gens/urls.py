@@ -14,6 +14,8 @@ urlpatterns = [
         path('auth/', include('apps.accounts.api_urls')),
         # Módulo core: pacientes
         path('', include('apps.core.api_urls')),
+        # Módulo agenda: estatísticas da fila
+        path('', include('apps.agenda.api_urls')),
     ])),
 
     # ------------------------------------------------------------------